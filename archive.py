@@ -0,0 +1,287 @@
+# archive.py
+import asyncio
+import json
+import logging
+import os
+import time
+from array import array
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from config import DATA_FILE, ARCHIVE_INTERVAL_SECONDS, ARCHIVE_ORDER_AGE_DAYS, ARCHIVE_PAGE_SIZE
+from models import ENTITY_TYPES
+from state_manager import UserState, user_state
+from storage import encode_json
+
+try:
+    import fcntl
+except ImportError:
+    # Нет блокировок файлов (Windows): архив дописывает один процесс
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Запись архива: (коллекция, ключ, сущность, время переноса в архив)
+ArchivedRecord = Tuple[str, str, Any, datetime]
+
+
+def archive_filename(filename: str) -> str:
+    """Файл архива рядом с файлом данных (data.json -> data.archive)"""
+    return f"{os.path.splitext(filename)[0]}.archive"
+
+
+def archive_index_keys(collection: str, key: str, entity: Any) -> List[str]:
+    """
+    Ключи индекса архива, под которыми доступна запись.
+    Логины исполнителей и клиентов - разные пространства имён, поэтому роль входит в ключ.
+    """
+    if collection == 'orders':
+        keys = [f"orders:contractor:{key}"]
+        if entity.client_login is not None:
+            keys.append(f"orders:client:{entity.client_login}")
+        return keys
+    if collection == 'active_chats':
+        return [f"active_chats:{role}:{login}"
+                for role, login in (('client', entity.client_login), ('contractor', entity.contractor_login))
+                if login is not None]
+    return []
+
+
+def _lock_file(f: BinaryIO) -> None:
+    """Блокирует файл до его закрытия (между процессами, где есть fcntl)"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+class OrderArchive:
+    """
+    Холодное хранилище завершённых заказов и закрытых чатов.
+    Записи только дописываются в файл, по строке на запись: ключи индекса в JSON, табуляция, запись в JSON
+    (табуляция внутри JSON всегда экранирована). В памяти держится только индекс смещений строк
+    по ключам индекса; при запуске он строится чтением файла, разбирается только начало строк.
+    Дописывать могут несколько процессов (воркеры кластера): запись идёт под блокировкой файла,
+    а строки, дописанные другими процессами, добавляются в индекс при следующем чтении.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._index: Dict[str, array] = {}
+        # Размер проиндексированной части файла (только целые строки)
+        self._size = 0
+        self._records = 0
+        self.load_stats: Dict[str, Any] = {}
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """Строит индекс смещений по файлу архива; оборванная запись в конце файла отбрасывается"""
+        started = time.perf_counter()
+        with open(self.filename, 'ab') as f:
+            _lock_file(f)
+            dropped = self._truncate_torn_tail()
+        if dropped:
+            logger.warning("Архив %s повреждён: отброшено %d байт оборванной записи в конце", self.filename, dropped)
+        self.refresh()
+        self.load_stats = {'records': self._records, 'file_size': self._size,
+                           'load_time': time.perf_counter() - started}
+
+    def _truncate_torn_tail(self) -> int:
+        """
+        Обрезает файл до последней целой строки (вызывается под блокировкой файла,
+        когда никто не пишет: недописанная строка - след сбоя). Возвращает число отброшенных байт.
+        """
+        with open(self.filename, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            if not size:
+                return 0
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return 0
+            end = 0
+            position = size
+            while position > 0:
+                start = max(0, position - 64 * 1024)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b'\n')
+                if newline != -1:
+                    end = start + newline + 1
+                    break
+                position = start
+            f.truncate(end)
+            return size - end
+
+    def refresh(self) -> int:
+        """Добавляет в индекс строки, дописанные после последнего чтения; возвращает их количество"""
+        try:
+            if os.path.getsize(self.filename) == self._size:
+                return 0
+        except FileNotFoundError:
+            return 0
+
+        added = 0
+        with open(self.filename, 'rb') as f:
+            f.seek(self._size)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Строку ещё дописывают
+                    break
+                try:
+                    keys = json.loads(line[:line.index(b'\t')])
+                except ValueError:
+                    logger.warning("Архив %s: пропущена повреждённая запись по смещению %d", self.filename, self._size)
+                    keys = []
+                for key in keys:
+                    offsets = self._index.get(key)
+                    if offsets is None:
+                        offsets = self._index[key] = array('q')
+                    offsets.append(self._size)
+                self._size += len(line)
+                added += 1
+        self._records += added
+        return added
+
+    @staticmethod
+    def encode_line(record: Tuple[str, str, Any], archived_at: str) -> str:
+        """Строка архива для одной сущности (archived_at - время переноса в формате ISO)"""
+        collection, key, entity = record
+        keys = archive_index_keys(collection, key, entity)
+        encoded = encode_json({'c': collection, 'k': key, 't': archived_at, 'v': entity})
+        return f"{encode_json(keys)}\t{encoded}\n"
+
+    def encode(self, records: List[Tuple[str, str, Any]], archived_at: Optional[datetime] = None) -> bytes:
+        """Кодирует сущности в строки архива (выполняется в потоке цикла событий, пока сущности не меняются)"""
+        archived_at = (archived_at or datetime.now()).isoformat()
+        return ''.join(self.encode_line(record, archived_at) for record in records).encode('utf-8')
+
+    def write(self, payload: bytes) -> None:
+        """Дописывает строки в файл архива под блокировкой файла (можно вызывать из другого потока)"""
+        with open(self.filename, 'ab') as f:
+            _lock_file(f)
+            # Недописанная строка после сбоя склеилась бы с новой записью
+            self._truncate_torn_tail()
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def append(self, records: List[Tuple[str, str, Any]]) -> None:
+        """Записывает сущности в архив: кодирование - в цикле событий, запись на диск - в потоке"""
+        await self.append_payload(self.encode(records))
+
+    async def append_payload(self, payload: bytes) -> None:
+        """Дописывает закодированные строки в потоке и добавляет их в индекс"""
+        await asyncio.to_thread(self.write, payload)
+        self.refresh()
+
+    def count(self, collection: str, role: str, login: str) -> int:
+        """Количество записей коллекции в архиве для участника (role - 'contractor' или 'client')"""
+        self.refresh()
+        return len(self._index.get(f"{collection}:{role}:{login}", ()))
+
+    def read_page(self, collection: str, role: str, login: str, page: int = 0,
+                  page_size: int = ARCHIVE_PAGE_SIZE) -> List[ArchivedRecord]:
+        """Читает страницу записей участника, новые - первыми"""
+        self.refresh()
+        offsets = self._index.get(f"{collection}:{role}:{login}")
+        if not offsets:
+            return []
+        end = len(offsets) - page * page_size
+        start = max(0, end - page_size)
+        if end <= 0:
+            return []
+
+        entity_type = ENTITY_TYPES[collection]
+        records = []
+        with open(self.filename, 'rb') as f:
+            for position in reversed(offsets[start:end]):
+                f.seek(position)
+                line = f.readline()
+                record = json.loads(line[line.index(b'\t') + 1:])
+                records.append((record['c'], record['k'], entity_type.from_dict(record['v']),
+                                datetime.fromisoformat(record['t'])))
+        return records
+
+
+class ArchiveScheduler:
+    """Фоновая задача, переносящая завершённые заказы и закрытые чаты из памяти в архив"""
+
+    def __init__(self, state: UserState, archive: OrderArchive, interval: float = ARCHIVE_INTERVAL_SECONDS,
+                 order_age_days: int = ARCHIVE_ORDER_AGE_DAYS):
+        self.state = state
+        self.archive = archive
+        self.interval = interval
+        self.order_age_days = order_age_days
+        # Архивировать только сущности исполнителей, для которых owns(логин) истинно
+        # (воркер кластера архивирует заказы и чаты своих исполнителей)
+        self.owns: Callable[[str], bool] = lambda contractor_login: True
+        self._task: Optional[asyncio.Task] = None
+
+    def _find_archivable(self) -> List[Tuple[str, str, Any]]:
+        """Завершённые сущности исполнителей, которыми владеет процесс"""
+        return [record for record in self.state.find_archivable(order_age_days=self.order_age_days)
+                if self.owns(record[1] if record[0] == 'orders' else record[2].contractor_login)]
+
+    @staticmethod
+    def _lock_key(record: Tuple[str, str, Any]) -> Tuple[str, str]:
+        """Ключ блокировки сущности архивируемой записи"""
+        collection, key, _ = record
+        return ('contractor', key) if collection == 'orders' else ('chat', key)
+
+    async def run_once(self) -> int:
+        """
+        Переносит завершённые сущности в архив, возвращает их количество.
+        Сначала записывается архив, затем сущности удаляются из памяти: при сбое между этими шагами
+        запись останется и в архиве, и в данных, но не потеряется.
+        Сущности кодируются под блокировками, а запись на диск (с fsync) идёт без них - иначе снимок
+        состояния ждал бы диска. После записи блокировки берутся снова, и из памяти удаляются только
+        сущности, не изменившиеся с момента кодирования; изменённые остаются в памяти и будут
+        перенесены в следующий раз (в архиве у них останется и старая копия).
+        """
+        records = self._find_archivable()
+        if not records:
+            return 0
+        # После получения блокировок список перепроверяется только по заблокированным сущностям
+        keys = {self._lock_key(record) for record in records}
+        archived_at = datetime.now().isoformat()
+        async with self.state.locks.hold(*keys):
+            records = [record for record in self._find_archivable() if self._lock_key(record) in keys]
+            if not records:
+                return 0
+            lines = [self.archive.encode_line(record, archived_at) for record in records]
+
+        await self.archive.append_payload(''.join(lines).encode('utf-8'))
+
+        async with self.state.locks.hold(*keys):
+            unchanged = [record for record, line in zip(records, lines)
+                         if self.archive.encode_line(record, archived_at) == line]
+            if len(unchanged) < len(records):
+                logger.info("Изменились во время записи архива и остались в памяти: %d",
+                            len(records) - len(unchanged))
+            return self.state.drop_archived(unchanged)
+
+    def start(self) -> None:
+        """Запускает фоновую задачу"""
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                archived = await self.run_once()
+                if archived:
+                    logger.info("Перенесено в архив: %d", archived)
+            except Exception:
+                logger.exception("Ошибка при переносе данных в архив")
+            await asyncio.sleep(self.interval)
+
+
+# Глобальный архив и задача переноса в него
+order_archive = OrderArchive(archive_filename(DATA_FILE))
+archive_scheduler = ArchiveScheduler(user_state, order_archive)
@@ -0,0 +1,64 @@
+# bench_archive.py
+"""
+Рабочий набор до и после переноса завершённых заказов в архив: число заказов в памяти, размер
+и время кодирования снимка состояния, а также время чтения страницы истории из архива.
+
+    python benchmarks/bench_archive.py [число исполнителей] [заказов на исполнителя]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+import common
+from archive import ArchiveScheduler, OrderArchive
+from state_manager import UserState
+from storage import encode_json
+
+
+def make_data(contractors: int, orders: int):
+    # Каждый десятый заказ ещё в работе, остальные завершены
+    return {'orders': {f'contractor{number}': [
+        {'description': f'Заказ {index}', 'client_login': f'client{index % 50}', 'budget': 1000.0,
+         'created_at': '2024-01-01T12:00:00' if index % 10 else time.strftime('%Y-%m-%dT%H:%M:%S'),
+         'accepted': True, 'timer_active': False, 'expired': bool(index % 10), 'order_id': str(index)}
+        for index in range(orders)] for number in range(contractors)}}
+
+
+def working_set(state: UserState) -> str:
+    started = time.perf_counter()
+    snapshot = encode_json(state.collections())
+    elapsed = time.perf_counter() - started
+    orders = sum(len(items) for items in state.orders.values())
+    return f"заказов в памяти {orders}, снимок {len(snapshot) / 1024 / 1024:.1f} МБ за {elapsed * 1000:.0f} мс"
+
+
+def main() -> None:
+    contractors = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    orders = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    filename = os.path.join(common.WORK_DIR, 'data.json')
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(make_data(contractors, orders), f)
+
+    state = UserState(filename, persistence_mode='write_behind', backend='json')
+    archive = OrderArchive(os.path.join(common.WORK_DIR, 'data.archive'))
+    print(f"до переноса: {working_set(state)}")
+
+    started = time.perf_counter()
+    archived = asyncio.run(ArchiveScheduler(state, archive).run_once())
+    print(f"перенесено в архив: {archived} за {(time.perf_counter() - started) * 1000:.0f} мс")
+    print(f"после переноса: {working_set(state)}")
+
+    logins = [f'contractor{number}' for number in range(contractors)]
+    iterator = iter(logins * 5)
+    samples = common.measure(lambda: archive.read_page('orders', 'contractor', next(iterator)), len(logins) * 5)
+    print(f"страница истории из архива: {common.timings(samples)}")
+    started = time.perf_counter()
+    reopened = OrderArchive(archive.filename)
+    print(f"индекс архива при запуске: {reopened.load_stats['records']} записей "
+          f"за {(time.perf_counter() - started) * 1000:.0f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# bench_index.py
+"""
+Поиск логина по chat_id: обратный индекс UserState против перебора всех записей (как было до индекса).
+
+    python benchmarks/bench_index.py [число исполнителей] [число поисков]
+"""
+import json
+import os
+import random
+import sys
+
+import common
+from state_manager import UserState
+
+
+def scan(entities, chat_id):
+    for login, entity in entities.items():
+        if entity.chat_id == chat_id:
+            return login
+    return None
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    filename = os.path.join(common.WORK_DIR, 'data.json')
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump({'entrepreneurs': {f'contractor{number}': {'password': 'p', 'rating': 0, 'balance': 0,
+                                                             'chat_id': number}
+                                     for number in range(count)}}, f)
+    state = UserState(filename, persistence_mode='write_behind', backend='json')
+
+    chat_ids = [random.randrange(count * 2) for _ in range(lookups)]
+    iterator = iter(chat_ids)
+    indexed = common.measure(lambda: state.get_entrepreneur_by_chat_id(next(iterator)), lookups)
+    iterator = iter(chat_ids)
+    scanned = common.measure(lambda: scan(state.entrepreneurs, next(iterator)), lookups)
+    assert [state.get_entrepreneur_by_chat_id(chat_id) for chat_id in chat_ids] == \
+           [scan(state.entrepreneurs, chat_id) for chat_id in chat_ids]
+
+    print(f"Исполнителей: {count}, поисков: {lookups} (половина chat_id не найдена)")
+    print(f"индекс: {common.timings(indexed)}")
+    print(f"перебор: {common.timings(scanned)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# bench_journal.py
+"""
+Стоимость одной записи изменения: снимок целиком (JsonFileStorage) против журнала (JournalStorage).
+Каждая запись меняет одного клиента; замеряются кодирование в event loop, запись на диск и объём записи.
+
+    python benchmarks/bench_journal.py [число клиентов] [число записей]
+"""
+import os
+import sys
+import time
+
+import common
+from storage import JournalStorage, JsonFileStorage
+
+
+def make_data(clients: int):
+    return {'clients': {f'client{number}': {'password': str(number), 'status': 'active',
+                                            'created_at': '2024-01-01T00:00:00', 'chat_id': number}
+                        for number in range(clients)}}
+
+
+def run(storage, data, writes: int):
+    encode_samples, write_samples = [], []
+    written = 0
+    storage.write(storage.encode_changes(data, None))
+    for number in range(writes):
+        login = f'client{number % len(data["clients"])}'
+        data['clients'][login]['status'] = f'changed{number}'
+        started = time.perf_counter()
+        payload = storage.encode_changes(data, {'clients': {login}})
+        encoded = time.perf_counter()
+        storage.write(payload)
+        write_samples.append(time.perf_counter() - encoded)
+        encode_samples.append(encoded - started)
+        written += len(payload[1] if isinstance(payload, tuple) else payload)
+    return encode_samples, write_samples, written
+
+
+def main() -> None:
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    writes = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print(f"Клиентов: {clients}, записей: {writes}")
+    for name, storage in (('снимок', JsonFileStorage(os.path.join(common.WORK_DIR, 'snapshot.json'))),
+                          ('журнал', JournalStorage(os.path.join(common.WORK_DIR, 'journal.json')))):
+        encode_samples, write_samples, written = run(storage, make_data(clients), writes)
+        print(f"{name}: кодирование - {common.timings(encode_samples)}")
+        print(f"{name}: запись - {common.timings(write_samples)}; "
+              f"записано {written / writes / 1024:.1f} КБ на изменение")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+# bench_keyboards.py
+"""
+Стоимость клавиатуры на один ответ: сборка меню при каждом ответе (как до готовых клавиатур), готовое
+меню и клавиатура с параметрами из кеша. Клавиатура сериализуется так же, как при отправке (to_dict).
+
+    python benchmarks/bench_keyboards.py [число ответов]
+"""
+import random
+import sys
+
+import common
+import keyboards
+from keyboards import build_menu
+
+
+def build_client_menu():
+    return build_menu(("Создать заказ", 'create_order'), ("Наши работы", 'our_works'), ("Выйти", 'client_logout'))
+
+
+def build_actions(login: str):
+    return build_menu(("Поменять рейтинг", f'change_rating_{login}'), ("Изменить баланс", f'change_balance_{login}'),
+                      ("Удалить исполнителя", f'delete_entrepreneur_{login}'))
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    logins = [f'contractor{number}' for number in range(200)]
+    variants = (
+        ('меню: сборка', lambda: build_client_menu().to_dict()),
+        ('меню: готовое', lambda: keyboards.CLIENT_MENU.to_dict()),
+        ('с параметрами: сборка', lambda: build_actions(random.choice(logins)).to_dict()),
+        ('с параметрами: кеш', lambda: keyboards.entrepreneur_actions_keyboard(random.choice(logins)).to_dict()),
+    )
+    assert build_client_menu().to_dict() == keyboards.CLIENT_MENU.to_dict()
+    assert build_actions('ivan').to_dict() == keyboards.entrepreneur_actions_keyboard('ivan').to_dict()
+    print(f"Ответов: {count}")
+    for name, reply in variants:
+        samples = common.measure(reply, count)
+        print(f"{name}: {sum(samples) / count * 1e6:.2f} мкс на ответ")
+
+
+if __name__ == '__main__':
+    main()
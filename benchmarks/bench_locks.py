@@ -0,0 +1,62 @@
+# bench_locks.py
+"""
+Нагрузочная проверка блокировок сущностей: много задач меняют балансы (чтение, await, запись) под hold(),
+параллельно снимки ждут барьер записи. Проверяется, что обновления не теряются и снимок не видит
+перевод наполовину; замеряются пропускная способность и время ожидания снимка.
+
+    python benchmarks/bench_locks.py [число задач] [число сущностей]
+"""
+import asyncio
+import random
+import sys
+import time
+
+import common
+from locks import EntityLocks
+
+
+async def run(tasks: int, entities: int):
+    locks = EntityLocks()
+    balances = {number: 0 for number in range(entities)}
+    snapshot_waits = []
+    done = asyncio.Event()
+
+    async def transfer():
+        source, target = random.sample(range(entities), 2)
+        async with locks.hold(('contractor', source), ('contractor', target)):
+            amount = balances[source]
+            await asyncio.sleep(0)
+            balances[source] = amount - 1
+            await asyncio.sleep(0)
+            balances[target] += 1
+
+    async def snapshots():
+        while not done.is_set():
+            started = time.perf_counter()
+            async with locks.barrier.snapshot():
+                snapshot_waits.append(time.perf_counter() - started)
+                assert sum(balances.values()) == 0, "Снимок увидел перевод наполовину"
+            await asyncio.sleep(0.001)
+
+    snapshot_task = asyncio.create_task(snapshots())
+    started = time.perf_counter()
+    await asyncio.gather(*(transfer() for _ in range(tasks)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await snapshot_task
+
+    assert sum(balances.values()) == 0, "Потеряны обновления"
+    assert len(locks) == 0 and locks.barrier.sections == 0
+    return elapsed, snapshot_waits
+
+
+def main() -> None:
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for entities in ([int(sys.argv[2])] if len(sys.argv) > 2 else [2, 100, 10000]):
+        elapsed, waits = asyncio.run(run(tasks, entities))
+        print(f"сущностей {entities}: {tasks / elapsed:.0f} переводов/с, снимков {len(waits)}, "
+              f"ожидание снимка - {common.timings(waits)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# bench_memory.py
+"""
+Память под данные: словари, как их возвращает json (прежнее представление), против сущностей models
+со __slots__. Замеряется tracemalloc'ом прирост памяти на построение каждой коллекции.
+
+    python benchmarks/bench_memory.py [число записей в коллекции]
+"""
+import json
+import sys
+import tracemalloc
+
+import common
+from models import decode_entity
+
+
+def make_records(count: int, start: int = 0):
+    numbers = range(start, start + count)
+    return {
+        'entrepreneurs': {f'contractor{number}': {'password': 'secret', 'rating': number % 100, 'balance': 0.0,
+                                                  'chat_id': 100000 + number}
+                          for number in numbers},
+        'clients': {f'client{number}': {'password': 'secret', 'status': 'active',
+                                        'created_at': '2024-01-01T12:00:00', 'chat_id': 200000 + number}
+                    for number in numbers},
+        'orders': {f'contractor{number}': [{'description': 'Сделать сайт', 'client_login': f'client{number}',
+                                            'client_chat_id': 200000 + number, 'budget': 1000.0,
+                                            'deadline_text': '3 дня', 'created_at': '2024-01-01T12:00:00',
+                                            'accepted': True, 'timer_active': False, 'order_id': '0'}]
+                   for number in numbers},
+        'active_chats': {f'chat{number}': {'client_login': f'client{number}', 'client_chat_id': 200000 + number,
+                                           'contractor_login': f'contractor{number}',
+                                           'contractor_chat_id': 100000 + number, 'order_id': str(number),
+                                           'created_at': '2024-01-01T12:00:00', 'active': True}
+                         for number in numbers},
+    }
+
+
+def allocated(build):
+    """Память (байт), занятая результатом build()"""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    encoded = {collection: json.dumps(records) for collection, records in make_records(count).items()}
+    print(f"Записей в коллекции: {count}")
+    for collection, text in encoded.items():
+        raw_size = allocated(lambda: json.loads(text))
+        entity_size = allocated(
+            lambda: {key: decode_entity(collection, value) for key, value in json.loads(text).items()})
+        print(f"{collection}: словари {raw_size / count:.0f} Б/запись, сущности {entity_size / count:.0f} Б/запись, "
+              f"экономия {(1 - entity_size / raw_size) * 100:.0f}%")
+
+
+if __name__ == '__main__':
+    main()
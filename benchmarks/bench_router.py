@@ -0,0 +1,52 @@
+# bench_router.py
+"""
+Разбор callback_data маршрутизатором кнопок бота: с кешем, без кеша и перебором таблицы маршрутов
+по порядку (как прежняя цепочка elif с startswith).
+
+    python benchmarks/bench_router.py [число разборов]
+"""
+import random
+import sys
+
+import common
+import button_handler  # noqa: F401 - регистрирует маршруты бота
+from router import CallbackRouter, callback_router
+
+SAMPLES = ['admin_back', 'client', 'our_works', 'category_sites', 'portfolio_item_sites_3',
+           'portfolio_photo_video_1_2', 'accept_order_7014800288', 'decline_order_123',
+           'entrepreneur_ivan_petrov', 'client_order_history_2', 'open_chat_5_7_1700000000', 'unknown_button']
+
+
+def scan(routes, data):
+    for route in routes:
+        if route.exact:
+            if data == route.pattern:
+                return route, {}
+        elif data.startswith(route.prefix):
+            args = route.parse(data)
+            if args is not None:
+                return route, args
+    return None
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    uncached = CallbackRouter(cache_size=0)
+    for route in callback_router.routes:
+        uncached.add(route.pattern, route.handler, **route.kwargs)
+    routes = callback_router.routes
+    data = [random.choice(SAMPLES) for _ in range(count)]
+    for item in SAMPLES:
+        results = [callback_router.resolve(item), uncached.resolve(item), scan(routes, item)]
+        assert len({None if result is None else (result[0].pattern, repr(result[1])) for result in results}) == 1, item
+
+    print(f"Маршрутов: {len(routes)}, разборов: {count}")
+    for name, resolve in (('с кешем', callback_router.resolve), ('без кеша', uncached.resolve),
+                          ('перебор', lambda item: scan(routes, item))):
+        iterator = iter(data)
+        samples = common.measure(lambda: resolve(next(iterator)), count)
+        print(f"{name}: {sum(samples) / count * 1e6:.2f} мкс на разбор, {common.timings(samples)}")
+
+
+if __name__ == '__main__':
+    main()
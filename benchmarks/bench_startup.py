@@ -0,0 +1,117 @@
+# bench_startup.py
+"""
+Запуск на большом файле данных: json.load всего файла (прежняя загрузка), потоковая загрузка JSON
+и двоичный снимок (SNAPSHOT_FORMAT=binary). Каждый способ загрузки выполняется в отдельном процессе,
+замеряются время и пиковый RSS процесса (resource.getrusage, ru_maxrss) - вся занятая память,
+а не только выделенная объектами Python.
+
+    python benchmarks/bench_startup.py [размер файла данных в МБ, например 100 или 1024]
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import common
+from bench_memory import make_records
+from storage import binary_snapshot_filename
+
+MB = 1024 * 1024
+# Файл данных пишется порциями по BATCH записей каждой коллекции
+BATCH = 10000
+# ru_maxrss в Linux - в килобайтах, в macOS - в байтах
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+# Способ загрузки и формат снимка, с которым запускается его процесс
+LOADERS = (('json.load', 'json'), ('потоковая JSON', 'json'), ('двоичный снимок', 'binary'))
+
+
+def record_size() -> float:
+    """Средний размер в файле данных одного номера (по записи в каждой коллекции), байт"""
+    return len(json.dumps(make_records(BATCH), ensure_ascii=False).encode('utf-8')) / BATCH
+
+
+def write_data(filename: str, count: int) -> None:
+    """Пишет файл данных порциями: весь набор записей в памяти не собирается"""
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('{')
+        for number, collection in enumerate(('entrepreneurs', 'clients', 'orders', 'active_chats')):
+            f.write(f'{", " if number else ""}{json.dumps(collection)}: {{')
+            for start in range(0, count, BATCH):
+                records = make_records(min(BATCH, count - start), start)[collection]
+                f.write(f'{", " if start else ""}{json.dumps(records, ensure_ascii=False)[1:-1]}')
+            f.write('}')
+        f.write('}')
+
+
+def convert(filename: str) -> None:
+    """Дочерний процесс (SNAPSHOT_FORMAT=binary): переносит данные из JSON в двоичный снимок"""
+    from state_manager import UserState
+    UserState(filename, persistence_mode='write_behind', backend='json').save_data()
+
+
+def load(name: str, filename: str) -> None:
+    """Дочерний процесс: загружает данные и печатает замер строкой JSON"""
+    from models import decode_entity
+    from state_manager import UserState
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    report = ''
+    if name == 'json.load':
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        result = {collection: {key: decode_entity(collection, value) for key, value in records.items()}
+                  for collection, records in data.items()}
+    else:
+        result = UserState(filename, persistence_mode='write_behind', backend='json')
+        report = result.format_load_report()
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'time': elapsed, 'baseline': baseline * RSS_UNIT, 'peak': peak * RSS_UNIT, 'report': report},
+                     ensure_ascii=False))
+
+
+def run_child(*args: str, snapshot_format: str) -> str:
+    """Запускает этот скрипт в отдельном процессе, возвращает последнюю строку вывода"""
+    env = dict(os.environ, SNAPSHOT_FORMAT=snapshot_format)
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), *args], env=env, check=True,
+                               stdout=subprocess.PIPE, text=True)
+    return completed.stdout.strip().splitlines()[-1] if completed.stdout.strip() else ''
+
+
+def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] == '--convert':
+        convert(sys.argv[2])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == '--load':
+        load(sys.argv[2], sys.argv[3])
+        return
+
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 100
+    filename = os.path.join(common.WORK_DIR, 'data.json')
+    snapshot = binary_snapshot_filename(filename)
+    count = max(1, int(size_mb * MB / record_size()))
+    try:
+        started = time.perf_counter()
+        write_data(filename, count)
+        print(f"Файл данных: {os.path.getsize(filename) / MB:.1f} МБ, записей в коллекции: {count} "
+              f"(записан за {time.perf_counter() - started:.1f} с)")
+        run_child('--convert', filename, snapshot_format='binary')
+        print(f"Двоичный снимок: {os.path.getsize(snapshot) / MB:.1f} МБ")
+
+        for name, snapshot_format in LOADERS:
+            result = json.loads(run_child('--load', name, filename, snapshot_format=snapshot_format))
+            if result['report']:
+                print(result['report'])
+            print(f"{name}: {result['time'] * 1000:.0f} мс, пик RSS {result['peak'] / MB:.1f} МБ "
+                  f"(до загрузки {result['baseline'] / MB:.1f} МБ)")
+    finally:
+        for path in (filename, snapshot):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
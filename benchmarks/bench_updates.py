@@ -0,0 +1,69 @@
+# bench_updates.py
+"""
+Пропускная способность OrderedUpdateProcessor: обработчики ждут сеть (asyncio.sleep), обновления
+нескольких пользователей поступают вперемешку. Сравнивается обработка по одному и параллельная
+с очередью на пользователя; проверяется, что обновления каждого пользователя обработаны по порядку.
+
+    python benchmarks/bench_updates.py [пользователей] [обновлений на пользователя] [задержка обработчика, мс]
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime
+
+import common
+from telegram import Chat, Message, Update, User
+
+from updates import OrderedUpdateProcessor
+
+
+def make_updates(users: int, per_user: int):
+    updates = []
+    for number in range(per_user):
+        for user_id in range(1, users + 1):
+            user = User(user_id, 'user', False)
+            message = Message(len(updates), datetime.now(), Chat(user_id, Chat.PRIVATE), from_user=user,
+                              text=str(number))
+            updates.append(Update(len(updates), message=message))
+    return updates
+
+
+async def run(processor, updates, delay: float):
+    handled = {}
+    latencies = []
+    # Все обновления приходят разом (как пачка из getUpdates): задержка - от поступления до конца обработки
+    started = time.perf_counter()
+
+    async def handle(update: Update):
+        await asyncio.sleep(delay)
+        handled.setdefault(update.effective_user.id, []).append(int(update.message.text))
+        latencies.append(time.perf_counter() - started)
+
+    if processor is None:
+        for update in updates:
+            await handle(update)
+    else:
+        await processor.initialize()
+        await asyncio.gather(*(processor.process_update(update, handle(update)) for update in updates))
+    elapsed = time.perf_counter() - started
+
+    for numbers in handled.values():
+        assert numbers == sorted(numbers), "Нарушен порядок обновлений пользователя"
+    return elapsed, latencies
+
+
+def main() -> None:
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    delay = (float(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000
+    updates = make_updates(users, per_user)
+    print(f"Пользователей: {users}, обновлений: {len(updates)}, задержка обработчика {delay * 1000:.0f} мс")
+    variants = [('по одному', None)] + [(f'параллельно, до {concurrency}', concurrency) for concurrency in (16, 64)]
+    for name, concurrency in variants:
+        processor = None if concurrency is None else OrderedUpdateProcessor(concurrency, len(updates))
+        elapsed, latencies = asyncio.run(run(processor, updates, delay))
+        print(f"{name}: {len(updates) / elapsed:.0f} обновлений/с, задержка - {common.timings(latencies)}")
+
+
+if __name__ == '__main__':
+    main()
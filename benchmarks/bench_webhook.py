@@ -0,0 +1,84 @@
+# bench_webhook.py
+"""
+Нагрузочный тест встроенного вебхука: несколько keep-alive соединений (как у Telegram, max_connections)
+отправляют обновления, обработчик разбирает очередь с заданной задержкой. Замеряются пропускная способность,
+время ответа (p50/p99) и число ответов 503, когда очередь заполнена.
+
+    python benchmarks/bench_webhook.py [соединений] [запросов на соединение] [задержка обработки, мс]
+"""
+import asyncio
+import json
+import sys
+import time
+
+import common
+from webhook import SECRET_HEADER, WebhookServer
+
+SECRET = 'bench-secret'
+
+
+def make_body(update_id: int) -> bytes:
+    return json.dumps({'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': int(time.time()), 'text': 'Привет',
+        'chat': {'id': update_id % 1000, 'type': 'private'},
+        'from': {'id': update_id % 1000, 'is_bot': False, 'first_name': 'user'}}}).encode('utf-8')
+
+
+async def client(port: int, first_id: int, requests: int, latencies, statuses) -> None:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    update_id = first_id
+    while update_id < first_id + requests:
+        body = make_body(update_id)
+        started = time.perf_counter()
+        writer.write(f"POST /telegram HTTP/1.1\r\nHost: bot\r\nContent-Type: application/json\r\n"
+                     f"{SECRET_HEADER}: {SECRET}\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        while (await reader.readline()) not in (b'\r\n', b''):
+            pass
+        latencies.append(time.perf_counter() - started)
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == 503:
+            # Telegram повторит то же обновление позже (Retry-After)
+            await asyncio.sleep(0.01)
+        else:
+            update_id += 1
+    writer.close()
+
+
+async def run(connections: int, requests: int, delay: float, max_pending: int):
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def consume():
+        while True:
+            await queue.get()
+            await asyncio.sleep(delay)
+            queue.task_done()
+
+    server = WebhookServer(None, queue.put, queue.qsize, SECRET, listen='127.0.0.1', port=0,
+                           max_pending=max_pending)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    consumer = asyncio.create_task(consume())
+    latencies, statuses = [], {}
+    started = time.perf_counter()
+    await asyncio.gather(*(client(port, number * requests, requests, latencies, statuses)
+                           for number in range(connections)))
+    elapsed = time.perf_counter() - started
+    consumer.cancel()
+    await server.stop()
+    return elapsed, latencies, statuses
+
+
+def main() -> None:
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    delay = (float(sys.argv[3]) if len(sys.argv) > 3 else 0) / 1000
+    for max_pending in (1024, 16):
+        elapsed, latencies, statuses = asyncio.run(run(connections, requests, delay, max_pending))
+        print(f"соединений {connections}, очередь до {max_pending}: {len(latencies) / elapsed:.0f} запросов/с, "
+              f"ответы {dict(sorted(statuses.items()))}, время ответа - {common.timings(latencies)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# common.py
+"""
+Общее для скриптов замеров: запуск из любого каталога (python benchmarks/<скрипт>.py).
+Импорт этого модуля добавляет корень проекта в sys.path и переходит во временный каталог:
+модули бота создают глобальные объекты при импорте (user_state читает DATA_FILE из текущего каталога),
+а замеры не должны трогать данные бота.
+"""
+import os
+import sys
+import tempfile
+import time
+from typing import List, Sequence
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+WORK_DIR = tempfile.mkdtemp(prefix='bot-bench-')
+os.chdir(WORK_DIR)
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    """Перцентиль выборки (fraction от 0 до 1)"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def timings(samples: List[float]) -> str:
+    """Сводка времён в миллисекундах: среднее, p50, p99, максимум"""
+    return (f"среднее {sum(samples) / max(len(samples), 1) * 1000:.3f} мс, "
+            f"p50 {percentile(samples, 0.5) * 1000:.3f} мс, p99 {percentile(samples, 0.99) * 1000:.3f} мс, "
+            f"макс {max(samples, default=0.0) * 1000:.3f} мс")
+
+
+def measure(function, repeat: int) -> List[float]:
+    """Время каждого из repeat вызовов function() в секундах"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return samples
@@ -0,0 +1,192 @@
+# bus.py
+import asyncio
+import itertools
+import json
+import logging
+import struct
+import zlib
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from config import BUS_REQUEST_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Кадр сообщения: длина (4 байта, big-endian) + JSON
+_FRAME_HEADER = struct.Struct('>I')
+
+# Обработчик темы шины: (бот, данные) -> результат (JSON-совместимый)
+BusHandler = Callable[[Any, Any], Awaitable[Any]]
+
+
+class BusError(Exception):
+    """Ошибка доставки или обработки сообщения шины"""
+
+
+def worker_for(user_id: Hashable, workers: int) -> int:
+    """Номер воркера, которому принадлежит пользователь (по хешу user_id)"""
+    return zlib.crc32(str(user_id).encode('utf-8')) % workers
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    """Читает кадр из потока; None - поток закрыт"""
+    try:
+        header = await reader.readexactly(_FRAME_HEADER.size)
+        body = await reader.readexactly(_FRAME_HEADER.unpack(header)[0])
+    except asyncio.IncompleteReadError:
+        return None
+    return json.loads(body)
+
+
+def write_frame(writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+    """Пишет кадр в поток (без ожидания отправки)"""
+    body = json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    writer.write(_FRAME_HEADER.pack(len(body)) + body)
+
+
+class MessageBus:
+    """
+    Шина сообщений между процессами бота.
+    Запрос (request) выполняется в процессе, которому принадлежит пользователь: там же обрабатываются
+    его обновления, поэтому сообщения пользователю идут по порядку, а данные исполнителя меняет один процесс.
+    Рассылка (broadcast) доставляется всем остальным процессам.
+    В режиме одного процесса шина не подключена и обработчики вызываются напрямую;
+    в кластере воркер связан с супервизором через Unix-сокет, супервизор пересылает кадры между воркерами.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, BusHandler] = {}
+        self.worker = 0
+        self.workers = 1
+        self.socket_path: Optional[str] = None
+        self.application = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._requests: Dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count()
+        self.closed: Optional[asyncio.Event] = None
+
+    def configure(self, socket_path: str, worker: int, workers: int) -> None:
+        """Настраивает шину воркера кластера (до start)"""
+        self.socket_path = socket_path
+        self.worker = worker
+        self.workers = workers
+
+    def register(self, topic: str, handler: BusHandler) -> None:
+        """Регистрирует обработчик темы"""
+        self.handlers[topic] = handler
+
+    def owns(self, user_id: Optional[Hashable]) -> bool:
+        """Проверяет, что пользователь принадлежит этому процессу"""
+        return user_id is None or worker_for(user_id, self.workers) == self.worker
+
+    async def start(self, application) -> None:
+        """Подключает шину: обработчики получают бота приложения, обновления от супервизора идут в его очередь"""
+        self.application = application
+        self.closed = asyncio.Event()
+        if self.socket_path is None:
+            return
+        self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+        write_frame(self._writer, {'op': 'hello', 'worker': self.worker})
+        await self._writer.drain()
+        self._task = asyncio.get_running_loop().create_task(self._read_loop())
+        logger.info("Воркер %d из %d подключён к шине %s", self.worker, self.workers, self.socket_path)
+
+    async def stop(self) -> None:
+        """Отключает шину"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            try:
+                # Дописываем рассылки, отправленные при остановке
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _handle(self, topic: str, payload: Any) -> Any:
+        handler = self.handlers.get(topic)
+        if handler is None:
+            raise BusError(f"Нет обработчика темы {topic}")
+        return await handler(self.application.bot, payload)
+
+    async def request(self, user_id: Optional[Hashable], topic: str, payload: Any) -> Any:
+        """Выполняет обработчик темы в процессе, которому принадлежит пользователь, и возвращает результат"""
+        if self._writer is None or self.owns(user_id):
+            return await self._handle(topic, payload)
+
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._requests[request_id] = future
+        try:
+            write_frame(self._writer, {'op': 'request', 'id': request_id, 'from': self.worker,
+                                       'to': worker_for(user_id, self.workers), 'topic': topic, 'payload': payload})
+            await self._writer.drain()
+            return await asyncio.wait_for(future, BUS_REQUEST_TIMEOUT)
+        finally:
+            self._requests.pop(request_id, None)
+
+    def broadcast(self, topic: str, payload: Any) -> None:
+        """Рассылает сообщение остальным процессам (без ожидания)"""
+        if self._writer is not None:
+            write_frame(self._writer, {'op': 'broadcast', 'from': self.worker, 'topic': topic, 'payload': payload})
+
+    async def _serve(self, frame: Dict[str, Any]) -> None:
+        """Выполняет запрос другого воркера и отправляет ответ"""
+        reply = {'op': 'reply', 'id': frame['id'], 'to': frame['from']}
+        try:
+            reply['result'] = await self._handle(frame['topic'], frame['payload'])
+        except Exception as e:
+            logger.exception("Ошибка обработки запроса шины %s", frame['topic'])
+            reply['error'] = f"{type(e).__name__}: {e}"
+        if self._writer is not None:
+            write_frame(self._writer, reply)
+
+    async def _deliver(self, frame: Dict[str, Any]) -> None:
+        """Обрабатывает рассылку другого воркера"""
+        try:
+            await self._handle(frame['topic'], frame['payload'])
+        except Exception:
+            logger.exception("Ошибка обработки рассылки шины %s", frame['topic'])
+
+    async def _read_loop(self) -> None:
+        """Читает кадры от супервизора: обновления, запросы, ответы и рассылки"""
+        from telegram import Update
+
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                frame = await read_frame(self._reader)
+                if frame is None:
+                    logger.warning("Шина закрыта супервизором")
+                    break
+                op = frame['op']
+                if op == 'update':
+                    await self.application.update_queue.put(Update.de_json(frame['update'], self.application.bot))
+                elif op == 'request':
+                    loop.create_task(self._serve(frame))
+                elif op == 'reply':
+                    future = self._requests.get(frame['id'])
+                    if future is not None and not future.done():
+                        if 'error' in frame:
+                            future.set_exception(BusError(frame['error']))
+                        else:
+                            future.set_result(frame.get('result'))
+                elif op == 'broadcast':
+                    loop.create_task(self._deliver(frame))
+        finally:
+            for future in self._requests.values():
+                if not future.done():
+                    future.set_exception(BusError("Шина закрыта"))
+            self.closed.set()
+
+
+# Глобальная шина процесса
+bus = MessageBus()
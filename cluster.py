@@ -0,0 +1,275 @@
+# cluster.py
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from telegram import Bot, Update
+from telegram.error import TelegramError
+
+from bus import bus, read_frame, worker_for, write_frame
+from config import (BOT_TOKEN, BOT_API_URL, CLUSTER_WORKERS, CLUSTER_SOCKET, MAX_PENDING_UPDATES,
+                    POLL_TIMEOUT_SECONDS, STORAGE_BACKEND, UPDATE_MODE)
+from webhook import WebhookServer, set_webhook, webhook_secret_token
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать завершения воркера после SIGTERM, секунды
+_WORKER_STOP_TIMEOUT = 30
+
+
+def update_owner(update: Update) -> Optional[int]:
+    """Пользователь (или чат), по которому обновление распределяется между воркерами"""
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    return None
+
+
+class Supervisor:
+    """
+    Супервизор кластера: получает обновления (long polling или вебхук) и распределяет их по процессам-воркерам
+    по хешу user_id, пересылает кадры шины между воркерами и перезапускает упавшие воркеры.
+    Данные бота супервизор не загружает - с общим хранилищем (SQLite) работают только воркеры.
+    """
+
+    def __init__(self, workers: int = CLUSTER_WORKERS, socket_path: str = CLUSTER_SOCKET):
+        if STORAGE_BACKEND != 'sqlite':
+            raise ValueError(f"Режим 'cluster' требует хранилища 'sqlite', а не '{STORAGE_BACKEND}'")
+        if workers < 1:
+            raise ValueError(f"Некорректное количество воркеров: {workers}")
+        self.workers = workers
+        self.socket_path = os.path.abspath(socket_path)
+        self._context = multiprocessing.get_context('spawn')
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._writers: Dict[int, asyncio.StreamWriter] = {}
+        # Обновления для воркера, который ещё не подключился (запускается или перезапускается)
+        self._pending: List[Deque[Dict[str, Any]]] = [deque() for _ in range(workers)]
+        # Воркер подключён и его очередь передана (ожидание места в переполненной очереди)
+        self._ready: List[asyncio.Event] = [asyncio.Event() for _ in range(workers)]
+        self._stopping: Optional[asyncio.Event] = None
+        self.stats = {'updates': 0, 'stalls': 0, 'restarts': 0}
+
+    # === Процессы воркеров ===
+
+    def _spawn(self, index: int) -> None:
+        process = self._context.Process(target=run_worker, args=(index, self.workers, self.socket_path),
+                                        name=f"bot-worker-{index}")
+        process.start()
+        self._processes[index] = process
+        logger.info("Воркер %d запущен (pid %d)", index, process.pid)
+
+    async def _monitor(self) -> None:
+        """Перезапускает завершившиеся воркеры"""
+        while True:
+            await asyncio.sleep(1)
+            for index, process in enumerate(self._processes):
+                if process is not None and not process.is_alive():
+                    logger.error("Воркер %d завершился (код %s), перезапуск", index, process.exitcode)
+                    self.stats['restarts'] += 1
+                    self._spawn(index)
+
+    async def _stop_workers(self) -> None:
+        """Останавливает воркеры: SIGTERM, ожидание записи их данных, затем SIGKILL"""
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            await asyncio.to_thread(process.join, _WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                logger.error("Воркер %d не завершился за %d с, принудительная остановка", index, _WORKER_STOP_TIMEOUT)
+                process.kill()
+                await asyncio.to_thread(process.join)
+
+    # === Шина ===
+
+    async def _serve_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Соединение с воркером: после приветствия пересылает его запросы, ответы и рассылки"""
+        hello = await read_frame(reader)
+        if hello is None or hello.get('op') != 'hello':
+            writer.close()
+            return
+        index = hello['worker']
+        self._writers[index] = writer
+        logger.info("Воркер %d подключился к шине", index)
+        pending = self._pending[index]
+        while pending:
+            write_frame(writer, {'op': 'update', 'update': pending.popleft()})
+        self._ready[index].set()
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if frame is None:
+                    break
+                self._route(frame)
+        finally:
+            if self._writers.get(index) is writer:
+                del self._writers[index]
+                self._ready[index].clear()
+            writer.close()
+            logger.warning("Воркер %d отключился от шины", index)
+
+    def _route(self, frame: Dict[str, Any]) -> None:
+        """Пересылает кадр шины адресату (запрос, ответ) или всем остальным воркерам (рассылка)"""
+        op = frame['op']
+        if op == 'broadcast':
+            for index, writer in self._writers.items():
+                if index != frame['from']:
+                    write_frame(writer, frame)
+            return
+        writer = self._writers.get(frame['to'])
+        if writer is not None:
+            write_frame(writer, frame)
+        elif op == 'request':
+            # Адресат перезапускается: запрос завершается ошибкой, а не таймаутом
+            sender = self._writers.get(frame['from'])
+            if sender is not None:
+                write_frame(sender, {'op': 'reply', 'id': frame['id'], 'to': frame['from'],
+                                     'error': f"Воркер {frame['to']} недоступен"})
+
+    # === Обновления ===
+
+    async def _dispatch(self, update: Update) -> None:
+        """
+        Отправляет обновление воркеру, которому принадлежит пользователь.
+        Пока воркер не подключён, обновления копятся в его очереди. Переполненная очередь не теряет
+        обновлений: вызов ждёт подключения воркера. Long polling в это время не запрашивает новые
+        обновления (они остаются у Telegram), а вебхук отвечает 503 по _backlog(), и Telegram повторяет запрос.
+        """
+        owner = update_owner(update)
+        index = worker_for(owner, self.workers) if owner is not None else 0
+        data = update.to_dict()
+        self.stats['updates'] += 1
+        while True:
+            writer = self._writers.get(index)
+            if writer is not None:
+                write_frame(writer, {'op': 'update', 'update': data})
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    pass
+                return
+            pending = self._pending[index]
+            if len(pending) < MAX_PENDING_UPDATES:
+                pending.append(data)
+                return
+            self.stats['stalls'] += 1
+            logger.warning("Очередь воркера %d переполнена (%d), приём обновлений приостановлен до его подключения",
+                           index, len(pending))
+            await self._ready[index].wait()
+
+    def _backlog(self) -> int:
+        """Обновления, ждущие подключения воркеров (вебхук отвечает 503, пока их не меньше MAX_PENDING_UPDATES)"""
+        return sum(len(pending) for pending in self._pending)
+
+    async def _poll(self, bot: Bot) -> None:
+        """Получает обновления long polling и распределяет их по воркерам"""
+        await bot.delete_webhook()
+        offset = None
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=POLL_TIMEOUT_SECONDS,
+                                                read_timeout=POLL_TIMEOUT_SECONDS + 10,
+                                                allowed_updates=Update.ALL_TYPES)
+            except TelegramError as e:
+                logger.warning("Ошибка получения обновлений: %s", e)
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                await self._dispatch(update)
+                offset = update.update_id + 1
+
+    async def run(self) -> None:
+        """Запускает воркеры, шину и получение обновлений; работает до SIGINT/SIGTERM"""
+        loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stopping.set)
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._serve_worker, self.socket_path)
+        for index in range(self.workers):
+            self._spawn(index)
+        logger.info("Кластер: %d воркеров, шина %s", self.workers, self.socket_path)
+
+        tasks = [loop.create_task(self._monitor())]
+        webhook = None
+        try:
+            async with Bot(BOT_TOKEN, base_url=BOT_API_URL) as bot:
+                if UPDATE_MODE == 'webhook':
+                    secret_token = webhook_secret_token()
+                    webhook = WebhookServer(bot, self._dispatch, self._backlog, secret_token)
+                    await webhook.start()
+                    await set_webhook(bot, secret_token)
+                else:
+                    tasks.append(loop.create_task(self._poll(bot)))
+                await self._stopping.wait()
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            if webhook is not None:
+                await webhook.stop()
+            await self._stop_workers()
+            server.close()
+            await server.wait_closed()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            logger.info("Кластер остановлен: обновлений %d, остановок приёма из-за переполнения %d, "
+                        "перезапусков воркеров %d", self.stats['updates'], self.stats['stalls'], self.stats['restarts'])
+
+
+def run_supervisor() -> None:
+    """Запускает супервизор кластера"""
+    asyncio.run(Supervisor().run())
+
+
+# === Воркер ===
+
+def _broadcast_changes(changes: Optional[Dict[str, Any]]) -> None:
+    """Рассылает остальным воркерам ключи сущностей, записанных в хранилище"""
+    if changes is not None:
+        changes = {collection: sorted(keys) for collection, keys in changes.items()
+                   if keys and collection != 'dialogs'}
+        if not changes:
+            return
+    bus.broadcast('state_changes', changes)
+
+
+async def _reload_changes(bot, changes: Optional[Dict[str, Any]]) -> int:
+    """Перечитывает сущности, записанные другим воркером (не посреди изменения, растянутого на несколько await)"""
+    from state_manager import user_state
+    async with user_state.locks.barrier.snapshot():
+        return user_state.reload_entities(changes)
+
+
+def run_worker(index: int, workers: int, socket_path: str) -> None:
+    """Точка входа процесса-воркера: обновления и запросы других воркеров приходят через шину"""
+    from main import setup_logging, log_load_report, build_application, serve_application
+
+    setup_logging()
+    bus.configure(socket_path, index, workers)
+
+    from state_manager import user_state
+    from deadlines import deadline_scheduler
+    from archive import archive_scheduler
+    from notifications import contractor_owner
+
+    # Хранилище общее: полная перезапись запрещена, данные исполнителя меняет только его воркер
+    user_state.shared_storage = True
+    # Воркер держит диалоги, обрабатывает сроки и архивирует данные только своих пользователей
+    user_state.retain_dialogs(bus.owns)
+    deadline_scheduler.owns = lambda contractor_login: bus.owns(contractor_owner(contractor_login))
+    archive_scheduler.owns = lambda contractor_login: bus.owns(contractor_owner(contractor_login))
+    user_state.flush_listeners.append(_broadcast_changes)
+    bus.register('state_changes', _reload_changes)
+    log_load_report()
+
+    asyncio.run(serve_application(build_application(with_updater=False)))
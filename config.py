@@ -10,12 +10,157 @@ ADMIN_ID = 7014800288
 # Путь к файлу данных
 DATA_FILE = 'data.json'
 
+# Режим сохранения данных:
+# 'write_behind' - изменения копятся и записываются фоновой задачей,
+# 'durable' - изменение записывается на диск до ответа пользователю (commit после блокировки сущности
+# или в конце обработки обновления), запись идёт в рабочем потоке, а не в event loop
+PERSISTENCE_MODE = os.getenv('PERSISTENCE_MODE', 'write_behind')
+
+# Максимальная задержка фоновой записи (мс)
+SAVE_INTERVAL_MS = 500
+
+# Количество изменений, после которого запись выполняется без ожидания интервала
+SAVE_MAX_PENDING = 100
+
+# Тип хранилища:
+# 'json' - один JSON-файл, переписываемый целиком,
+# 'journal' - снимок + журнал изменений (DATA_FILE + '.journal') со сворачиванием,
+# 'sqlite' - база SQLite рядом с DATA_FILE (data.db); перенос данных: python storage.py migrate,
+# 'sharded' - по файлу на коллекцию и на исполнителя (заказы) в каталоге рядом с DATA_FILE (data.shards)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json')
+
+# Размер журнала (байт), после которого он сворачивается в новый снимок
+JOURNAL_COMPACT_BYTES = 16 * 1024 * 1024
+
+# Формат снимка для хранилищ 'json' и 'journal':
+# 'json' - DATA_FILE,
+# 'binary' - двоичный снимок рядом с DATA_FILE (data.snap): индекс записей читается через mmap,
+# записи - marshal; при первом запуске данные читаются из DATA_FILE и переносятся при первой записи
+SNAPSHOT_FORMAT = os.getenv('SNAPSHOT_FORMAT', 'json')
+
+# Размер порции (байт) при потоковом чтении JSON-снимка
+LOAD_CHUNK_SIZE = 1024 * 1024
+
+# Архив (холодное хранилище): завершённые заказы и закрытые чаты переносятся из памяти
+# в дописываемый файл рядом с DATA_FILE (data.archive) и читаются из него постранично
+ARCHIVE_ENABLED = os.getenv('ARCHIVE_ENABLED', '1') == '1'
+
+# Как часто переносить завершённые заказы и закрытые чаты в архив, секунды
+ARCHIVE_INTERVAL_SECONDS = 60 * 60
+
+# Через сколько дней после создания заказ без активного таймера считается завершённым
+# (истёкшие заказы и заказы с прошедшим сроком архивируются сразу)
+ARCHIVE_ORDER_AGE_DAYS = 30
+
+# Количество записей на странице истории заказов
+ARCHIVE_PAGE_SIZE = 10
+
+# Сколько обновлений обрабатывается одновременно (1 - по одному, как раньше)
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '1'))
+
+# Сколько обновлений принимается в обработку с учётом ждущих своей очереди при CONCURRENT_UPDATES > 1:
+# остальные ждут в очереди приложения (при long polling она тоже ограничена этим числом, вебхук отвечает 503;
+# у воркера кластера очередь не ограничена - обновления распределяет супервизор)
+MAX_PENDING_UPDATES = int(os.getenv('MAX_PENDING_UPDATES', '1024'))
+
+# По какому ключу обновления выполняются строго по очереди при параллельной обработке:
+# 'user' - по отправителю (шаги диалога пользователя не перемешиваются), 'chat' - по чату
+UPDATE_ORDERING = os.getenv('UPDATE_ORDERING', 'user')
+
+# Способ получения обновлений:
+# 'polling' - long polling (getUpdates),
+# 'webhook' - Telegram присылает обновления на встроенный HTTP-сервер (WEBHOOK_URL)
+UPDATE_MODE = os.getenv('UPDATE_MODE', 'polling')
+
+# Публичный HTTPS-адрес вебхука, который регистрируется в Telegram (например, https://bot.example.com/telegram);
+# TLS обычно завершает обратный прокси, передающий запросы на WEBHOOK_LISTEN:WEBHOOK_PORT
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+
+# Адрес, порт и путь, на которых встроенный HTTP-сервер принимает обновления
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+
+# Секрет, который Telegram передаёт в заголовке X-Telegram-Bot-Api-Secret-Token
+# (пусто - генерируется при запуске)
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN', '')
+
+# Сколько одновременных соединений с вебхуком разрешено Telegram
+WEBHOOK_MAX_CONNECTIONS = 40
+
+# Максимальный размер тела запроса вебхука, байт
+WEBHOOK_MAX_BODY = 1024 * 1024
+
+# Адрес Bot API (можно указать локальный сервер Bot API)
+BOT_API_URL = os.getenv('BOT_API_URL', 'https://api.telegram.org/bot')
+
+# Режим запуска:
+# 'single' - один процесс,
+# 'cluster' - супервизор получает обновления и распределяет их по CLUSTER_WORKERS процессам-воркерам
+# по хешу user_id; воркеры общаются через шину на Unix-сокете и работают с общим хранилищем (только 'sqlite')
+RUN_MODE = os.getenv('RUN_MODE', 'single')
+
+# Количество процессов-воркеров в режиме 'cluster'
+CLUSTER_WORKERS = int(os.getenv('CLUSTER_WORKERS', '4'))
+
+# Таймаут long polling супервизора кластера, секунды
+POLL_TIMEOUT_SECONDS = 30
+
+# Unix-сокет шины сообщений кластера
+CLUSTER_SOCKET = os.getenv('CLUSTER_SOCKET', 'bot-cluster.sock')
+
+# Сколько ждать ответа другого воркера на запрос через шину, секунды
+BUS_REQUEST_TIMEOUT = 30
+
+# Проверка согласованности индексов после каждого изменения (для отладки и тестов)
+CHECK_STATE_INVARIANTS = os.getenv('CHECK_STATE_INVARIANTS') == '1'
+
+# Время жизни незавершённого диалога (состояние + ключи диалога в user_data), секунды
+DIALOG_TTL_SECONDS = 24 * 60 * 60
+
+# Как часто удалять устаревшие диалоги, секунды
+DIALOG_EVICT_INTERVAL_SECONDS = 5 * 60
+
+# Как часто сохранять отметку активности диалога без смены состояния, секунды
+DIALOG_TOUCH_SAVE_SECONDS = 60
+
+# Как часто сохранять изменения context.user_data в хранилище, секунды
+DIALOG_PERSIST_INTERVAL_SECONDS = 5
+
+# Ключи context.user_data, относящиеся к диалогам (сохраняются и удаляются вместе с состоянием)
+DIALOG_USER_DATA_KEYS = (
+    'login', 'register_login', 'login_client_login', 'register_client_login', 'client_login',
+    'order_description', 'deadline', 'budget',
+    'site_title', 'site_photos', 'site_album', 'site_description',
+    'video_title', 'video_photos', 'video_album', 'video_description',
+    'delete_title'
+)
+
+# Категории портфолио
+PORTFOLIO_CATEGORIES = ('sites', 'video')
+
+# Сколько разобранных callback_data кнопок держать в кеше маршрутизатора
+ROUTER_CACHE_SIZE = 4096
+
+# Пауза между загрузками картинок портфолио в Telegram при /backfill_media, секунды
+# (бот отправляет их в чат администратора, а в один чат можно отправлять около сообщения в секунду)
+MEDIA_BACKFILL_INTERVAL_SECONDS = 1.0
+
+# Сколько клавиатур с параметрами (по логину исполнителя, по чату) держать в кеше
+KEYBOARD_CACHE_SIZE = 1024
+
 # Начальный рейтинг для новых исполнителей
 DEFAULT_RATING = 10
 
 # Начальный баланс для новых исполнителей
 DEFAULT_BALANCE = 0
 
+# Сколько доступных исполнителей (по убыванию рейтинга) пробовать при отправке заказа
+DISPATCH_MAX_CANDIDATES = 5
+
+# За сколько часов до окончания срока заказа напоминать заказчику и исполнителю
+ORDER_REMINDER_HOURS = (24, 1)
+
 # Настройки для клиентов
 DEFAULT_CLIENT_STATUS = 'active'
 
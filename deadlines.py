@@ -0,0 +1,171 @@
+# deadlines.py
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import ORDER_REMINDER_HOURS
+from state_manager import UserState, user_state
+from models import Order
+from utils import format_time_remaining
+
+logger = logging.getLogger(__name__)
+
+# Индексы полей записи в куче
+_FIRE_AT, _SEQ, _KIND, _HOURS, _CONTRACTOR, _ORDER = range(6)
+
+
+class DeadlineScheduler:
+    """
+    Планировщик сроков заказов.
+    Хранит напоминания и окончания сроков в min-куче по времени срабатывания,
+    фоновая задача спит до ближайшего срока и рассылает уведомления.
+    """
+
+    def __init__(self, state: UserState, reminder_hours: Tuple[int, ...] = ORDER_REMINDER_HOURS):
+        self.state = state
+        self.reminder_hours = reminder_hours
+        self._heap: List[list] = []
+        self._seq = itertools.count()
+        # id(заказа) -> записи кучи этого заказа (для отмены)
+        self._entries: Dict[int, List[list]] = {}
+        self._cancelled = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Обрабатывать только заказы исполнителей, для которых owns(логин) истинно
+        # (воркер кластера обрабатывает сроки заказов своих исполнителей)
+        self.owns: Callable[[str], bool] = lambda contractor_login: True
+
+        state.timer_listeners.append(self.reschedule)
+        for contractor_login, order in state.iter_active_timers():
+            self.reschedule(contractor_login, order)
+
+    def __len__(self) -> int:
+        """Количество запланированных (не отменённых) срабатываний"""
+        return len(self._heap) - self._cancelled
+
+    def reschedule(self, contractor_login: str, order: Order) -> None:
+        """Пересоздаёт срабатывания заказа после изменения его таймера"""
+        self.cancel(order)
+        if not self.state.is_timer_active(order):
+            return
+
+        end_time = order.timer_end
+        now = datetime.now()
+        entries = []
+        for hours in self.reminder_hours:
+            remind_at = end_time - timedelta(hours=hours)
+            if remind_at > now:
+                entries.append([remind_at, next(self._seq), 'remind', hours, contractor_login, order])
+        entries.append([end_time, next(self._seq), 'expire', 0, contractor_login, order])
+
+        earliest = self._heap[0][_FIRE_AT] if self._heap else None
+        for entry in entries:
+            heapq.heappush(self._heap, entry)
+        self._entries[id(order)] = entries
+
+        if self._wakeup is not None and (earliest is None or self._heap[0][_FIRE_AT] < earliest):
+            self._wakeup.set()
+
+    def cancel(self, order: Order) -> None:
+        """Отменяет срабатывания заказа (записи удаляются из кучи лениво)"""
+        for entry in self._entries.pop(id(order), []):
+            if entry[_ORDER] is not None:
+                entry[_ORDER] = None
+                self._cancelled += 1
+
+        # Пересобираем кучу, если отменённых записей стало больше половины
+        if self._cancelled > len(self._heap) // 2:
+            self._heap = [entry for entry in self._heap if entry[_ORDER] is not None]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    def _next_fire_at(self) -> Optional[datetime]:
+        """Время ближайшего срабатывания"""
+        while self._heap and self._heap[0][_ORDER] is None:
+            heapq.heappop(self._heap)
+            self._cancelled -= 1
+        return self._heap[0][_FIRE_AT] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[list]:
+        """Извлекает срабатывания, время которых наступило"""
+        due = []
+        while True:
+            fire_at = self._next_fire_at()
+            if fire_at is None or fire_at > now:
+                return due
+            entry = heapq.heappop(self._heap)
+            entries = self._entries.get(id(entry[_ORDER]))
+            if entries is not None:
+                entries.remove(entry)
+                if not entries:
+                    del self._entries[id(entry[_ORDER])]
+            due.append(entry)
+
+    def start(self, bot) -> None:
+        """Запускает фоновую задачу планировщика"""
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run(bot))
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, bot) -> None:
+        """Спит до ближайшего срока (или до появления более раннего) и обрабатывает наступившие"""
+        while True:
+            self._wakeup.clear()
+            fire_at = self._next_fire_at()
+            timeout = None if fire_at is None else max(0.0, (fire_at - datetime.now()).total_seconds())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            for entry in self.pop_due(datetime.now()):
+                try:
+                    await self._fire(bot, entry)
+                except Exception:
+                    logger.exception("Ошибка при обработке срока заказа")
+
+    async def _fire(self, bot, entry: list) -> None:
+        """Отправляет напоминание или уведомление об окончании срока"""
+        contractor_login, order = entry[_CONTRACTOR], entry[_ORDER]
+        if not self.state.is_timer_active(order) or not self.owns(contractor_login):
+            return
+
+        if entry[_KIND] == 'expire':
+            async with self.state.locks.hold(('contractor', contractor_login)):
+                # Пока ждали блокировку, заказ могли архивировать или переназначить
+                if not self.state.is_timer_active(order):
+                    return
+                self.state.deactivate_order_timer(contractor_login, order, expired=True)
+            client_text = "⏰ Срок выполнения вашего заказа истёк!"
+            contractor_text = "⏰ Срок выполнения заказа истёк!"
+        else:
+            timer_info = format_time_remaining(order.timer_end)
+            client_text = f"⏰ Напоминание о сроке вашего заказа.\n{timer_info}"
+            contractor_text = f"⏰ Напоминание о сроке заказа.\n{timer_info}"
+
+        contractor = self.state.entrepreneurs.get(contractor_login)
+        contractor_chat_id = contractor.chat_id if contractor is not None else None
+        for chat_id, text in ((order.client_chat_id, client_text), (contractor_chat_id, contractor_text)):
+            if chat_id is None:
+                continue
+            try:
+                await bot.send_message(chat_id=chat_id, text=f"{text}\n\n{order.description}")
+            except Exception as e:
+                logger.warning("Не удалось отправить уведомление о сроке в чат %s: %s", chat_id, e)
+
+
+# Глобальный планировщик сроков
+deadline_scheduler = DeadlineScheduler(user_state)
@@ -0,0 +1,132 @@
+# dialogs.py
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from telegram.ext import Application, BasePersistence, PersistenceInput
+
+from config import (DIALOG_USER_DATA_KEYS, DIALOG_TTL_SECONDS, DIALOG_EVICT_INTERVAL_SECONDS,
+                    DIALOG_PERSIST_INTERVAL_SECONDS)
+from state_manager import UserState, user_state
+
+logger = logging.getLogger(__name__)
+
+
+def dialog_keys(user_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Выбирает из context.user_data ключи, относящиеся к диалогам"""
+    return {key: user_data[key] for key in DIALOG_USER_DATA_KEYS if key in user_data}
+
+
+class DialogPersistence(BasePersistence):
+    """
+    Сохраняет ключи диалогов из context.user_data в хранилище бота вместе с состоянием пользователя.
+    Остальные данные (chat_data, bot_data, callback_data) не сохраняются.
+    """
+
+    def __init__(self, state: UserState, update_interval: float = DIALOG_PERSIST_INTERVAL_SECONDS):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.state = state
+
+    async def get_user_data(self) -> Dict[int, Dict[str, Any]]:
+        return self.state.get_dialog_data()
+
+    async def update_user_data(self, user_id: int, data: Dict[str, Any]) -> None:
+        self.state.set_dialog_data(user_id, dialog_keys(data))
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self.state.set_dialog_data(user_id, {})
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[str, Any]) -> None:
+        pass
+
+    # chat_data, bot_data, callback_data и разговоры не сохраняются
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Any) -> None:
+        pass
+
+    async def get_bot_data(self) -> Dict[str, Any]:
+        return {}
+
+    async def update_bot_data(self, data: Any) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Any) -> None:
+        pass
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_conversation(self, name: str, key: Any, new_state: Optional[object]) -> None:
+        pass
+
+    async def flush(self) -> None:
+        await self.state.flush()
+
+
+class DialogEvictor:
+    """Фоновая задача, удаляющая устаревшие диалоги и их ключи из context.user_data"""
+
+    def __init__(self, state: UserState, ttl: float = DIALOG_TTL_SECONDS,
+                 interval: float = DIALOG_EVICT_INTERVAL_SECONDS):
+        self.state = state
+        self.ttl = ttl
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def evict(self, application: Application) -> int:
+        """Удаляет устаревшие диалоги, возвращает их количество"""
+        evicted = self.state.evict_stale_dialogs(self.ttl)
+        for user_id in evicted:
+            user_data = application.user_data.get(user_id)
+            if user_data is None:
+                continue
+            for key in DIALOG_USER_DATA_KEYS:
+                user_data.pop(key, None)
+        return len(evicted)
+
+    def start(self, application: Application) -> None:
+        """Запускает фоновую задачу"""
+        self._task = asyncio.get_running_loop().create_task(self._run(application))
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, application: Application) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                evicted = self.evict(application)
+                if evicted:
+                    logger.info("Удалено устаревших диалогов: %d", evicted)
+            except Exception:
+                logger.exception("Ошибка при удалении устаревших диалогов")
+
+
+# Глобальные объекты сохранения и очистки диалогов
+dialog_persistence = DialogPersistence(user_state)
+dialog_evictor = DialogEvictor(user_state)
@@ -0,0 +1,136 @@
+# fsm.py
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from router import CallbackRouter
+from state_manager import user_state
+
+logger = logging.getLogger(__name__)
+
+# Обработчик состояния: (update, context, text, **аргументы) -> следующее состояние
+StateHandler = Callable[..., Awaitable[Any]]
+
+# События, на которые отвечают состояния: текстовое сообщение и фото
+EVENTS = ('text', 'photo')
+
+
+class _Stay:
+    def __repr__(self) -> str:
+        return 'STAY'
+
+
+# Результат обработчика: остаться в текущем состоянии (ответ некорректен, чат продолжается)
+STAY = _Stay()
+
+
+class State:
+    """Состояние диалога в таблице автомата: обработчик события и состояния, в которые из него можно перейти"""
+
+    __slots__ = ('pattern', 'handler', 'event', 'transitions', 'kwargs')
+
+    def __init__(self, pattern: str, handler: StateHandler, event: str, transitions: Tuple[str, ...],
+                 kwargs: Dict[str, Any]):
+        self.pattern = pattern
+        self.handler = handler
+        self.event = event
+        self.transitions = transitions
+        self.kwargs = kwargs
+
+    def __repr__(self) -> str:
+        handler = getattr(self.handler, '__qualname__', repr(self.handler))
+        transitions = ', '.join(self.transitions) or '-'
+        return f"State({self.pattern!r} [{self.event}] -> {handler}; переходы: {transitions})"
+
+
+class StateMachine:
+    """
+    Конечный автомат диалогов: состояния, их обработчики и переходы в одной таблице.
+    Состояние пользователя хранится в user_state строкой. Шаблоны состояний - те же, что у маршрутов кнопок
+    (router.Route): 'order_budget', 'new_rating_{login}'; состояние ищется так же - по словарю или
+    префиксному дереву, аргументы разбираются один раз и передаются обработчику.
+    Обработчик возвращает следующее состояние: строку (должна подходить под один из объявленных переходов),
+    None - диалог завершён, STAY - состояние не меняется.
+    """
+
+    def __init__(self):
+        self._routers: Dict[str, CallbackRouter] = {event: CallbackRouter() for event in EVENTS}
+        self._states: List[State] = []
+
+    def add(self, pattern: str, handler: StateHandler, event: str = 'text', transitions: Tuple[str, ...] = (),
+            **kwargs: Any) -> State:
+        """Добавляет состояние; kwargs передаются обработчику вместе с аргументами из состояния"""
+        router = self._routers.get(event)
+        if router is None:
+            raise ValueError(f"Неизвестное событие {event} состояния {pattern}")
+        state = State(pattern, handler, event, tuple(transitions), kwargs)
+        router.add(pattern, state, **kwargs)
+        self._states.append(state)
+        return state
+
+    def state(self, pattern: str, event: str = 'text', transitions: Tuple[str, ...] = (),
+              **kwargs: Any) -> Callable[[StateHandler], StateHandler]:
+        """Декоратор регистрации обработчика состояния; можно применять несколько раз к одной функции"""
+        def decorator(handler: StateHandler) -> StateHandler:
+            self.add(pattern, handler, event, transitions, **kwargs)
+            return handler
+        return decorator
+
+    def resolve(self, current: str, event: str = 'text') -> Optional[Tuple[State, Dict[str, Any]]]:
+        """
+        Находит запись таблицы State для состояния current и аргументы, разобранные из него;
+        None - состояние не обрабатывает событие
+        """
+        resolved = self._routers[event].resolve(current)
+        if resolved is None:
+            return None
+        # В маршрутизаторе запись State хранится на месте обработчика маршрута
+        route, args = resolved
+        return route.handler, args
+
+    def _pattern_of(self, current: str) -> Optional[str]:
+        """Шаблон, под который подходит состояние (в таблице любого события)"""
+        for router in self._routers.values():
+            resolved = router.resolve(current)
+            if resolved is not None:
+                return resolved[0].pattern
+        return None
+
+    async def dispatch(self, update: Any, context: Any, current: str, event: str = 'text') -> bool:
+        """Вызывает обработчик состояния и выполняет переход; False - состояние не обрабатывает событие"""
+        resolved = self._routers[event].resolve(current)
+        if resolved is None:
+            return False
+        route, args = resolved
+        state: State = route.handler
+        message = update.message
+        text = message.text.strip() if message.text else ""
+
+        target = await state.handler(update, context, text, **state.kwargs, **args)
+        if target is STAY:
+            return True
+        if target is not None and self._pattern_of(target) not in state.transitions:
+            raise ValueError(f"Переход {current} -> {target} не объявлен в таблице состояний")
+        logger.debug("Переход %s -> %s", current, target)
+        user_state.set_state(message.from_user.id, target)
+        return True
+
+    def validate(self) -> None:
+        """Проверяет, что все объявленные переходы ведут в зарегистрированные состояния"""
+        patterns = {state.pattern for state in self._states}
+        for state in self._states:
+            unknown = [target for target in state.transitions if target not in patterns]
+            if unknown:
+                raise ValueError(f"Состояние {state.pattern} ссылается на неизвестные состояния {unknown}")
+
+    @property
+    def states(self) -> List[State]:
+        """Таблица состояний в порядке регистрации"""
+        return list(self._states)
+
+    def describe(self) -> str:
+        """Таблица состояний и переходов текстом (для отладки)"""
+        return '\n'.join(repr(state) for state in sorted(self._states, key=lambda state: state.pattern))
+
+
+# Глобальный автомат диалогов
+state_machine = StateMachine()
@@ -1,10 +1,23 @@
 # handlers_admin.py
+import logging
+from typing import Any
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import MediaGroupLimit
 from telegram.ext import ContextTypes
+from config import ADMIN_ID, MEDIA_BACKFILL_INTERVAL_SECONDS, PORTFOLIO_CATEGORIES
+from fsm import state_machine, STAY
+from keyboards import (ADMIN_MENU, ADMIN_PORTFOLIO_MENU, ADMIN_DELETE_CATEGORY_MENU, ADMIN_VIEW_CATEGORY_MENU,
+                       entrepreneur_actions_keyboard)
+from media import backfill, find_pending, is_url, pending_upload, send_album, upload
+from notifications import update_contractor
+from router import callback_router
 from state_manager import user_state
 from utils import format_entrepreneur_info, format_entrepreneur_list_item, is_valid_rating
 
+logger = logging.getLogger(__name__)
 
+
+@callback_router.route('all_entrepreneurs')
 async def all_entrepreneurs(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показывает всех исполнителей"""
     entrepreneurs = user_state.entrepreneurs
@@ -12,9 +25,9 @@ async def all_entrepreneurs(update: Update, context: ContextTypes.DEFAULT_TYPE)
     keyboard = []
 
     for login in entrepreneurs:
-        entrepreneur_data = entrepreneurs[login]
-        balance = entrepreneur_data.get('balance', 0)
-        rating = entrepreneur_data['rating']
+        entrepreneur = entrepreneurs[login]
+        balance = entrepreneur.balance
+        rating = entrepreneur.rating
         keyboard.append([
             InlineKeyboardButton(
                 format_entrepreneur_list_item(login, rating, balance),
@@ -29,36 +42,31 @@ async def all_entrepreneurs(update: Update, context: ContextTypes.DEFAULT_TYPE)
     )
 
 
+@callback_router.route('admin_back')
+async def admin_back(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Возврат в главное админ меню"""
+    await update.callback_query.edit_message_text("Добро пожаловать, Администратор!", reply_markup=ADMIN_MENU)
+
+
+@callback_router.route('portfolio_menu')
 async def admin_portfolio_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Меню управления портфолио"""
-    keyboard = [
-        [InlineKeyboardButton("➕ Добавить сайт", callback_data='add_portfolio_sites')],
-        [InlineKeyboardButton("➕ Добавить видео", callback_data='add_portfolio_video')],
-        [InlineKeyboardButton("📋 Просмотреть портфолио", callback_data='view_portfolio')],
-        [InlineKeyboardButton("🗑 Удалить элемент", callback_data='delete_portfolio_start')],
-        [InlineKeyboardButton("← Назад в админ панель", callback_data='admin_back')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await update.callback_query.edit_message_text(
         "Управление портфолио:",
-        reply_markup=reply_markup
+        reply_markup=ADMIN_PORTFOLIO_MENU
     )
 
 
+@callback_router.route('delete_portfolio_start')
 async def delete_portfolio_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Начало процесса удаления - выбор категории"""
-    keyboard = [
-        [InlineKeyboardButton("🌐 Сайты", callback_data='delete_category_sites')],
-        [InlineKeyboardButton("🎬 Видео", callback_data='delete_category_video')],
-        [InlineKeyboardButton("← Назад", callback_data='portfolio_menu')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await update.callback_query.edit_message_text(
         "Выберите категорию для удаления:",
-        reply_markup=reply_markup
+        reply_markup=ADMIN_DELETE_CATEGORY_MENU
     )
 
 
+@callback_router.route('delete_category_{category:category}')
 async def delete_category_items(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str) -> None:
     """Показ элементов категории для удаления"""
     portfolio_items = user_state.get_portfolio_items(category)
@@ -79,7 +87,7 @@ async def delete_category_items(update: Update, context: ContextTypes.DEFAULT_TY
     keyboard = []
     for i, item in enumerate(portfolio_items):
         # Ограничиваем длину названия для кнопки
-        title = item['title']
+        title = item.title
         if len(title) > 30:
             title = title[:27] + "..."
 
@@ -97,6 +105,7 @@ async def delete_category_items(update: Update, context: ContextTypes.DEFAULT_TY
     )
 
 
+@callback_router.route('delete_item_{category:category}_{index:int}')
 async def delete_item_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str, index: int) -> None:
     """Подтверждение удаления элемента"""
     portfolio_items = user_state.get_portfolio_items(category)
@@ -104,103 +113,46 @@ async def delete_item_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE
     if 0 <= index < len(portfolio_items):
         item = portfolio_items[index]
 
-        # Сохраняем данные для текстового подтверждения
-        context.user_data['delete_category'] = category
-        context.user_data['delete_index'] = index
-        context.user_data['delete_title'] = item['title']
+        # Название - для ответа на текстовое подтверждение (категория и индекс - в состоянии)
+        context.user_data['delete_title'] = item.title
 
         await update.callback_query.edit_message_text(
             f"❗ Вы точно хотите удалить:\n\n"
-            f"📋 '{item['title']}'\n"
-            f"📝 {item['description'][:100]}{'...' if len(item['description']) > 100 else ''}\n\n"
+            f"📋 '{item.title}'\n"
+            f"📝 {item.description[:100]}{'...' if len(item.description) > 100 else ''}\n\n"
             f"⚠️ Это действие нельзя отменить!\n\n"
             f"Напишите 'да' для подтверждения или 'нет' для отмены."
         )
 
         # Устанавливаем состояние ожидания подтверждения
-        user_state.set_state(update.callback_query.from_user.id, f'delete_confirm_{category}_{index}')
+        user_state.set_state(update.callback_query.from_user.id, f'confirm_delete_item_{category}_{index}')
     else:
         await update.callback_query.edit_message_text("Элемент не найден.")
 
 
-async def handle_delete_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE, state: str) -> bool:
-    """Обрабатывает текстовое подтверждение удаления"""
-    if not state.startswith('delete_confirm_'):
-        return False
-
-    user_id = update.message.from_user.id
-    response = update.message.text.lower().strip()
-
-    # Извлекаем данные из контекста
-    category = context.user_data.get('delete_category')
-    index = context.user_data.get('delete_index')
+@state_machine.state('confirm_delete_item_{category:category}_{index:int}')
+async def confirm_portfolio_delete(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, category: str,
+                                   index: int) -> Any:
+    """Текстовое подтверждение удаления элемента портфолио"""
+    response = text.lower()
     title = context.user_data.get('delete_title', 'Неизвестный элемент')
 
     if response == 'да':
-        # Удаляем элемент
         if user_state.delete_portfolio_item(category, index):
             await update.message.reply_text(f"✅ Элемент '{title}' успешно удален!")
-
-            # Отправляем обновленный список категории
-            await send_updated_category_list(update, context, category)
         else:
             await update.message.reply_text("❌ Ошибка при удалении элемента.")
-
     elif response == 'нет':
         await update.message.reply_text("❌ Удаление отменено.")
-
-        # Возвращаемся к списку элементов категории
-        await send_updated_category_list(update, context, category)
     else:
         await update.message.reply_text("❓ Пожалуйста, напишите 'да' или 'нет'.")
-        return True  # Не сбрасываем состояние, ждем корректный ответ
+        return STAY  # Не сбрасываем состояние, ждем корректный ответ
 
-    # Очищаем данные и состояние
-    context.user_data.pop('delete_category', None)
-    context.user_data.pop('delete_index', None)
     context.user_data.pop('delete_title', None)
-    user_state.set_state(user_id, None)
-
-    return True
-
-
-async def send_updated_category_list(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str) -> None:
-    """Отправляет обновленный список элементов категории"""
-    portfolio_items = user_state.get_portfolio_items(category)
-    category_names = {'sites': 'сайтов', 'video': 'видео'}
-    category_name = category_names.get(category, category)
-
-    if not portfolio_items:
-        keyboard = [
-            [InlineKeyboardButton("← Назад", callback_data='delete_portfolio_start')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(
-            f"В категории {category_name} больше нет элементов.",
-            reply_markup=reply_markup
-        )
-        return
-
-    keyboard = []
-    for i, item in enumerate(portfolio_items):
-        title = item['title']
-        if len(title) > 30:
-            title = title[:27] + "..."
-
-        keyboard.append([InlineKeyboardButton(
-            f"🗑 {title}",
-            callback_data=f'delete_item_{category}_{i}'
-        )])
-
-    keyboard.append([InlineKeyboardButton("← Назад", callback_data='delete_portfolio_start')])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await update.message.reply_text(
-        f"Выберите {category_name[:-2]} для удаления ({len(portfolio_items)} элементов):",
-        reply_markup=reply_markup
-    )
+    return None
 
 
+@callback_router.route('add_portfolio_{category:category}')
 async def add_portfolio_start(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str) -> None:
     """Начало добавления элемента портфолио"""
     category_names = {'sites': 'сайт', 'video': 'видео'}
@@ -211,20 +163,16 @@ async def add_portfolio_start(update: Update, context: ContextTypes.DEFAULT_TYPE
     user_state.set_state(update.callback_query.from_user.id, f'add_{category}_title')
 
 
+@callback_router.route('view_portfolio')
 async def view_portfolio_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Просмотр портфолио для админа"""
-    keyboard = [
-        [InlineKeyboardButton("🌐 Сайты", callback_data='admin_view_sites')],
-        [InlineKeyboardButton("🎬 Видео", callback_data='admin_view_video')],
-        [InlineKeyboardButton("← Назад", callback_data='portfolio_menu')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await update.callback_query.edit_message_text(
         "Выберите категорию для просмотра:",
-        reply_markup=reply_markup
+        reply_markup=ADMIN_VIEW_CATEGORY_MENU
     )
 
 
+@callback_router.route('admin_view_{category:category}')
 async def view_category_admin(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str) -> None:
     """Просмотр категории портфолио для админа"""
     portfolio_items = user_state.get_portfolio_items(category)
@@ -243,7 +191,7 @@ async def view_category_admin(update: Update, context: ContextTypes.DEFAULT_TYPE
     keyboard = []
     for i, item in enumerate(portfolio_items):
         keyboard.append([InlineKeyboardButton(
-            f"📋 {item['title']}",
+            f"📋 {item.title}",
             callback_data=f'admin_item_{category}_{i}'
         )])
 
@@ -256,6 +204,7 @@ async def view_category_admin(update: Update, context: ContextTypes.DEFAULT_TYPE
     )
 
 
+@callback_router.route('admin_item_{category:category}_{index:int}')
 async def show_portfolio_item_admin(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str,
                                     index: int) -> None:
     """Показ элемента портфолио для админа"""
@@ -264,15 +213,15 @@ async def show_portfolio_item_admin(update: Update, context: ContextTypes.DEFAUL
     if 0 <= index < len(portfolio_items):
         item = portfolio_items[index]
 
-        text = f"🎯 {item['title']}\n\n{item['description']}"
+        text = f"🎯 {item.title}\n\n{item.description}"
 
-        if item.get('links'):
+        if item.links:
             text += "\n\n🔗 Ссылки:"
-            for link in item['links']:
+            for link in item.links:
                 text += f"\n• {link}"
 
-        if item.get('images'):
-            text += f"\n\n📸 Изображений: {len(item['images'])}"
+        if item.images:
+            text += f"\n\n📸 Изображений: {len(item.images)}"
 
         keyboard = [
             [InlineKeyboardButton("🗑 Удалить", callback_data=f'delete_confirm_{category}_{index}')],
@@ -285,6 +234,7 @@ async def show_portfolio_item_admin(update: Update, context: ContextTypes.DEFAUL
         await update.callback_query.edit_message_text("Элемент не найден.")
 
 
+@callback_router.route('delete_confirm_{category:category}_{index:int}')
 async def delete_portfolio_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str,
                                    index: int) -> None:
     """Подтверждение удаления элемента портфолио"""
@@ -299,13 +249,14 @@ async def delete_portfolio_confirm(update: Update, context: ContextTypes.DEFAULT
         reply_markup = InlineKeyboardMarkup(keyboard)
 
         await update.callback_query.edit_message_text(
-            f"Вы уверены, что хотите удалить '{item['title']}'?",
+            f"Вы уверены, что хотите удалить '{item.title}'?",
             reply_markup=reply_markup
         )
     else:
         await update.callback_query.edit_message_text("Элемент не найден.")
 
 
+@callback_router.route('delete_execute_{category:category}_{index:int}')
 async def execute_portfolio_delete(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str,
                                    index: int) -> None:
     """Выполнение удаления элемента портфолио"""
@@ -319,38 +270,164 @@ async def execute_portfolio_delete(update: Update, context: ContextTypes.DEFAULT
         await update.callback_query.edit_message_text("Ошибка при удалении элемента.")
 
 
-async def handle_portfolio_addition(update: Update, context: ContextTypes.DEFAULT_TYPE, state: str) -> bool:
-    """УДАЛЕНА - теперь обработка в text_handler.py через handle_old_portfolio_format"""
-    # Эта функция больше не используется
-    return False
+# Тексты шагов добавления элемента портфолио и префикс ключей context.user_data по категориям
+_PORTFOLIO_ADDITION = {
+    'sites': {
+        'key': 'site',
+        'photo': "Отправьте фото (картинками, можно альбомом) или ссылки на фото, затем напишите «готово»:",
+        'photo_again': "Отправьте фото или ссылку на фото, затем напишите «готово»",
+        'photo_saved': "✅ Фото сохранено ({count}). Отправьте ещё или напишите «готово»",
+        'link': "Введите ссылку на сайт:",
+        'added': "✅ Сайт '{title}' добавлен!"
+    },
+    'video': {
+        'key': 'video',
+        'photo': "Отправьте превью (картинками, можно альбомом) или ссылки, затем напишите «готово»:",
+        'photo_again': "Отправьте превью или ссылку, затем напишите «готово»",
+        'photo_saved': "✅ Превью сохранено ({count}). Отправьте ещё или напишите «готово»",
+        'link': "Введите ссылку на видео:",
+        'added': "✅ Видео '{title}' добавлено!"
+    }
+}
+
+
+@state_machine.state('add_sites_title', transitions=('add_sites_photo',), category='sites')
+@state_machine.state('add_video_title', transitions=('add_video_photo',), category='video')
+async def add_portfolio_title(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, category: str) -> str:
+    """Добавление элемента портфолио: название"""
+    steps = _PORTFOLIO_ADDITION[category]
+    context.user_data[f"{steps['key']}_title"] = text
+    await update.message.reply_text(steps['photo'])
+    return f'add_{category}_photo'
+
+
+# Слово, которым администратор заканчивает отправку фото
+_PHOTOS_DONE = 'готово'
+
+
+@state_machine.state('add_sites_photo', transitions=('add_sites_description',), category='sites')
+@state_machine.state('add_video_photo', transitions=('add_video_description',), category='video')
+async def add_portfolio_photo_link(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                   category: str) -> Any:
+    """Добавление элемента портфолио: ссылка на фото или «готово» - переход к описанию"""
+    steps = _PORTFOLIO_ADDITION[category]
+    photos = context.user_data.setdefault(f"{steps['key']}_photos", [])
+
+    if text.lower() == _PHOTOS_DONE:
+        if not photos:
+            await update.message.reply_text(steps['photo_again'])
+            return STAY
+        context.user_data.pop(f"{steps['key']}_album", None)
+        await update.message.reply_text("Введите описание:")
+        return f'add_{category}_description'
+
+    if not is_url(text):
+        await update.message.reply_text(steps['photo_again'])
+        return STAY
+    if len(photos) >= MediaGroupLimit.MAX_MEDIA_LENGTH:
+        await update.message.reply_text(f"⚠️ Можно добавить не больше {MediaGroupLimit.MAX_MEDIA_LENGTH} фото. "
+                                        f"Напишите «готово»")
+        return STAY
+
+    photos.append(text)
+    context.user_data.pop(f"{steps['key']}_album", None)
+    await update.message.reply_text(steps['photo_saved'].format(count=len(photos)))
+    return STAY
+
+
+@state_machine.state('add_sites_photo', event='photo', category='sites')
+@state_machine.state('add_video_photo', event='photo', category='video')
+async def add_portfolio_photo(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, category: str) -> Any:
+    """
+    Добавление элемента портфолио: фото картинкой (сохраняется file_id самого большого размера).
+    Альбом приходит отдельным сообщением на каждое фото с общим media_group_id: отвечаем только
+    на первое фото альбома, чтобы не присылать администратору по ответу на каждую картинку.
+    """
+    steps = _PORTFOLIO_ADDITION[category]
+    message = update.message
+    photos = context.user_data.setdefault(f"{steps['key']}_photos", [])
+    album_key = f"{steps['key']}_album"
+    album = message.media_group_id
+    first_in_album = album is None or context.user_data.get(album_key, {}).get('id') != album
+    if first_in_album:
+        context.user_data[album_key] = {'id': album, 'warned': False}
+
+    if len(photos) >= MediaGroupLimit.MAX_MEDIA_LENGTH:
+        if not context.user_data[album_key]['warned']:
+            context.user_data[album_key]['warned'] = True
+            await message.reply_text(f"⚠️ Можно добавить не больше {MediaGroupLimit.MAX_MEDIA_LENGTH} фото, "
+                                     f"лишние не сохранены. Напишите «готово»")
+        return STAY
+
+    photo_file_id = message.photo[-1].file_id
+    photos.append(photo_file_id)
+    if first_in_album:
+        await message.reply_text(steps['photo_saved'].format(count=len(photos)))
+    return STAY
+
+
+@state_machine.state('add_sites_description', transitions=('add_sites_link',), category='sites')
+@state_machine.state('add_video_description', transitions=('add_video_link',), category='video')
+async def add_portfolio_description(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                    category: str) -> str:
+    """Добавление элемента портфолио: описание"""
+    steps = _PORTFOLIO_ADDITION[category]
+    context.user_data[f"{steps['key']}_description"] = text
+    await update.message.reply_text(steps['link'])
+    return f'add_{category}_link'
+
+
+@state_machine.state('add_sites_link', category='sites')
+@state_machine.state('add_video_link', category='video')
+async def add_portfolio_link(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, category: str) -> None:
+    """Добавление элемента портфолио: ссылка; элемент сохраняется"""
+    key = _PORTFOLIO_ADDITION[category]['key']
+
+    title = context.user_data.get(f'{key}_title', 'Без названия')
+    photos = list(context.user_data.get(f'{key}_photos', []))
+    description = context.user_data.get(f'{key}_description', 'Без описания')
+
+    item = user_state.add_portfolio_item(category, title, description, photos, [text])
+    await update.message.reply_text(_PORTFOLIO_ADDITION[category]['added'].format(title=title))
+
+    uploads = [pending_upload(item, photo) for photo in photos]
+    if any(uploads):
+        # Telegram скачивает картинку по ссылке один раз: администратор видит превью, а клиентам она
+        # отправляется по file_id
+        chat_id = update.message.from_user.id
+        try:
+            if len(photos) == 1:
+                await upload(context.bot, chat_id, category, item, photos[0], caption="Превью")
+            else:
+                await send_album(context.bot, chat_id, category, item, photos, uploads, caption="Превью")
+        except Exception as e:
+            logger.warning("Не удалось загрузить фото по ссылке для '%s'", title, exc_info=True)
+            await update.message.reply_text(f"⚠️ Не удалось загрузить фото по ссылке ({e}), клиенты увидят текст.")
 
+    for field in ('title', 'photos', 'album', 'description'):
+        context.user_data.pop(f'{key}_{field}', None)
+    return None
 
-# Остальные функции остаются без изменений...
 
+@callback_router.route('entrepreneur_{login}')
 async def entrepreneur_details(update: Update, context: ContextTypes.DEFAULT_TYPE, login: str) -> None:
     """Показывает детали исполнителя"""
     query = update.callback_query
 
     if login in user_state.entrepreneurs:
-        entrepreneur_data = user_state.entrepreneurs[login]
-        password = entrepreneur_data['password']
-        rating = entrepreneur_data['rating']
-        balance = entrepreneur_data.get('balance', 0)
-        chat_id = entrepreneur_data.get('chat_id')
-
-        keyboard = [
-            [InlineKeyboardButton("Поменять рейтинг", callback_data=f'change_rating_{login}')],
-            [InlineKeyboardButton("Изменить баланс", callback_data=f'change_balance_{login}')],
-            [InlineKeyboardButton("Удалить исполнителя", callback_data=f'delete_entrepreneur_{login}')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        entrepreneur = user_state.entrepreneurs[login]
+        password = entrepreneur.password
+        rating = entrepreneur.rating
+        balance = entrepreneur.balance
+        chat_id = entrepreneur.chat_id
 
         info_text = format_entrepreneur_info(login, password, rating, balance, chat_id)
-        await query.edit_message_text(info_text, reply_markup=reply_markup)
+        await query.edit_message_text(info_text, reply_markup=entrepreneur_actions_keyboard(login))
     else:
         await query.edit_message_text("Исполнитель не найден.")
 
 
+@callback_router.route('change_rating_{login}')
 async def change_rating(update: Update, context: ContextTypes.DEFAULT_TYPE, login: str) -> None:
     """Запрос на изменение рейтинга"""
     query = update.callback_query
@@ -358,6 +435,7 @@ async def change_rating(update: Update, context: ContextTypes.DEFAULT_TYPE, logi
     user_state.set_state(query.from_user.id, f'new_rating_{login}')
 
 
+@callback_router.route('change_balance_{login}')
 async def change_balance(update: Update, context: ContextTypes.DEFAULT_TYPE, login: str) -> None:
     """Запрос на изменение баланса"""
     query = update.callback_query
@@ -365,127 +443,131 @@ async def change_balance(update: Update, context: ContextTypes.DEFAULT_TYPE, log
     user_state.set_state(query.from_user.id, f'new_balance_{login}')
 
 
+@callback_router.route('delete_entrepreneur_{login}')
 async def delete_entrepreneur_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE, login: str) -> None:
     """Подтверждение удаления исполнителя"""
     query = update.callback_query
     await query.edit_message_text(
         f"Вы точно хотите удалить исполнителя {login}? Напишите 'да' или 'нет'."
     )
-    user_state.set_state(query.from_user.id, f'delete_confirm_{login}')
+    user_state.set_state(query.from_user.id, f'confirm_delete_entrepreneur_{login}')
 
 
-async def handle_registration_process(update: Update, context: ContextTypes.DEFAULT_TYPE, state: str) -> bool:
-    """
-    Обрабатывает процесс регистрации исполнителя.
-    Возвращает True, если сообщение было обработано этим хендлером.
-    """
-    user_id = update.message.from_user.id
+@state_machine.state('register_login', transitions=('register_password',))
+async def register_login(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> str:
+    """Регистрация исполнителя: логин"""
+    context.user_data['register_login'] = text
+    await update.message.reply_text("Введите пароль:")
+    return 'register_password'
 
-    if state == 'register_login':
-        context.user_data['register_login'] = update.message.text
-        await update.message.reply_text("Введите пароль:")
-        user_state.set_state(user_id, 'register_password')
-        return True
 
-    elif state == 'register_password':
-        login = context.user_data.get('register_login')
-        password = update.message.text
+@state_machine.state('register_password')
+async def register_password(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> None:
+    """Регистрация исполнителя: пароль"""
+    login = context.user_data.get('register_login')
 
-        if login:
-            user_state.register_entrepreneur(login, password, chat_id=user_id)
-            await update.message.reply_text("Данные сохранены в системе!")
+    if login:
+        user_state.register_entrepreneur(login, text, chat_id=update.message.from_user.id)
+        await update.message.reply_text(f"✅ Исполнитель {login} зарегистрирован!")
+    else:
+        await update.message.reply_text("❌ Ошибка при регистрации.")
+    return None
+
+
+@state_machine.state('new_rating_{login}')
+async def new_rating(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, login: str) -> None:
+    """Изменение рейтинга исполнителя"""
+    try:
+        rating = int(text)
+        if is_valid_rating(rating):
+            if await update_contractor(login, 'rating', rating):
+                await update.message.reply_text("✅ Рейтинг обновлен!")
+            else:
+                await update.message.reply_text("❌ Исполнитель не найден.")
+        else:
+            await update.message.reply_text("❌ Рейтинг должен быть от 1 до 10.")
+    except ValueError:
+        await update.message.reply_text("❌ Введите число.")
+    return None
+
+
+@state_machine.state('new_balance_{login}')
+async def new_balance(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, login: str) -> None:
+    """Изменение баланса исполнителя"""
+    try:
+        balance = float(text.replace(' ', ''))
+        if await update_contractor(login, 'balance', balance):
+            await update.message.reply_text("✅ Баланс обновлен!")
         else:
-            await update.message.reply_text("Ошибка при регистрации.")
+            await update.message.reply_text("❌ Исполнитель не найден.")
+    except ValueError:
+        await update.message.reply_text("❌ Введите корректную сумму.")
+    return None
+
 
-        user_state.set_state(user_id, None)
-        return True
+@state_machine.state('confirm_delete_entrepreneur_{login}')
+async def confirm_entrepreneur_delete(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                      login: str) -> Any:
+    """Текстовое подтверждение удаления исполнителя"""
+    response = text.lower()
 
-    return False
+    if response == 'да':
+        if await update_contractor(login, 'delete'):
+            await update.message.reply_text(f"✅ Исполнитель {login} удален.")
+        else:
+            await update.message.reply_text("❌ Исполнитель не найден.")
+    elif response == 'нет':
+        await update.message.reply_text("❌ Удаление отменено.")
+    else:
+        await update.message.reply_text("❓ Пожалуйста, введите 'да' или 'нет'.")
+        return STAY  # Не сбрасываем состояние
+    return None
 
 
-async def handle_admin_updates(update: Update, context: ContextTypes.DEFAULT_TYPE, state: str) -> bool:
+@state_machine.state('delete_confirm_{target}')
+async def legacy_delete_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                     target: str) -> Any:
     """
-    Обрабатывает административные обновления (рейтинг, баланс, удаление).
-    Возвращает True, если сообщение было обработано этим хендлером.
+    Подтверждение удаления в прежнем формате состояния, общем для исполнителей и портфолио
+    (такие состояния могли остаться в сохранённых диалогах): 'delete_confirm_sites_3' - элемент портфолио,
+    иначе - логин исполнителя.
     """
-    user_id = update.message.from_user.id
-
-    # Обработка подтверждения удаления портфолио
-    if await handle_delete_confirmation(update, context, state):
-        return True
-
-    # Обработка изменения рейтинга
-    if state.startswith('new_rating_'):
-        login = state.split('_')[2]
-        try:
-            rating = int(update.message.text)
-            if is_valid_rating(rating):
-                if user_state.update_entrepreneur_rating(login, rating):
-                    await update.message.reply_text("Рейтинг обновлен!")
-                else:
-                    await update.message.reply_text("Исполнитель не найден.")
-            else:
-                await update.message.reply_text("Рейтинг должен быть от 1 до 10.")
-        except ValueError:
-            await update.message.reply_text("Введите число.")
-        user_state.set_state(user_id, None)
-        return True
-
-    # Обработка изменения баланса
-    elif state.startswith('new_balance_'):
-        login = state.split('_')[2]
-        try:
-            balance = float(update.message.text.replace(' ', ''))
-            if user_state.set_entrepreneur_balance(login, balance):
-                await update.message.reply_text("Баланс обновлен!")
-            else:
-                await update.message.reply_text("Исполнитель не найден.")
-        except ValueError:
-            await update.message.reply_text("Введите корректную сумму.")
-        user_state.set_state(user_id, None)
-        return True
-
-    # Обработка подтверждения удаления
-    elif state.startswith('delete_confirm_'):
-        login = state.split('_')[2]
-        response = update.message.text.lower().strip()
-
-        if response == 'да':
-            if user_state.delete_entrepreneur(login):
-                await update.message.reply_text(f"Исполнитель {login} удален.")
-            else:
-                await update.message.reply_text("Исполнитель не найден.")
-            user_state.set_state(user_id, None)
-        elif response == 'нет':
-            # Возвращаемся к деталям исполнителя
-            if login in user_state.entrepreneurs:
-                entrepreneur_data = user_state.entrepreneurs[login]
-                password = entrepreneur_data['password']
-                rating = entrepreneur_data['rating']
-                balance = entrepreneur_data.get('balance', 0)
-                chat_id = entrepreneur_data.get('chat_id')
-
-                keyboard = [
-                    [InlineKeyboardButton("Поменять рейтинг", callback_data=f'change_rating_{login}')],
-                    [InlineKeyboardButton("Изменить баланс", callback_data=f'change_balance_{login}')],
-                    [InlineKeyboardButton("Удалить исполнителя", callback_data=f'delete_entrepreneur_{login}')]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-
-                info_text = format_entrepreneur_info(login, password, rating, balance, chat_id)
-                await update.message.reply_text(info_text, reply_markup=reply_markup)
-            else:
-                await update.message.reply_text("Исполнитель не найден.")
-            user_state.set_state(user_id, None)
-        else:
-            await update.message.reply_text("Пожалуйста, введите 'да' или 'нет'.")
-        return True
-
-    return False
+    category, _, index = target.partition('_')
+    if category in PORTFOLIO_CATEGORIES and index.isdigit():
+        return await confirm_portfolio_delete(update, context, text, category, int(index))
+    return await confirm_entrepreneur_delete(update, context, text, target)
 
 
+@callback_router.route('register_entrepreneur')
 async def register_entrepreneur_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Начало регистрации исполнителя"""
     query = update.callback_query
     await query.edit_message_text("Введите логин исполнителя:")
-    user_state.set_state(query.from_user.id, 'register_login')
\ No newline at end of file
+    user_state.set_state(query.from_user.id, 'register_login')
+
+
+async def backfill_media_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /backfill_media: загружает в Telegram картинки портфолио, заданные ссылками"""
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_ID:
+        await update.message.reply_text("Вы не являетесь администратором.")
+        return
+
+    pending = len(find_pending())
+    if not pending:
+        await update.message.reply_text("✅ Все картинки портфолио уже загружены в Telegram.")
+        return
+    await update.message.reply_text(
+        f"⏳ Загружаем картинок: {pending} (примерно {round(pending * MEDIA_BACKFILL_INTERVAL_SECONDS)} с)."
+    )
+
+    async def run() -> None:
+        stats = await backfill(context.bot, user_id)
+        await context.bot.send_message(
+            chat_id=user_id,
+            text=f"✅ Загрузка завершена: загружено {stats['uploaded']}, ошибок {stats['failed']}, "
+                 f"пропущено {stats['skipped']}."
+        )
+
+    # Загрузка идёт в фоне: очередь обновлений администратора не ждёт её окончания
+    context.application.create_task(run(), update=update)
\ No newline at end of file
@@ -1,11 +1,24 @@
 # handlers_client.py
-from datetime import datetime
+import logging
+from typing import Any, Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
+from archive import order_archive
+from config import ARCHIVE_PAGE_SIZE, DISPATCH_MAX_CANDIDATES
+from fsm import state_machine, STAY
+from keyboards import (CLIENT_MENU, CLIENT_GUEST_MENU, CLIENT_LOGGED_OUT_MENU, CLIENT_ORDER_HISTORY_MENU, OUR_WORKS_MENU,
+                       open_chat_keyboard)
+from notifications import offer_order, send_to_user
+from portfolio_navigation import portfolio_navigator
+from router import callback_router
 from state_manager import user_state
-from utils import format_order_info, is_valid_number, parse_number, calculate_end_time, format_time_remaining
+from utils import (format_order_info, is_valid_number, parse_number, calculate_end_time, format_time_remaining,
+                   format_archived_order, get_user_role_in_chat, format_chat_message)
 
+logger = logging.getLogger(__name__)
 
+
+@callback_router.route('client')
 async def client_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Меню заказчика - проверяем авторизацию"""
     user_id = update.callback_query.from_user.id
@@ -13,33 +26,26 @@ async def client_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
 
     if logged_in_client:
         # Авторизованный клиент - показываем кнопки "Создать заказ", "Наши работы" и "Выйти"
-        keyboard = [
-            [InlineKeyboardButton("Создать заказ", callback_data='create_order')],
-            [InlineKeyboardButton("Наши работы", callback_data='our_works')],
-            [InlineKeyboardButton("Выйти", callback_data='client_logout')]
-        ]
+        reply_markup = CLIENT_MENU
         context.user_data['client_login'] = logged_in_client
         message_text = f'Добро пожаловать, {logged_in_client}!'
     else:
         # Неавторизованный клиент - показываем 4 кнопки
-        keyboard = [
-            [InlineKeyboardButton("Войти", callback_data='client_login')],
-            [InlineKeyboardButton("Зарегистрироваться", callback_data='client_register')],
-            [InlineKeyboardButton("Наши работы", callback_data='our_works')],
-            [InlineKeyboardButton("Мне нужна консультация", callback_data='consultation')]
-        ]
+        reply_markup = CLIENT_GUEST_MENU
         message_text = 'Выберите действие (Заказчик):'
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.callback_query.edit_message_text(message_text, reply_markup=reply_markup)
+    # Сюда возвращаются и из портфолио: карточка просмотра сменяется меню
+    await portfolio_navigator.leave(update, context, message_text, reply_markup)
 
 
+@callback_router.route('portfolio')
 async def show_portfolio(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показ портфолио услуг"""
     portfolio = "Наши услуги:\n1. Веб-разработка\n2. Дизайн сайтов\n3. SEO-оптимизация"
     await update.callback_query.edit_message_text(portfolio)
 
 
+@callback_router.route('create_order')
 async def create_order(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Начало создания заказа (только для авторизованных клиентов)"""
     user_id = update.callback_query.from_user.id
@@ -55,6 +61,7 @@ async def create_order(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     user_state.set_state(user_id, 'order_description')
 
 
+@callback_router.route('consultation')
 async def consultation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Запрос консультации"""
     await update.callback_query.edit_message_text(
@@ -62,18 +69,21 @@ async def consultation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     )
 
 
+@callback_router.route('client_login')
 async def client_login(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Начало процесса входа клиента"""
     await update.callback_query.edit_message_text("Введите ваш логин:")
     user_state.set_state(update.callback_query.from_user.id, 'client_login_username')
 
 
+@callback_router.route('client_register')
 async def client_register(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Начало процесса регистрации клиента"""
     await update.callback_query.edit_message_text("Введите желаемый логин:")
     user_state.set_state(update.callback_query.from_user.id, 'client_register_username')
 
 
+@callback_router.route('client_logout')
 async def client_logout(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Выход из аккаунта клиента"""
     user_id = update.callback_query.from_user.id
@@ -85,20 +95,15 @@ async def client_logout(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         if 'client_login' in context.user_data:
             del context.user_data['client_login']
 
-        keyboard = [
-            [InlineKeyboardButton("Войти", callback_data='client_login')],
-            [InlineKeyboardButton("Зарегистрироваться", callback_data='client_register')],
-            [InlineKeyboardButton("Мне нужна консультация", callback_data='consultation')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
         await update.callback_query.edit_message_text(
             "Вы успешно вышли из аккаунта.\nВыберите действие (Заказчик):",
-            reply_markup=reply_markup
+            reply_markup=CLIENT_LOGGED_OUT_MENU
         )
     else:
         await update.callback_query.edit_message_text("Ошибка при выходе из аккаунта.")
 
 
+@callback_router.route('my_client_orders')
 async def my_client_orders(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показ заказов клиента"""
     query = update.callback_query
@@ -114,166 +119,96 @@ async def my_client_orders(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             await query.edit_message_text(f"Ваши заказы ({len(orders)}):")
 
             for i, order in enumerate(orders, start=1):
-                status = "✅ Принят" if order.get('accepted', False) else "⏳ Ожидает"
-                contractor = order.get('contractor_login', 'Не назначен')
+                status = "✅ Принят" if order.accepted else "⏳ Ожидает"
 
-                order_text = f"📋 Заказ {i}:\n{order.get('description', 'Описание отсутствует')}"
-                order_text += f"\n👨‍💼 Исполнитель: {contractor}"
+                order_text = f"📋 Заказ {i}:\n{order.description or 'Описание отсутствует'}"
+                order_text += f"\n👨‍💼 Исполнитель: {order.contractor_login}"
                 order_text += f"\n📊 Статус: {status}"
 
-                if order.get('timer_active', False) and 'timer_end' in order:
-                    end_time = datetime.fromisoformat(order['timer_end']) if isinstance(order['timer_end'], str) else \
-                        order['timer_end']
-                    timer_info = format_time_remaining(end_time)
-                    order_text += f"\n{timer_info}"
+                if order.timer_end is not None:
+                    order_text += f"\n{format_time_remaining(order.timer_end)}"
 
                 await query.message.reply_text(order_text)
         else:
             await query.edit_message_text("У вас пока нет заказов.")
+
+        # Завершённые заказы хранятся в архиве и показываются постранично
+        if order_archive.count('orders', 'client', client_login):
+            await query.message.reply_text("Завершённые заказы:", reply_markup=CLIENT_ORDER_HISTORY_MENU)
     else:
         await query.edit_message_text("Пожалуйста, войдите в систему.")
 
 
-async def our_works(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Показ категорий наших работ"""
-    keyboard = [
-        [InlineKeyboardButton("🌐 Сайты", callback_data='category_sites')],
-        [InlineKeyboardButton("🎬 Видео", callback_data='category_video')],
-        [InlineKeyboardButton("← Назад", callback_data='client')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.callback_query.edit_message_text(
-        "Выберите категорию:",
-        reply_markup=reply_markup
-    )
-
-
-async def category_sites(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Показ проектов в категории сайтов"""
-    portfolio_items = user_state.get_portfolio_items('sites')
-    print(f"DEBUG: Загружено сайтов из портфолио: {len(portfolio_items)}")
-
-    for i, item in enumerate(portfolio_items):
-        print(
-            f"DEBUG: Сайт {i + 1}: title='{item.get('title', 'Без названия')}', description='{item.get('description', 'Без описания')[:50]}...', images={len(item.get('images', []))}, links={len(item.get('links', []))}")
-
-    keyboard = []
-
-    # Добавляем кнопки для каждого проекта
-    for i, item in enumerate(portfolio_items):
-        button_title = item['title']
-        print(f"DEBUG: Создаем кнопку для сайта: {button_title}")
-        keyboard.append([InlineKeyboardButton(button_title, callback_data=f'portfolio_item_sites_{i}')])
-
-    # Если нет проектов, показываем стандартные подкатегории
-    if not portfolio_items:
-        print("DEBUG: Нет сохраненных сайтов, показываем стандартные категории")
-        keyboard = [
-            [InlineKeyboardButton("📄 Лендинги", callback_data='subcategory_landing')],
-            [InlineKeyboardButton("🛒 Интернет магазины", callback_data='subcategory_shop')],
-            [InlineKeyboardButton("🎨 Сайты на Тильда", callback_data='subcategory_tilda')],
-            [InlineKeyboardButton("⚙️ Сайты на WordPress", callback_data='subcategory_wordpress')]
-        ]
+@callback_router.route('client_order_history_{page:int}')
+async def client_order_history(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int) -> None:
+    """Постраничный показ завершённых заказов клиента из архива"""
+    query = update.callback_query
+    client_login = user_state.get_client_by_chat_id(query.from_user.id)
+    if not client_login:
+        await query.edit_message_text("Пожалуйста, войдите в систему.")
+        return
 
-    keyboard.append([InlineKeyboardButton("← Назад", callback_data='our_works')])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    total = order_archive.count('orders', 'client', client_login)
+    records = order_archive.read_page('orders', 'client', client_login, page)
+    logger.debug("История заказов клиента %s: страница %d, записей %d из %d", client_login, page, len(records), total)
+    if not records:
+        await query.edit_message_text("История заказов пуста.")
+        return
 
-    message_text = "Наши сайты:" if portfolio_items else "Выберите тип сайта:"
-    print(f"DEBUG: Отправляем сообщение: {message_text}")
-    await update.callback_query.edit_message_text(message_text, reply_markup=reply_markup)
+    first = page * ARCHIVE_PAGE_SIZE + 1
+    lines = [format_archived_order(first + i, order, "👨‍💼 Исполнитель", contractor, archived_at)
+             for i, (_, contractor, order, archived_at) in enumerate(records)]
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("← Новее", callback_data=f'client_order_history_{page - 1}'))
+    if first + len(records) - 1 < total:
+        navigation.append(InlineKeyboardButton("Старше →", callback_data=f'client_order_history_{page + 1}'))
+    keyboard = [navigation] if navigation else []
+    keyboard.append([InlineKeyboardButton("← В меню", callback_data='client')])
+    await query.edit_message_text(
+        f"📚 История заказов ({first}-{first + len(records) - 1} из {total}):\n\n" + "\n\n".join(lines),
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
 
 
-async def category_video(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Показ проектов в категории видео"""
-    portfolio_items = user_state.get_portfolio_items('video')
+@callback_router.route('our_works')
+async def our_works(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Показ категорий наших работ"""
+    await portfolio_navigator.show_text(update, context, "Выберите категорию:", OUR_WORKS_MENU)
 
-    keyboard = []
 
-    # Добавляем кнопки для каждого проекта
-    for i, item in enumerate(portfolio_items):
-        keyboard.append([InlineKeyboardButton(item['title'], callback_data=f'portfolio_item_video_{i}')])
+@callback_router.route('category_{category:category}')
+async def show_category(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str) -> None:
+    """Показ проектов категории (список берётся из кеша представлений портфолио)"""
+    await portfolio_navigator.show_category(update, context, category)
 
-    # Если нет проектов, показываем стандартные подкатегории
-    if not portfolio_items:
-        keyboard = [
-            [InlineKeyboardButton("📺 Видео реклама", callback_data='subcategory_ads')],
-            [InlineKeyboardButton("🎭 Креативы", callback_data='subcategory_creative')],
-            [InlineKeyboardButton("✨ Анимации", callback_data='subcategory_animation')],
-            [InlineKeyboardButton("🎬 Моушен графика", callback_data='subcategory_motion')],
-            [InlineKeyboardButton("🎮 3D видео", callback_data='subcategory_3d')]
-        ]
 
-    keyboard.append([InlineKeyboardButton("← Назад", callback_data='our_works')])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+@callback_router.route('portfolio_item_{category:category}_{index:int}')
+async def show_portfolio_item(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str, index: int) -> None:
+    """Показ конкретного элемента портфолио (в той же карточке)"""
+    await portfolio_navigator.show_item(update, context, category, index)
 
-    message_text = "Наши видео:" if portfolio_items else "Выберите тип видео:"
-    await update.callback_query.edit_message_text(message_text, reply_markup=reply_markup)
 
+@callback_router.route('portfolio_photo_{category:category}_{index:int}_{photo:int}')
+async def show_portfolio_photo(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str, index: int,
+                               photo: int) -> None:
+    """Листание фото элемента портфолио"""
+    await portfolio_navigator.show_item(update, context, category, index, photo)
 
-async def show_portfolio_item(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str, index: int) -> None:
-    """Показ конкретного элемента портфолио - ПОЛНОСТЬЮ ИСПРАВЛЕННАЯ ВЕРСИЯ"""
-    portfolio_items = user_state.get_portfolio_items(category)
-
-    if 0 <= index < len(portfolio_items):
-        item = portfolio_items[index]
-
-        # ИСПРАВЛЕННАЯ кнопка "Назад" - используем новые callback_data
-        back_callback = f'back_to_{category}' if category in ['sites', 'video'] else 'back_to_our_works'
-
-        keyboard = [
-            [InlineKeyboardButton("← Назад", callback_data=back_callback)]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        if item.get('images') and len(item['images']) > 0:
-            # Формируем подпись: НАЗВАНИЕ БОЛЬШИМИ БУКВАМИ + описание
-            caption = f"🔥 {item['title'].upper()}\n"
-            caption += "━━━━━━━━━━━━━━━━━\n\n"
-            caption += f"{item['description']}"
-
-            # Добавляем ссылки если есть
-            if item.get('links'):
-                caption += "\n\n🔗 Ссылки:"
-                for link in item['links']:
-                    caption += f"\n• {link}"
-
-            try:
-                image = item['images'][0]
-
-                # ИСПРАВЛЕНИЕ: Отправляем фото и удаляем исходное сообщение
-                await context.bot.send_photo(
-                    chat_id=update.callback_query.from_user.id,
-                    photo=image,
-                    caption=caption,
-                    reply_markup=reply_markup
-                )
 
-                # Удаляем исходное сообщение со списком
-                await update.callback_query.delete_message()
+@callback_router.route('portfolio_album_{category:category}_{index:int}')
+async def show_portfolio_album(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str, index: int) -> None:
+    """Все фото элемента портфолио альбомом"""
+    await portfolio_navigator.show_album(update, context, category, index)
 
-            except Exception as e:
-                print(f"Ошибка при отправке изображения: {e}")
-                # Если не удалось отправить фото, редактируем сообщение на текст
-                text = f"🔥 {item['title'].upper()}\n━━━━━━━━━━━━━━━━━\n\n{item['description']}"
-                if item.get('links'):
-                    text += "\n\n🔗 Ссылки:"
-                    for link in item['links']:
-                        text += f"\n• {link}"
 
-                await update.callback_query.edit_message_text(text, reply_markup=reply_markup)
-        else:
-            # Если нет картинки, показываем только текст
-            text = f"🔥 {item['title'].upper()}\n━━━━━━━━━━━━━━━━━\n\n{item['description']}"
-            if item.get('links'):
-                text += "\n\n🔗 Ссылки:"
-                for link in item['links']:
-                    text += f"\n• {link}"
-
-            await update.callback_query.edit_message_text(text, reply_markup=reply_markup)
-    else:
-        await update.callback_query.edit_message_text("Проект не найден.")
+@callback_router.route('portfolio_text_{category:category}_{index:int}')
+async def show_portfolio_text(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str, index: int) -> None:
+    """Полный текст элемента портфолио, не поместившийся в подпись к фото"""
+    await portfolio_navigator.show_full_text(update, context, category, index)
 
 
+@callback_router.route('subcategory_{subcategory}')
 async def show_subcategory_works(update: Update, context: ContextTypes.DEFAULT_TYPE, subcategory: str) -> None:
     """Показ работ в подкатегории (старая версия для совместимости)"""
 
@@ -304,186 +239,165 @@ async def show_subcategory_works(update: Update, context: ContextTypes.DEFAULT_T
     # Здесь можно добавить реальные примеры работ
     works_text = f"{category_name}\n\nПримеры наших работ:\n• Проект 1\n• Проект 2\n• Проект 3"
 
-    await update.callback_query.edit_message_text(
-        works_text,
-        reply_markup=reply_markup
-    )
+    await portfolio_navigator.show_text(update, context, works_text, reply_markup)
 
 
-async def handle_order_creation(update: Update, context: ContextTypes.DEFAULT_TYPE, state: str) -> bool:
-    """Обрабатывает создание заказа"""
-    user_id = update.message.from_user.id
-    client_login = user_state.get_client_by_chat_id(user_id)
+@state_machine.state('client_login_username', transitions=('client_login_password',))
+async def client_login_username(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> str:
+    """Вход клиента: логин"""
+    context.user_data['login_client_login'] = text
+    await update.message.reply_text("Введите пароль:")
+    return 'client_login_password'
 
-    if not client_login:
-        await update.message.reply_text("Ошибка: необходимо войти в аккаунт.")
-        user_state.set_state(user_id, None)
-        return True
-
-    if state == 'order_description':
-        context.user_data['order_description'] = update.message.text
-        context.user_data['client_login'] = client_login
-        await update.message.reply_text("1. Какие у нас есть сроки?")
-        user_state.set_state(user_id, 'order_deadline')
-        return True
-
-    elif state == 'order_deadline':
-        context.user_data['deadline'] = update.message.text
+
+@state_machine.state('client_login_password')
+async def client_login_password(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> None:
+    """Вход клиента: пароль"""
+    login = context.user_data.get('login_client_login')
+
+    if login and user_state.check_client(login, text):
+        user_state.set_client_chat_id(login, update.message.from_user.id)
         await update.message.reply_text(
-            "2. Какой у вас ориентировочный бюджет? (Введите число, например 15 000)"
+            f"✅ Добро пожаловать, {login}!",
+            reply_markup=CLIENT_MENU
         )
-        user_state.set_state(user_id, 'order_budget')
-        return True
+        context.user_data['client_login'] = login
+    else:
+        await update.message.reply_text("❌ Неверный логин или пароль. Попробуйте снова.")
+    return None
 
-    elif state == 'order_budget':
-        if is_valid_number(update.message.text):
-            budget = parse_number(update.message.text)
-            context.user_data['budget'] = update.message.text
-            context.user_data['order_amount'] = budget
 
-            await update.message.reply_text(
-                "Спасибо за предоставленную информацию. Мы скоро свяжемся с вами."
-            )
+@state_machine.state('client_register_username', transitions=('client_register_password',))
+async def client_register_username(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> str:
+    """Регистрация клиента: логин"""
+    context.user_data['register_client_login'] = text
+    await update.message.reply_text("Введите пароль:")
+    return 'client_register_password'
 
-            top_entrepreneur = user_state.get_top_entrepreneur()
-            if top_entrepreneur:
-                top_entrepreneur_data = user_state.entrepreneurs[top_entrepreneur]
-                top_entrepreneur_chat_id = top_entrepreneur_data.get('chat_id')
-
-                if top_entrepreneur_chat_id:
-                    order_info_text = format_order_info(
-                        context.user_data.get('order_description', 'Не указано'),
-                        context.user_data.get('deadline', 'Не указано'),
-                        context.user_data['budget'],
-                        client_login
-                    )
-
-                    keyboard = [
-                        [InlineKeyboardButton("Принять заказ", callback_data=f'accept_order_{user_id}')],
-                        [InlineKeyboardButton("Отказаться", callback_data=f'decline_order_{user_id}')]
-                    ]
-                    reply_markup = InlineKeyboardMarkup(keyboard)
-
-                    await context.bot.send_message(
-                        chat_id=top_entrepreneur_chat_id,
-                        text=order_info_text,
-                        reply_markup=reply_markup
-                    )
-
-                    order_obj = {
-                        'description': order_info_text,
-                        'client_login': client_login,
-                        'client_chat_id': user_id,
-                        'budget': budget,
-                        'deadline_text': context.user_data.get('deadline', 'Не указано'),
-                        'created_at': datetime.now(),
-                        'accepted': False,
-                        'timer_active': False
-                    }
-
-                    user_state.add_order(top_entrepreneur, order_obj)
-
-                    end_time = calculate_end_time(context.user_data.get('deadline', ''))
-                    if end_time:
-                        orders_list = user_state.get_orders(top_entrepreneur)
-                        if orders_list:
-                            order_index = len(orders_list) - 1
-                            user_state.update_order_timer(top_entrepreneur, order_index, end_time)
-                            await update.message.reply_text(
-                                f"⏱ Таймер заказа запущен! Срок выполнения: {format_time_remaining(end_time)}"
-                            )
-                else:
-                    await update.message.reply_text(
-                        "К сожалению, исполнитель с наивысшим рейтингом сейчас недоступен."
-                    )
-            else:
-                await update.message.reply_text(
-                    "К сожалению, в системе нет доступных исполнителей."
-                )
 
-            user_state.set_state(user_id, None)
+@state_machine.state('client_register_password')
+async def client_register_password(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> None:
+    """Регистрация клиента: пароль"""
+    login = context.user_data.get('register_client_login')
+
+    if login:
+        if user_state.register_client(login, text, chat_id=update.message.from_user.id):
+            await update.message.reply_text(
+                f"✅ Регистрация успешна! Добро пожаловать, {login}!",
+                reply_markup=CLIENT_MENU
+            )
+            context.user_data['client_login'] = login
         else:
             await update.message.reply_text(
-                "Просим вас написать число. Это поможет нам подобрать лучшее решение для вашей ситуации."
+                "❌ Пользователь с таким логином уже существует. Попробуйте другой логин."
             )
-        return True
+    else:
+        await update.message.reply_text("❌ Ошибка при регистрации.")
+    return None
+
+
+@state_machine.state('order_description', transitions=('order_deadline',))
+async def order_description(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> Optional[str]:
+    """Создание заказа: описание"""
+    client_login = user_state.get_client_by_chat_id(update.message.from_user.id)
+    if not client_login:
+        await update.message.reply_text("❌ Ошибка: необходимо войти в аккаунт.")
+        return None
+
+    context.user_data['order_description'] = text
+    context.user_data['client_login'] = client_login
+    await update.message.reply_text("1. Какие у нас есть сроки?")
+    return 'order_deadline'
 
-    return False
+
+@state_machine.state('order_deadline', transitions=('order_budget',))
+async def order_deadline(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> str:
+    """Создание заказа: сроки"""
+    context.user_data['deadline'] = text
+    await update.message.reply_text(
+        "2. Какой у вас ориентировочный бюджет? (Введите число, например 15 000)"
+    )
+    return 'order_budget'
 
 
-async def handle_client_auth(update: Update, context: ContextTypes.DEFAULT_TYPE, state: str) -> bool:
-    """Обрабатывает регистрацию и авторизацию клиентов"""
+@state_machine.state('order_budget')
+async def order_budget(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> Any:
+    """Создание заказа: бюджет; заказ отправляется исполнителям по убыванию рейтинга"""
     user_id = update.message.from_user.id
-    print(f"DEBUG: handle_client_auth вызван с состоянием: {state}")
-
-    # Регистрация
-    if state == 'client_register_username':
-        context.user_data['register_client_login'] = update.message.text
-        await update.message.reply_text("Введите пароль:")
-        user_state.set_state(user_id, 'client_register_password')
-        return True
-
-    elif state == 'client_register_password':
-        login = context.user_data.get('register_client_login')
-        password = update.message.text
-
-        if login:
-            if user_state.register_client(login, password, chat_id=user_id):
-                keyboard = [
-                    [InlineKeyboardButton("Создать заказ", callback_data='create_order')],
-                    [InlineKeyboardButton("Наши работы", callback_data='our_works')],
-                    [InlineKeyboardButton("Выйти", callback_data='client_logout')]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                await update.message.reply_text(
-                    f"Добро пожаловать, {login}!",
-                    reply_markup=reply_markup
-                )
-                context.user_data['client_login'] = login
-            else:
-                await update.message.reply_text(
-                    "Пользователь с таким логином уже существует. Попробуйте другой логин."
-                )
+    if not is_valid_number(text):
+        await update.message.reply_text(
+            "❌ Просим вас написать число. Это поможет нам подобрать лучшее решение для вашей ситуации."
+        )
+        return STAY
+
+    budget = parse_number(text)
+    context.user_data['budget'] = text
+    client_login = context.user_data.get('client_login')
+
+    await update.message.reply_text(
+        "✅ Спасибо за предоставленную информацию. Мы скоро свяжемся с вами."
+    )
+
+    # ИЩЕМ ДОСТУПНЫХ ИСПОЛНИТЕЛЕЙ ПО УБЫВАНИЮ РЕЙТИНГА
+    candidates = user_state.get_available_entrepreneurs(DISPATCH_MAX_CANDIDATES)
+    logger.debug("Кандидаты на заказ: %s", candidates)
+
+    if not candidates:
+        if user_state.get_entrepreneurs_count():
+            await update.message.reply_text("❌ К сожалению, сейчас нет доступных исполнителей.")
         else:
-            await update.message.reply_text("Ошибка при регистрации.")
-
-        user_state.set_state(user_id, None)
-        return True
-
-    # Вход
-    elif state == 'client_login_username':
-        context.user_data['login_client_login'] = update.message.text
-        await update.message.reply_text("Введите пароль:")
-        user_state.set_state(user_id, 'client_login_password')
-        return True
-
-    elif state == 'client_login_password':
-        login = context.user_data.get('login_client_login')
-        password = update.message.text
-
-        if login and user_state.check_client(login, password):
-            user_state.set_client_chat_id(login, user_id)
-
-            keyboard = [
-                [InlineKeyboardButton("Создать заказ", callback_data='create_order')],
-                [InlineKeyboardButton("Наши работы", callback_data='our_works')],
-                [InlineKeyboardButton("Выйти", callback_data='client_logout')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            await update.message.reply_text("❌ К сожалению, в системе нет доступных исполнителей.")
+        return None
+
+    # ФОРМИРУЕМ ИНФОРМАЦИЮ О ЗАКАЗЕ
+    order_info_text = format_order_info(
+        context.user_data.get('order_description', 'Не указано'),
+        context.user_data.get('deadline', 'Не указано'),
+        context.user_data['budget'],
+        client_login
+    )
+
+    # КНОПКИ ДЛЯ ИСПОЛНИТЕЛЯ
+    keyboard = [
+        [InlineKeyboardButton("✅ Принять заказ", callback_data=f'accept_order_{user_id}')],
+        [InlineKeyboardButton("❌ Отказаться", callback_data=f'decline_order_{user_id}')]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    # ОТПРАВЛЯЕМ ЗАКАЗ ПЕРВОМУ ИСПОЛНИТЕЛЮ, КОТОРОМУ ОН ДОШЕЛ
+    # Отправка, сохранение заказа и таймер выполняются в процессе исполнителя
+    for candidate in candidates:
+        contractor = user_state.entrepreneurs.get(candidate)
+        if contractor is None or contractor.chat_id is None:
+            logger.debug("Исполнитель %s стал недоступен", candidate)
+            continue
+        try:
+            end_time = await offer_order(
+                candidate,
+                contractor.chat_id,
+                order_info_text,
+                reply_markup,
+                client_login,
+                user_id,
+                budget,
+                context.user_data.get('deadline', 'Не указано')
+            )
+        except Exception:
+            logger.warning("Ошибка отправки заказа исполнителю %s", candidate, exc_info=True)
+            continue
+        logger.debug("Заказ отправлен исполнителю %s", candidate)
+        if end_time:
             await update.message.reply_text(
-                f"Добро пожаловать, {login}!",
-                reply_markup=reply_markup
+                f"⏱ Таймер заказа запущен! Срок выполнения: {format_time_remaining(end_time)}"
             )
-            context.user_data['client_login'] = login
-        else:
-            await update.message.reply_text("Неверный логин или пароль. Попробуйте снова.")
-
-        user_state.set_state(user_id, None)
-        return True
+        return None
 
-    return False
+    await update.message.reply_text("❌ Не удалось отправить заказ исполнителям. Попробуйте позже.")
+    return None
 
 
+@callback_router.route('accept_order_{customer_id:int}', action='accept')
+@callback_router.route('decline_order_{customer_id:int}', action='decline')
 async def handle_order_response(update: Update, context: ContextTypes.DEFAULT_TYPE, action: str,
                                 customer_id: int) -> None:
     """Обрабатывает ответ исполнителя на заказ"""
@@ -495,118 +409,93 @@ async def handle_order_response(update: Update, context: ContextTypes.DEFAULT_TY
         return
 
     if action == 'accept':
-        order_amount = context.user_data.get('order_amount', 0)
-        if order_amount > 0:
-            user_state.update_entrepreneur_balance(contractor_login, order_amount)
-
-        orders = user_state.get_orders(contractor_login)
-        client_login = None
-        chat_id = None
-
-        for i, order in enumerate(orders):
-            if isinstance(order, dict) and order.get('client_chat_id') == customer_id and not order.get('accepted',
-                                                                                                        False):
-                orders[i]['accepted'] = True
-                client_login = order.get('client_login')
-
-                # Создаем чат между клиентом и исполнителем
-                if client_login:
-                    chat_id = user_state.create_chat(
-                        client_login,
-                        customer_id,
-                        contractor_login,
-                        query.from_user.id,
-                        f"order_{i}"
-                    )
-
-                deadline_text = order.get('deadline_text', '')
-                end_time = calculate_end_time(deadline_text)
-
-                if end_time:
-                    user_state.update_order_timer(contractor_login, i, end_time)
-                    timer_info = format_time_remaining(end_time)
-
-                    # Кнопка "Чат с клиентом" для исполнителя
-                    if chat_id:
-                        keyboard = [
-                            [InlineKeyboardButton("💬 Чат с клиентом", callback_data=f'open_chat_{chat_id}')]
-                        ]
-                        reply_markup = InlineKeyboardMarkup(keyboard)
-                        await query.edit_message_text(
-                            f"✅ Вы приняли заказ!\n{timer_info}",
-                            reply_markup=reply_markup
-                        )
-                    else:
-                        await query.edit_message_text(f"✅ Вы приняли заказ!\n{timer_info}")
-
-                    # Сообщение клиенту с кнопкой чата
-                    if chat_id:
-                        client_keyboard = [
-                            [InlineKeyboardButton("💬 Чат с исполнителем", callback_data=f'open_chat_{chat_id}')]
-                        ]
-                        client_reply_markup = InlineKeyboardMarkup(client_keyboard)
-                        await context.bot.send_message(
-                            chat_id=customer_id,
-                            text=f"✅ Исполнитель принял ваш заказ!\n{timer_info}",
-                            reply_markup=client_reply_markup
-                        )
-                    else:
-                        await context.bot.send_message(
-                            chat_id=customer_id,
-                            text=f"✅ Исполнитель принял ваш заказ!\n{timer_info}"
-                        )
-                else:
-                    # Без таймера
-                    if chat_id:
-                        keyboard = [
-                            [InlineKeyboardButton("💬 Чат с клиентом", callback_data=f'open_chat_{chat_id}')]
-                        ]
-                        reply_markup = InlineKeyboardMarkup(keyboard)
-                        await query.edit_message_text("✅ Вы приняли заказ!", reply_markup=reply_markup)
-
-                        client_keyboard = [
-                            [InlineKeyboardButton("💬 Чат с исполнителем", callback_data=f'open_chat_{chat_id}')]
-                        ]
-                        client_reply_markup = InlineKeyboardMarkup(client_keyboard)
-                        await context.bot.send_message(
-                            chat_id=customer_id,
-                            text="✅ Исполнитель принял ваш заказ!",
-                            reply_markup=client_reply_markup
-                        )
-                    else:
-                        await query.edit_message_text("✅ Вы приняли заказ!")
-                        await context.bot.send_message(
-                            chat_id=customer_id,
-                            text="✅ Исполнитель принял ваш заказ!"
+        # Изменения состояния выполняются под блокировкой исполнителя до отправки сообщений:
+        # повторное нажатие "Принять" не примет заказ и не начислит сумму дважды
+        async with user_state.locks.hold(('contractor', contractor_login)):
+            orders = user_state.get_orders(contractor_login)
+            order = None
+            chat_id = None
+            end_time = None
+
+            for i, candidate in enumerate(orders):
+                if candidate.client_chat_id == customer_id and not candidate.accepted:
+                    order = candidate
+                    user_state.accept_order(contractor_login, i)
+
+                    # Начисляется бюджет принятого заказа (user_data здесь - сессия исполнителя, а не клиента)
+                    if order.budget and order.budget > 0:
+                        user_state.update_entrepreneur_balance(contractor_login, order.budget)
+
+                    # Создаем чат между клиентом и исполнителем
+                    if order.client_login:
+                        chat_id = user_state.create_chat(
+                            order.client_login,
+                            customer_id,
+                            contractor_login,
+                            query.from_user.id,
+                            order.order_id
                         )
 
-                user_state.save_data()
-                break
+                    end_time = calculate_end_time(order.deadline_text)
+                    if end_time:
+                        user_state.update_order_timer(contractor_login, i, end_time)
+                    break
+
+        if order is None:
+            logger.debug("Нет непринятого заказа клиента %s у исполнителя %s", customer_id, contractor_login)
+            return
+
+        if end_time:
+            timer_info = format_time_remaining(end_time)
+
+            # Кнопка "Чат с клиентом" для исполнителя
+            if chat_id:
+                await query.edit_message_text(
+                    f"✅ Вы приняли заказ!\n{timer_info}",
+                    reply_markup=open_chat_keyboard(chat_id, 'client')
+                )
+            else:
+                await query.edit_message_text(f"✅ Вы приняли заказ!\n{timer_info}")
+
+            # Сообщение клиенту с кнопкой чата
+            if chat_id:
+                await send_to_user(customer_id, f"✅ Исполнитель принял ваш заказ!\n{timer_info}",
+                                   open_chat_keyboard(chat_id, 'contractor'))
+            else:
+                await send_to_user(customer_id, f"✅ Исполнитель принял ваш заказ!\n{timer_info}")
+        else:
+            # Без таймера
+            if chat_id:
+                await query.edit_message_text("✅ Вы приняли заказ!",
+                                              reply_markup=open_chat_keyboard(chat_id, 'client'))
+                await send_to_user(customer_id, "✅ Исполнитель принял ваш заказ!",
+                                   open_chat_keyboard(chat_id, 'contractor'))
+            else:
+                await query.edit_message_text("✅ Вы приняли заказ!")
+                await send_to_user(customer_id, "✅ Исполнитель принял ваш заказ!")
 
     elif action == 'decline':
         await query.edit_message_text("❌ Вы отказались от заказа!")
-        await context.bot.send_message(
-            chat_id=customer_id,
-            text="❌ Исполнитель отказался от вашего заказа!"
-        )
+        await send_to_user(customer_id, "❌ Исполнитель отказался от вашего заказа!")
 
 
+@callback_router.route('open_chat_{chat_id}')
 async def open_chat(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_id: str) -> None:
     """Открывает чат между клиентом и исполнителем"""
     query = update.callback_query
     user_chat_id = query.from_user.id
 
     chat_info = user_state.get_chat_info(chat_id)
-    if not chat_info or not chat_info.get('active', False):
+    if not chat_info or not chat_info.active:
         await query.edit_message_text("Чат не найден или неактивен.")
         return
 
     # Определяем роль пользователя
-    if chat_info.get('client_chat_id') == user_chat_id:
-        partner_name = chat_info.get('contractor_login', 'Исполнитель')
+    if chat_info.client_chat_id == user_chat_id:
+        partner_name = chat_info.contractor_login or 'Исполнитель'
         await query.edit_message_text(f"💬 Открыт чат с исполнителем {partner_name}\n\nНапишите сообщение:")
-    elif chat_info.get('contractor_chat_id') == user_chat_id:
-        partner_name = chat_info.get('client_login', 'Клиент')
+    elif chat_info.contractor_chat_id == user_chat_id:
+        partner_name = chat_info.client_login or 'Клиент'
         await query.edit_message_text(f"💬 Открыт чат с клиентом {partner_name}\n\nНапишите сообщение:")
     else:
         await query.edit_message_text("Ошибка: вы не участник этого чата.")
@@ -616,40 +505,29 @@ async def open_chat(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_id:
     user_state.set_state(user_chat_id, f'in_chat_{chat_id}')
 
 
-async def handle_chat_messages(update: Update, context: ContextTypes.DEFAULT_TYPE, state: str) -> bool:
-    """Обрабатывает сообщения в чате"""
-    if not state.startswith('in_chat_'):
-        return False
-
-    chat_id = state.replace('in_chat_', '')
+@state_machine.state('in_chat_{chat_id}')
+async def chat_message(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, chat_id: str) -> Any:
+    """Пересылает сообщение партнёру по открытому чату"""
     user_chat_id = update.message.from_user.id
-    message_text = update.message.text
 
-    # Получаем информацию о чате
     chat_info = user_state.get_chat_info(chat_id)
-    if not chat_info or not chat_info.get('active', False):
-        await update.message.reply_text("Чат неактивен.")
-        user_state.set_state(user_chat_id, None)
-        return True
+    if not chat_info or not chat_info.active:
+        await update.message.reply_text("❌ Чат неактивен.")
+        return None
 
-    # Определяем получателя
     partner_chat_id = user_state.get_chat_partner(chat_id, user_chat_id)
     if not partner_chat_id:
-        await update.message.reply_text("Партнер по чату не найден.")
-        return True
+        await update.message.reply_text("❌ Партнер по чату не найден.")
+        return STAY
 
-    # Определяем роль отправителя
-    from utils import get_user_role_in_chat, format_chat_message
     sender_role = get_user_role_in_chat(user_chat_id, chat_info)
-
-    # Форматируем и отправляем сообщение
-    formatted_message = format_chat_message(sender_role, message_text)
+    formatted_message = format_chat_message(sender_role, text)
 
     try:
-        await context.bot.send_message(chat_id=partner_chat_id, text=formatted_message)
+        # Сообщение отправляет процесс партнёра, чтобы его сообщения шли по порядку
+        await send_to_user(partner_chat_id, formatted_message)
         await update.message.reply_text("✅ Сообщение доставлено")
     except Exception as e:
         await update.message.reply_text("❌ Ошибка при отправке сообщения")
         print(f"Ошибка отправки сообщения: {e}")
-
-    return True
\ No newline at end of file
+    return STAY
\ No newline at end of file
@@ -1,19 +1,24 @@
 # handlers_common.py
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import ContextTypes
 from config import ADMIN_ID
+from keyboards import START_MENU, ADMIN_MENU
+from state_manager import user_state
+
+
+async def commit_state(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Подтверждает запись изменений, сделанных при обработке обновления вне блокировок сущностей
+    (в режиме 'durable' обработка обновления завершается только после записи)
+    """
+    await user_state.commit()
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /start"""
-    keyboard = [
-        [InlineKeyboardButton("Я Заказчик", callback_data='client')],
-        [InlineKeyboardButton("Я Исполнитель", callback_data='entrepreneur')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text(
         'Добро пожаловать в нашего бота! Выберите роль:',
-        reply_markup=reply_markup
+        reply_markup=START_MENU
     )
 
 
@@ -22,12 +27,6 @@ async def handle_admin_command(update: Update, context: ContextTypes.DEFAULT_TYP
     user_id = update.message.from_user.id
 
     if user_id == ADMIN_ID:
-        keyboard = [
-            [InlineKeyboardButton("Зарегистрировать исполнителя", callback_data='register_entrepreneur')],
-            [InlineKeyboardButton("Все исполнители", callback_data='all_entrepreneurs')],
-            [InlineKeyboardButton("Управление портфолио", callback_data='portfolio_menu')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text("Добро пожаловать, Администратор!", reply_markup=reply_markup)
+        await update.message.reply_text("Добро пожаловать, Администратор!", reply_markup=ADMIN_MENU)
     else:
         await update.message.reply_text("Вы не являетесь администратором.")
\ No newline at end of file
@@ -1,32 +1,40 @@
 # handlers_contractor.py
+import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
+from archive import order_archive
+from config import ARCHIVE_PAGE_SIZE
+from fsm import state_machine
+from keyboards import CONTRACTOR_MENU, CONTRACTOR_GUEST_MENU, CONTRACTOR_LOGGED_OUT_MENU, CONTRACTOR_ORDER_HISTORY_MENU
+from notifications import update_contractor
+from router import callback_router
 from state_manager import user_state
+from utils import format_time_remaining, format_archived_order
 
+logger = logging.getLogger(__name__)
 
+
+@callback_router.route('entrepreneur')
 async def entrepreneur_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Меню исполнителя"""
     user_id = update.callback_query.from_user.id
     logged_in_user = user_state.get_entrepreneur_by_chat_id(user_id)
 
-    keyboard = []
-
     if logged_in_user:
         # Пользователь авторизован
-        keyboard.append([InlineKeyboardButton("Мои заказы", callback_data='my_orders')])
-        keyboard.append([InlineKeyboardButton("Выйти", callback_data='logout')])
+        reply_markup = CONTRACTOR_MENU
         context.user_data['contractor_login'] = logged_in_user
         balance = user_state.get_entrepreneur_balance(logged_in_user)
         message_text = f'Добро пожаловать, {logged_in_user}!\nВаш баланс: {balance} руб.\nВыберите действие:'
     else:
         # Пользователь не авторизован
-        keyboard.append([InlineKeyboardButton("Войти", callback_data='login')])
+        reply_markup = CONTRACTOR_GUEST_MENU
         message_text = 'Выберите действие (Исполнитель):'
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await update.callback_query.edit_message_text(message_text, reply_markup=reply_markup)
 
 
+@callback_router.route('add_service')
 async def add_service(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Добавление услуги"""
     await update.callback_query.edit_message_text(
@@ -34,18 +42,21 @@ async def add_service(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     )
 
 
+@callback_router.route('my_portfolio')
 async def my_portfolio(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Портфолио исполнителя"""
     portfolio = "Ваши услуги:\n1. Веб-разработка\n2. Дизайн сайтов\n3. SEO-оптимизация"
     await update.callback_query.edit_message_text(portfolio)
 
 
+@callback_router.route('login')
 async def login_entrepreneur(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Начало процесса входа"""
     await update.callback_query.edit_message_text("Введите логин:")
     user_state.set_state(update.callback_query.from_user.id, 'login')
 
 
+@callback_router.route('my_orders')
 async def my_orders(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показ заказов исполнителя"""
     query = update.callback_query
@@ -63,35 +74,62 @@ async def my_orders(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                 f"У вас {len(orders)} заказ(а/ов):\nВаш баланс: {balance} руб."
             )
             for i, order in enumerate(orders, start=1):
-                if isinstance(order, dict):
-                    # Новый формат заказа с дополнительной информацией
-                    status = "✅ Принят" if order.get('accepted', False) else "⏳ Ожидает"
-                    client = order.get('client_login', 'Не указан')
-
-                    order_text = f"📋 Заказ {i}:\n{order.get('description', 'Описание отсутствует')}"
-                    order_text += f"\n👤 Заказчик: {client}"
-                    order_text += f"\n📊 Статус: {status}"
-
-                    # Показываем таймер, если он активен
-                    if order.get('timer_active', False) and 'timer_end' in order:
-                        from datetime import datetime
-                        from utils import format_time_remaining
-
-                        end_time = datetime.fromisoformat(order['timer_end']) if isinstance(order['timer_end'],
-                                                                                            str) else order['timer_end']
-                        timer_info = format_time_remaining(end_time)
-                        order_text += f"\n{timer_info}"
-
-                    await query.message.reply_text(order_text)
-                else:
-                    # Старый формат заказа (строка)
-                    await query.message.reply_text(f"Заказ {i}:\n{order}")
+                status = "✅ Принят" if order.accepted else "⏳ Ожидает"
+                client = order.client_login or 'Не указан'
+
+                order_text = f"📋 Заказ {i}:\n{order.description or 'Описание отсутствует'}"
+                order_text += f"\n👤 Заказчик: {client}"
+                order_text += f"\n📊 Статус: {status}"
+
+                # Показываем таймер, если он активен
+                if order.timer_active and order.timer_end is not None:
+                    order_text += f"\n{format_time_remaining(order.timer_end)}"
+
+                await query.message.reply_text(order_text)
         else:
             await query.edit_message_text(f"У вас нет заказов.\nВаш баланс: {balance} руб.")
+
+        # Завершённые заказы хранятся в архиве и показываются постранично
+        if order_archive.count('orders', 'contractor', contractor_login):
+            await query.message.reply_text("Завершённые заказы:", reply_markup=CONTRACTOR_ORDER_HISTORY_MENU)
     else:
         await query.edit_message_text("Пожалуйста, войдите в систему сначала.")
 
 
+@callback_router.route('order_history_{page:int}')
+async def order_history(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int) -> None:
+    """Постраничный показ завершённых заказов исполнителя из архива"""
+    query = update.callback_query
+    contractor_login = user_state.get_entrepreneur_by_chat_id(query.from_user.id)
+    if not contractor_login:
+        await query.edit_message_text("Пожалуйста, войдите в систему сначала.")
+        return
+
+    total = order_archive.count('orders', 'contractor', contractor_login)
+    records = order_archive.read_page('orders', 'contractor', contractor_login, page)
+    logger.debug("История заказов исполнителя %s: страница %d, записей %d из %d", contractor_login, page,
+                 len(records), total)
+    if not records:
+        await query.edit_message_text("История заказов пуста.")
+        return
+
+    first = page * ARCHIVE_PAGE_SIZE + 1
+    lines = [format_archived_order(first + i, order, "👤 Заказчик", order.client_login, archived_at)
+             for i, (_, _, order, archived_at) in enumerate(records)]
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("← Новее", callback_data=f'order_history_{page - 1}'))
+    if first + len(records) - 1 < total:
+        navigation.append(InlineKeyboardButton("Старше →", callback_data=f'order_history_{page + 1}'))
+    keyboard = [navigation] if navigation else []
+    keyboard.append([InlineKeyboardButton("← В меню", callback_data='entrepreneur')])
+    await query.edit_message_text(
+        f"📚 История заказов ({first}-{first + len(records) - 1} из {total}):\n\n" + "\n\n".join(lines),
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+
+@callback_router.route('logout')
 async def logout_entrepreneur(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Выход из аккаунта"""
     user_id = update.callback_query.from_user.id
@@ -106,58 +144,43 @@ async def logout_entrepreneur(update: Update, context: ContextTypes.DEFAULT_TYPE
             del context.user_data['contractor_login']
 
         # Показываем меню исполнителя после выхода
-        keyboard = [
-            [InlineKeyboardButton("Добавить услугу", callback_data='add_service')],
-            [InlineKeyboardButton("Мое портфолио", callback_data='my_portfolio')],
-            [InlineKeyboardButton("Войти", callback_data='login')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
         await update.callback_query.edit_message_text(
             "Вы успешно вышли из аккаунта.\nВыберите действие (Исполнитель):",
-            reply_markup=reply_markup
+            reply_markup=CONTRACTOR_LOGGED_OUT_MENU
         )
     else:
         await update.callback_query.edit_message_text("Ошибка при выходе из аккаунта.")
 
 
-async def handle_login_process(update: Update, context: ContextTypes.DEFAULT_TYPE, state: str) -> bool:
-    """
-    Обрабатывает процесс входа исполнителя.
-    Возвращает True, если сообщение было обработано этим хендлером.
-    """
-    user_id = update.message.from_user.id
+@state_machine.state('login', transitions=('password',))
+async def login_username(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> str:
+    """Вход исполнителя: логин"""
+    context.user_data['login'] = text
+    await update.message.reply_text("Введите пароль:")
+    return 'password'
 
-    if state == 'login':
-        context.user_data['login'] = update.message.text
-        await update.message.reply_text("Введите пароль:")
-        user_state.set_state(user_id, 'password')
-        return True
-
-    elif state == 'password':
-        login = context.user_data.get('login')
-        password = update.message.text
-
-        if login and user_state.check_entrepreneur(login, password):
-            # Успешный вход
-            user_state.set_entrepreneur_chat_id(login, user_id)
-            balance = user_state.get_entrepreneur_balance(login)
-
-            keyboard = [
-                [InlineKeyboardButton("Добавить услугу", callback_data='add_service')],
-                [InlineKeyboardButton("Мое портфолио", callback_data='my_portfolio')],
-                [InlineKeyboardButton("Мои заказы", callback_data='my_orders')],
-                [InlineKeyboardButton("Выйти", callback_data='logout')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await update.message.reply_text(
-                f"Добро пожаловать в систему, {login}!\nВаш баланс: {balance} руб.\nВыберите действие:",
-                reply_markup=reply_markup
-            )
-            context.user_data['contractor_login'] = login
-        else:
-            await update.message.reply_text("Данные неверные. Попробуйте снова.")
 
-        user_state.set_state(user_id, None)
-        return True
-
-    return False
\ No newline at end of file
+@state_machine.state('password')
+async def login_password(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> None:
+    """Вход исполнителя: пароль"""
+    user_id = update.message.from_user.id
+    login = context.user_data.get('login')
+
+    if login and user_state.check_entrepreneur(login, text):
+        # Успешный вход. Исполнитель, входивший из этого чата раньше, принадлежит этому процессу и отпускает
+        # chat_id здесь; сам вход выполняет процесс исполнителя (update_contractor)
+        previous_login = user_state.get_entrepreneur_by_chat_id(user_id)
+        if previous_login is not None and previous_login != login:
+            async with user_state.locks.hold(('contractor', previous_login)):
+                user_state.remove_entrepreneur_chat_id(previous_login)
+        await update_contractor(login, 'chat_id', user_id)
+        balance = user_state.get_entrepreneur_balance(login)
+
+        await update.message.reply_text(
+            f"✅ Добро пожаловать в систему, {login}!\nВаш баланс: {balance} руб.",
+            reply_markup=CONTRACTOR_MENU
+        )
+        context.user_data['contractor_login'] = login
+    else:
+        await update.message.reply_text("❌ Данные неверные. Попробуйте снова.")
+    return None
\ No newline at end of file
@@ -0,0 +1,125 @@
+# keyboards.py
+from functools import lru_cache
+from typing import Iterable, Sequence, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from config import KEYBOARD_CACHE_SIZE
+
+# Кнопка: (текст, callback_data)
+ButtonSpec = Tuple[str, str]
+
+
+def build_keyboard(rows: Iterable[Sequence[ButtonSpec]]) -> InlineKeyboardMarkup:
+    """Клавиатура из строк кнопок (текст, callback_data)"""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(text, callback_data=data) for text, data in row]
+                                 for row in rows])
+
+
+def build_menu(*buttons: ButtonSpec) -> InlineKeyboardMarkup:
+    """Меню: каждая кнопка в своей строке"""
+    return build_keyboard([button] for button in buttons)
+
+
+# Статические меню собираются один раз при импорте. Объекты telegram неизменяемы после создания,
+# поэтому одну клавиатуру можно отправлять сколько угодно раз из любых обработчиков.
+
+START_MENU = build_menu(
+    ("Я Заказчик", 'client'),
+    ("Я Исполнитель", 'entrepreneur')
+)
+
+ADMIN_MENU = build_menu(
+    ("Зарегистрировать исполнителя", 'register_entrepreneur'),
+    ("Все исполнители", 'all_entrepreneurs'),
+    ("Управление портфолио", 'portfolio_menu')
+)
+
+ADMIN_PORTFOLIO_MENU = build_menu(
+    ("➕ Добавить сайт", 'add_portfolio_sites'),
+    ("➕ Добавить видео", 'add_portfolio_video'),
+    ("📋 Просмотреть портфолио", 'view_portfolio'),
+    ("🗑 Удалить элемент", 'delete_portfolio_start'),
+    ("← Назад в админ панель", 'admin_back')
+)
+
+ADMIN_DELETE_CATEGORY_MENU = build_menu(
+    ("🌐 Сайты", 'delete_category_sites'),
+    ("🎬 Видео", 'delete_category_video'),
+    ("← Назад", 'portfolio_menu')
+)
+
+ADMIN_VIEW_CATEGORY_MENU = build_menu(
+    ("🌐 Сайты", 'admin_view_sites'),
+    ("🎬 Видео", 'admin_view_video'),
+    ("← Назад", 'portfolio_menu')
+)
+
+OUR_WORKS_MENU = build_menu(
+    ("🌐 Сайты", 'category_sites'),
+    ("🎬 Видео", 'category_video'),
+    ("← Назад", 'client')
+)
+
+# Меню авторизованного клиента
+CLIENT_MENU = build_menu(
+    ("Создать заказ", 'create_order'),
+    ("Наши работы", 'our_works'),
+    ("Выйти", 'client_logout')
+)
+
+# Меню клиента до входа
+CLIENT_GUEST_MENU = build_menu(
+    ("Войти", 'client_login'),
+    ("Зарегистрироваться", 'client_register'),
+    ("Наши работы", 'our_works'),
+    ("Мне нужна консультация", 'consultation')
+)
+
+# Меню клиента после выхода из аккаунта
+CLIENT_LOGGED_OUT_MENU = build_menu(
+    ("Войти", 'client_login'),
+    ("Зарегистрироваться", 'client_register'),
+    ("Мне нужна консультация", 'consultation')
+)
+
+# Меню авторизованного исполнителя
+CONTRACTOR_MENU = build_menu(
+    ("Мои заказы", 'my_orders'),
+    ("Выйти", 'logout')
+)
+
+# Меню исполнителя до входа
+CONTRACTOR_GUEST_MENU = build_menu(
+    ("Войти", 'login')
+)
+
+# Меню исполнителя после выхода из аккаунта
+CONTRACTOR_LOGGED_OUT_MENU = build_menu(
+    ("Добавить услугу", 'add_service'),
+    ("Мое портфолио", 'my_portfolio'),
+    ("Войти", 'login')
+)
+
+# Переход к завершённым заказам из архива (первая страница)
+CLIENT_ORDER_HISTORY_MENU = build_menu(("📚 История заказов", 'client_order_history_0'))
+CONTRACTOR_ORDER_HISTORY_MENU = build_menu(("📚 История заказов", 'order_history_0'))
+
+
+# Клавиатуры с параметрами берутся из ограниченного кеша: одни и те же логины и чаты открывают многократно
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def entrepreneur_actions_keyboard(login: str) -> InlineKeyboardMarkup:
+    """Действия администратора с исполнителем"""
+    return build_menu(
+        ("Поменять рейтинг", f'change_rating_{login}'),
+        ("Изменить баланс", f'change_balance_{login}'),
+        ("Удалить исполнителя", f'delete_entrepreneur_{login}')
+    )
+
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def open_chat_keyboard(chat_id: str, partner: str) -> InlineKeyboardMarkup:
+    """Кнопка открытия чата заказа; partner - 'client' или 'contractor' (с кем чат)"""
+    label = "💬 Чат с клиентом" if partner == 'client' else "💬 Чат с исполнителем"
+    return build_menu((label, f'open_chat_{chat_id}'))
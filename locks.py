@@ -0,0 +1,140 @@
+# locks.py
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+# Ключ блокировки: (вид сущности, идентификатор), например ('contractor', login), ('client', login), ('chat', chat_id)
+LockKey = Hashable
+
+
+class WriteBarrier:
+    """
+    Барьер записи состояния.
+    Изменения состояния (секции) выполняются параллельно друг с другом, снимок для записи в хранилище
+    ждёт завершения начатых секций и не пускает новые, пока кодируется: в хранилище не попадает
+    наполовину выполненное изменение, растянутое на несколько await.
+    Пока снимок ждёт, новые изменения стоят, поэтому секции должны быть короткими: внутри секции нельзя
+    ждать записи (flush) - это взаимная блокировка, а сетевые запросы и fsync выполняются вне секции.
+    """
+
+    def __init__(self):
+        self._sections = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._open = asyncio.Event()
+        self._open.set()
+        self._snapshot_lock = asyncio.Lock()
+
+    @property
+    def sections(self) -> int:
+        """Количество выполняющихся секций"""
+        return self._sections
+
+    @asynccontextmanager
+    async def section(self) -> AsyncIterator[None]:
+        """Секция изменения состояния; ожидающий снимок имеет приоритет перед новыми секциями"""
+        while not self._open.is_set():
+            await self._open.wait()
+        self._sections += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._sections -= 1
+            if not self._sections:
+                self._idle.set()
+
+    @asynccontextmanager
+    async def snapshot(self) -> AsyncIterator[None]:
+        """Исключительный доступ для снимка: начатые секции завершены, новые ждут"""
+        async with self._snapshot_lock:
+            self._open.clear()
+            try:
+                while self._sections:
+                    await self._idle.wait()
+                yield
+            finally:
+                self._open.set()
+
+
+class EntityLocks:
+    """
+    Блокировки отдельных сущностей (исполнитель, клиент, чат) для изменений, растянутых на несколько await.
+    Изменения разных пользователей выполняются параллельно, одной сущности - по очереди.
+    Блокировки создаются при первом обращении и удаляются, когда их никто не держит и не ждёт.
+    Несколько блокировок берутся в одном порядке (по ключам), поэтому взаимных блокировок нет;
+    вложенные hold() в одной задаче не допускаются (asyncio.Lock не реентерабелен).
+    commit - подтверждение записи изменений: hold() ждёт его после выхода из секции барьера, ещё держа
+    блокировки сущностей (ответ пользователю отправляется после hold, то есть после записи).
+    """
+
+    def __init__(self, barrier: Optional[WriteBarrier] = None,
+                 commit: Optional[Callable[[], Awaitable[None]]] = None):
+        self.barrier = barrier or WriteBarrier()
+        self.commit = commit
+        # Ключ -> [блокировка, количество задач, которые её держат или ждут]
+        self._locks: Dict[LockKey, list] = {}
+
+    def __len__(self) -> int:
+        """Количество существующих блокировок"""
+        return len(self._locks)
+
+    def locked(self, key: LockKey) -> bool:
+        """Проверяет, что сущность заблокирована"""
+        entry = self._locks.get(key)
+        return entry is not None and entry[0].locked()
+
+    def _acquire_entry(self, key: LockKey) -> list:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry
+
+    def _release_entry(self, key: LockKey) -> None:
+        entry = self._locks[key]
+        entry[1] -= 1
+        if not entry[1]:
+            del self._locks[key]
+
+    @asynccontextmanager
+    async def _hold_keys(self, keys: List[LockKey]) -> AsyncIterator[None]:
+        entries: List[list] = [self._acquire_entry(key) for key in keys]
+        acquired: List[list] = []
+        try:
+            for entry in entries:
+                await entry[0].acquire()
+                acquired.append(entry)
+            yield
+        finally:
+            for entry in reversed(acquired):
+                entry[0].release()
+            for key in keys:
+                self._release_entry(key)
+
+    @asynccontextmanager
+    async def hold(self, *keys: LockKey) -> AsyncIterator[None]:
+        """
+        Блокирует сущности по ключам (None пропускается) на время секции изменения состояния.
+        В секцию барьера входим, только получив блокировки: задача, ждущая занятую сущность,
+        не считается открытой секцией и не задерживает снимок.
+        """
+        keys = sorted({key for key in keys if key is not None}, key=repr)
+        async with self._hold_keys(keys):
+            async with self.barrier.section():
+                yield
+            if self.commit is not None:
+                await self.commit()
+
+    @asynccontextmanager
+    async def serial(self, key: LockKey) -> AsyncIterator[None]:
+        """
+        Очередь по ключу без входа в барьер записи: задачи с одним ключом выполняются по одной
+        в порядке обращения. Для долгих операций (обработка обновления целиком), внутри которых
+        берутся блокировки сущностей через hold().
+        """
+        if key is None:
+            yield
+            return
+        async with self._hold_keys([key]):
+            yield
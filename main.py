@@ -1,32 +1,160 @@
 # main.py
+import asyncio
 import logging
-from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, MessageHandler, filters
-from config import BOT_TOKEN, LOGGING_FORMAT, LOGGING_LEVEL
-from handlers_common import start
-from button_handler import button
-from text_handler import handle_text, handle_photo
+import signal
+from telegram import Update
+from telegram.ext import (ApplicationBuilder, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler,
+                          filters)
+from config import BOT_TOKEN, BOT_API_URL, LOGGING_FORMAT, LOGGING_LEVEL, ARCHIVE_ENABLED, RUN_MODE, UPDATE_MODE
+
+# Модули с данными бота (state_manager и зависящие от него) импортируются в функциях:
+# супервизор кластера (RUN_MODE='cluster') данные не загружает, их загружают воркеры
 
 def setup_logging() -> None:
     """Настройка логирования"""
     level = getattr(logging, LOGGING_LEVEL.upper(), logging.INFO)
     logging.basicConfig(format=LOGGING_FORMAT, level=level)
 
-def main() -> None:
-    """Основная функция запуска бота"""
-    setup_logging()
-    
+def log_load_report() -> None:
+    """Пишет в лог отчёт о загрузке данных и архива"""
+    from state_manager import user_state
+    from archive import order_archive
+    logging.getLogger(__name__).info(user_state.format_load_report())
+    logging.getLogger(__name__).info("Архив %s: %d записей, индекс построен за %.0f мс", order_archive.filename,
+                                     order_archive.load_stats['records'],
+                                     order_archive.load_stats['load_time'] * 1000)
+
+async def post_init(application) -> None:
+    """Подключает шину и запускает фоновые задачи после инициализации бота"""
+    from bus import bus
+    from deadlines import deadline_scheduler
+    from dialogs import dialog_evictor
+    from archive import archive_scheduler
+    await bus.start(application)
+    deadline_scheduler.start(application.bot)
+    dialog_evictor.start(application)
+    if ARCHIVE_ENABLED:
+        archive_scheduler.start()
+
+async def post_shutdown(application) -> None:
+    """Останавливает фоновые задачи и сохраняет несохранённые данные"""
+    from bus import bus
+    from state_manager import user_state
+    from deadlines import deadline_scheduler
+    from dialogs import dialog_evictor
+    from archive import archive_scheduler
+    await deadline_scheduler.stop()
+    await dialog_evictor.stop()
+    await archive_scheduler.stop()
+    await user_state.close()
+    # Шина - последней: записанные при закрытии изменения рассылаются остальным воркерам
+    await bus.stop()
+
+def build_application(with_updater: bool = True):
+    """
+    Создаёт приложение с обработчиками.
+    with_updater=False - без long polling: обновления кладут в очередь приложения вебхук или шина (воркер кластера).
+    """
+    from handlers_common import commit_state, start
+    from handlers_admin import backfill_media_command
+    from button_handler import button
+    from text_handler import handle_text, handle_photo
+    from fsm import state_machine
+    from dialogs import dialog_persistence
+    from updates import UpdateQueue, create_update_processor
+
+    # Переходы таблицы состояний ведут в зарегистрированные состояния
+    state_machine.validate()
+
     # Создание приложения
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
+    builder = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .base_url(BOT_API_URL)
+        .persistence(dialog_persistence)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if not with_updater:
+        builder = builder.updater(None)
+    # Параллельная обработка обновлений с очередью на пользователя (CONCURRENT_UPDATES > 1)
+    update_processor = create_update_processor()
+    if update_processor is not None:
+        # Выборка из очереди ждёт места у обработчика; при long polling очередь ещё и ограничена по размеру.
+        # Вебхук сам отвечает 503 при переполнении, а шину воркера кластера блокировать нельзя
+        # (по ней же идут ответы на запросы других воркеров)
+        maxsize = update_processor.max_pending if with_updater else 0
+        builder = builder.concurrent_updates(update_processor).update_queue(UpdateQueue(update_processor, maxsize))
+    application = builder.build()
     
     # Добавление обработчиков
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("backfill_media", backfill_media_command))
     application.add_handler(CallbackQueryHandler(button))
     application.add_handler(MessageHandler(filters.PHOTO, handle_photo))  # Обработчик фото
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+    # Отдельная группа выполняется после основных обработчиков каждого обновления
+    application.add_handler(TypeHandler(Update, commit_state), group=1)
+    return application
+
+async def serve_application(application, webhook: bool = False) -> None:
+    """
+    Работа приложения без Updater до SIGINT/SIGTERM (у воркера кластера - и до закрытия шины).
+    Обновления приходят на встроенный вебхук (webhook=True) или через шину от супервизора кластера.
+    """
+    from bus import bus
+    from updates import update_backlog
+    from webhook import WebhookServer, webhook_secret_token, set_webhook
+
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except NotImplementedError:
+            # Windows: остановка по KeyboardInterrupt
+            pass
+
+    async with application:
+        await application.start()
+        await application.post_init(application)
+        server = None
+        if webhook:
+            secret_token = webhook_secret_token()
+            server = WebhookServer(application.bot, application.update_queue.put,
+                                   lambda: update_backlog(application), secret_token)
+            await server.start()
+            await set_webhook(application.bot, secret_token)
+
+        waits = [loop.create_task(stopping.wait()), loop.create_task(bus.closed.wait())]
+        await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+        for task in waits:
+            task.cancel()
+
+        if server is not None:
+            await server.stop()
+        await application.stop()
+    await application.post_shutdown(application)
+
+def main() -> None:
+    """Основная функция запуска бота"""
+    setup_logging()
+    if UPDATE_MODE not in ('polling', 'webhook'):
+        raise ValueError(f"Неизвестный способ получения обновлений: {UPDATE_MODE}")
+
+    if RUN_MODE == 'cluster':
+        from cluster import run_supervisor
+        run_supervisor()
+        return
+
+    log_load_report()
     
     # Запуск бота
     print("Бот запускается...")
-    application.run_polling()
+    if UPDATE_MODE == 'webhook':
+        asyncio.run(serve_application(build_application(with_updater=False), webhook=True))
+    else:
+        build_application().run_polling()
 
 if __name__ == '__main__':
     main()
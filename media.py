@@ -0,0 +1,122 @@
+# media.py
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from telegram import InputMediaPhoto
+from telegram.constants import MessageLimit
+
+from config import MEDIA_BACKFILL_INTERVAL_SECONDS
+from models import PortfolioItem
+from state_manager import user_state
+
+logger = logging.getLogger(__name__)
+
+
+def is_url(image: str) -> bool:
+    """Картинка задана ссылкой (иначе это file_id загруженного в Telegram фото)"""
+    return image.startswith(('http://', 'https://'))
+
+
+def photo_for(item: PortfolioItem, image: str) -> str:
+    """Что передавать в send_photo: file_id, если картинка по ссылке уже загружена, иначе саму картинку"""
+    if item.media:
+        uploaded = item.media.get(image)
+        if uploaded is not None:
+            return uploaded['file_id']
+    return image
+
+
+def pending_upload(item: PortfolioItem, image: str) -> Optional[str]:
+    """Ссылка картинки, ещё не загруженной в Telegram; None - отправляется по file_id"""
+    if is_url(image) and not (item.media and image in item.media):
+        return image
+    return None
+
+
+def remember_upload(category: str, item: PortfolioItem, source: str, message) -> bool:
+    """Запоминает file_id фото из отправленного по ссылке source сообщения"""
+    if message is None or not getattr(message, 'photo', None):
+        return False
+    photo = message.photo[-1]
+    if user_state.set_portfolio_media(category, item, source, photo.file_id, photo.file_unique_id):
+        logger.info("Картинка %s загружена в Telegram: %s", source, photo.file_unique_id)
+        return True
+    return False
+
+
+def split_caption(text: str, limit: int = MessageLimit.CAPTION_LENGTH) -> Tuple[str, str]:
+    """
+    Делит текст на подпись к фото (не длиннее limit) и остаток для отдельного сообщения.
+    Граница - последний перенос строки до limit (иначе последний пробел, иначе ровно limit),
+    чтобы не резать строку со ссылкой или слово.
+    """
+    if len(text) <= limit:
+        return text, ''
+    cut = text.rfind('\n', 0, limit + 1)
+    if cut <= 0:
+        cut = text.rfind(' ', 0, limit + 1)
+    if cut <= 0:
+        cut = limit
+    return text[:cut].rstrip(), text[cut:].strip()
+
+
+async def send_album(bot, chat_id: int, category: str, item: PortfolioItem, photos: Sequence[str],
+                     uploads: Sequence[Optional[str]], caption: str = '', **kwargs) -> List:
+    """
+    Отправляет фото элемента одним альбомом (send_media_group, 2-10 фото; подпись - у первого фото)
+    и запоминает file_id картинок, отправленных по ссылке (uploads[i] - ссылка фото photos[i] или None).
+    Клавиатуру к альбому прикрепить нельзя. Возвращает сообщения альбома.
+    """
+    media = [InputMediaPhoto(photo, caption=caption if i == 0 and caption else None)
+             for i, photo in enumerate(photos)]
+    messages = await bot.send_media_group(chat_id=chat_id, media=media, **kwargs)
+    for message, source in zip(messages, uploads):
+        if source:
+            remember_upload(category, item, source, message)
+    return list(messages)
+
+
+async def upload(bot, chat_id: int, category: str, item: PortfolioItem, source: str, **kwargs):
+    """
+    Отправляет картинку по ссылке в чат (Telegram скачивает её один раз) и запоминает file_id.
+    Ошибка отправки пробрасывается вызывающему. Возвращает отправленное сообщение.
+    """
+    message = await bot.send_photo(chat_id=chat_id, photo=source, **kwargs)
+    remember_upload(category, item, source, message)
+    return message
+
+
+def find_pending() -> List[Tuple[str, PortfolioItem, str]]:
+    """Картинки портфолио по ссылкам, ещё не загруженные в Telegram: (категория, элемент, ссылка)"""
+    return [(category, item, image)
+            for category, items in user_state.portfolio_items.items()
+            for item in items
+            for image in item.images
+            if pending_upload(item, image)]
+
+
+async def backfill(bot, chat_id: int, interval: float = MEDIA_BACKFILL_INTERVAL_SECONDS) -> Dict[str, int]:
+    """
+    Загружает в Telegram все картинки портфолио, заданные ссылками: каждая отправляется в чат chat_id
+    (без звука) и сразу удаляется. Между отправками - пауза interval (лимит сообщений в один чат).
+    """
+    stats = {'uploaded': 0, 'failed': 0, 'skipped': 0}
+    for category, item, source in find_pending():
+        if not pending_upload(item, source):
+            # Уже загружена (например, показом клиенту), пока шла загрузка предыдущих
+            stats['skipped'] += 1
+            continue
+        try:
+            message = await upload(bot, chat_id, category, item, source, disable_notification=True)
+        except Exception as e:
+            logger.warning("Не удалось загрузить картинку %s: %s", source, e)
+            stats['failed'] += 1
+        else:
+            stats['uploaded'] += 1
+            try:
+                await message.delete()
+            except Exception:
+                pass
+        await asyncio.sleep(interval)
+    return stats
@@ -0,0 +1,212 @@
+# models.py
+import secrets
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from typing import Any, ClassVar, Dict, List, NamedTuple, Optional, Tuple
+
+from config import DEFAULT_BALANCE, DEFAULT_RATING, DEFAULT_CLIENT_STATUS
+from utils import parse_datetime
+
+
+class Entity:
+    """
+    Базовый класс сущностей бота.
+    Сущности декодируются из словарей один раз при загрузке (даты разбираются сразу)
+    и кодируются обратно в словари для записи в хранилище.
+    """
+    __slots__ = ()
+
+    # Поля с датами: в хранилище - строки ISO, в памяти - datetime
+    DATETIME_FIELDS: ClassVar[Tuple[str, ...]] = ()
+    # Кэш имён полей по классам
+    _field_names: ClassVar[Dict[type, Tuple[str, ...]]] = {}
+    _field_sets: ClassVar[Dict[type, frozenset]] = {}
+
+    @classmethod
+    def _names(cls) -> Tuple[str, ...]:
+        """Имена полей данных сущности (без extra)"""
+        names = Entity._field_names.get(cls)
+        if names is None:
+            names = Entity._field_names[cls] = tuple(f.name for f in fields(cls) if f.name != 'extra')
+            Entity._field_sets[cls] = frozenset(names)
+        return names
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
+        """Создаёт сущность из словаря хранилища; неизвестные поля сохраняются в extra"""
+        cls._names()
+        if data.keys() <= Entity._field_sets[cls]:
+            # Быстрый путь: все поля известны, разбираем только даты
+            values = data
+            for name in cls.DATETIME_FIELDS:
+                value = data.get(name)
+                if value is not None:
+                    values = dict(values) if values is data else values
+                    values[name] = parse_datetime(value)
+            return cls(**values)
+
+        values = {}
+        extra = {}
+        for key, value in data.items():
+            if key in Entity._field_sets[cls]:
+                if key in cls.DATETIME_FIELDS and value is not None:
+                    value = parse_datetime(value)
+                values[key] = value
+            else:
+                extra[key] = value
+        return cls(extra=extra, **values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Кодирует сущность в словарь для хранилища; поля со значением None не записываются"""
+        data = {}
+        for name in self._names():
+            value = getattr(self, name)
+            if value is None:
+                continue
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            data[name] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+@dataclass(slots=True)
+class Entrepreneur(Entity):
+    """Исполнитель"""
+    password: str
+    rating: int = DEFAULT_RATING
+    balance: float = DEFAULT_BALANCE
+    chat_id: Optional[int] = None
+    extra: Optional[Dict[str, Any]] = None
+
+
+@dataclass(slots=True)
+class Client(Entity):
+    """Клиент"""
+    DATETIME_FIELDS: ClassVar[Tuple[str, ...]] = ('created_at',)
+
+    password: str
+    status: str = DEFAULT_CLIENT_STATUS
+    created_at: Optional[datetime] = None
+    chat_id: Optional[int] = None
+    extra: Optional[Dict[str, Any]] = None
+
+
+def new_order_id() -> str:
+    """
+    Постоянный идентификатор нового заказа. Короткий: он входит в id чата,
+    а тот - в callback_data кнопок (не более 64 байт)
+    """
+    return secrets.token_hex(4)
+
+
+# Заказы сравниваются по идентичности: индексы состояния хранят ссылки на конкретные объекты
+@dataclass(slots=True, eq=False)
+class Order(Entity):
+    """Заказ исполнителю"""
+    DATETIME_FIELDS: ClassVar[Tuple[str, ...]] = ('created_at', 'timer_end')
+
+    description: str = ''
+    client_login: Optional[str] = None
+    client_chat_id: Optional[int] = None
+    budget: Optional[float] = None
+    deadline_text: str = ''
+    created_at: Optional[datetime] = None
+    accepted: bool = False
+    timer_active: bool = False
+    timer_end: Optional[datetime] = None
+    expired: Optional[bool] = None
+    # Не зависит от позиции заказа в списке, которая сдвигается при архивации
+    order_id: str = field(default_factory=new_order_id)
+    extra: Optional[Dict[str, Any]] = None
+
+
+class ClientOrder(NamedTuple):
+    """
+    Снимок заказа для показа клиенту. Только для чтения: заказ меняется методами UserState
+    под блокировкой исполнителя, а не через эту копию. timer_end - None, если таймер не идёт.
+    """
+    contractor_login: str
+    order_id: str
+    description: str
+    accepted: bool
+    timer_end: Optional[datetime]
+
+    @classmethod
+    def of(cls, contractor_login: str, order: Order) -> 'ClientOrder':
+        return cls(contractor_login, order.order_id, order.description, order.accepted,
+                   order.timer_end if order.timer_active else None)
+
+
+@dataclass(slots=True)
+class Chat(Entity):
+    """Чат между клиентом и исполнителем"""
+    DATETIME_FIELDS: ClassVar[Tuple[str, ...]] = ('created_at',)
+
+    client_login: Optional[str] = None
+    client_chat_id: Optional[int] = None
+    contractor_login: Optional[str] = None
+    contractor_chat_id: Optional[int] = None
+    order_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    active: bool = False
+    extra: Optional[Dict[str, Any]] = None
+
+
+@dataclass(slots=True)
+class PortfolioItem(Entity):
+    """Элемент портфолио"""
+    DATETIME_FIELDS: ClassVar[Tuple[str, ...]] = ('created_at',)
+
+    title: str = ''
+    description: str = ''
+    images: List[str] = field(default_factory=list)
+    links: List[str] = field(default_factory=list)
+    created_at: Optional[datetime] = None
+    # Загруженные в Telegram картинки из images, заданные ссылкой: ссылка -> {'file_id', 'file_unique_id'}
+    media: Optional[Dict[str, Dict[str, str]]] = None
+    extra: Optional[Dict[str, Any]] = None
+
+
+def encode_value(value: Any) -> Any:
+    """Кодирует в JSON значения, которые json не умеет сериализовать сам"""
+    if isinstance(value, Entity):
+        return value.to_dict()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Значение типа {type(value).__name__} не сериализуется в JSON")
+
+
+def encode_plain(value: Any) -> Any:
+    """Переводит сущности и даты в простые типы (словари, списки, строки, числа)"""
+    if isinstance(value, Entity):
+        return value.to_dict()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return [encode_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {key: encode_plain(item) for key, item in value.items()}
+    return value
+
+
+# Классы сущностей коллекций; orders и portfolio_items хранят списки сущностей
+ENTITY_TYPES: Dict[str, type] = {
+    'entrepreneurs': Entrepreneur,
+    'clients': Client,
+    'orders': Order,
+    'active_chats': Chat,
+    'portfolio_items': PortfolioItem
+}
+LIST_COLLECTIONS = ('orders', 'portfolio_items')
+
+
+def decode_entity(collection: str, value: Any) -> Any:
+    """Декодирует запись коллекции из хранилища в сущность (остальные коллекции - как есть)"""
+    entity_type = ENTITY_TYPES.get(collection)
+    if entity_type is None:
+        return value
+    if collection in LIST_COLLECTIONS:
+        return [entity_type.from_dict(item) for item in value]
+    return entity_type.from_dict(value)
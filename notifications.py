@@ -0,0 +1,158 @@
+# notifications.py
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from telegram import InlineKeyboardMarkup
+
+from bus import bus
+from models import Order
+from state_manager import user_state
+from utils import calculate_end_time
+
+logger = logging.getLogger(__name__)
+
+
+async def _send_message(bot, payload: Dict[str, Any]) -> bool:
+    """Отправляет сообщение пользователю (выполняется в процессе пользователя)"""
+    reply_markup = InlineKeyboardMarkup.de_json(payload.get('reply_markup'), bot)
+    await bot.send_message(chat_id=payload['chat_id'], text=payload['text'], reply_markup=reply_markup)
+    return True
+
+
+def contractor_owner(contractor_login: str) -> Any:
+    """Пользователь, по которому распределяется исполнитель: его chat_id, без chat_id - логин"""
+    contractor = user_state.entrepreneurs.get(contractor_login)
+    if contractor is None or contractor.chat_id is None:
+        return contractor_login
+    return contractor.chat_id
+
+
+async def _update_contractor(bot, payload: Dict[str, Any]) -> bool:
+    """
+    Меняет данные исполнителя (выполняется в процессе исполнителя). Сущность записывается в хранилище целиком,
+    поэтому менять её может только этот процесс: запись из памяти другого воркера затёрла бы его изменения.
+    """
+    contractor_login, action, value = payload['contractor_login'], payload['action'], payload.get('value')
+    async with user_state.locks.hold(('contractor', contractor_login)):
+        if action == 'rating':
+            changed = user_state.update_entrepreneur_rating(contractor_login, value)
+        elif action == 'balance':
+            changed = user_state.set_entrepreneur_balance(contractor_login, value)
+        elif action == 'delete':
+            changed = user_state.delete_entrepreneur(contractor_login)
+        elif action == 'chat_id':
+            # Прежний владелец chat_id уже отпустил его и записал это в хранилище, здесь он может быть старым
+            holder = user_state.get_entrepreneur_by_chat_id(value)
+            if holder is not None and holder != contractor_login:
+                user_state.reload_entities({'entrepreneurs': [holder]})
+            changed = user_state.set_entrepreneur_chat_id(contractor_login, value)
+        else:
+            raise ValueError(f"Неизвестное изменение исполнителя: {action}")
+    if action == 'chat_id' and changed and user_state.shared_storage:
+        # Исполнитель переходит к процессу нового chat_id: тот перечитает его из хранилища после ответа
+        await user_state.flush()
+    return changed
+
+
+async def update_contractor(contractor_login: str, action: str, value: Any = None) -> bool:
+    """
+    Меняет данные исполнителя через его процесс: 'rating', 'balance', 'delete' или 'chat_id' (вход из чата value).
+    При входе chat_id должен быть уже отпущен прежним владельцем (он принадлежит этому же процессу);
+    изменения записываются до запроса, а после ответа исполнитель перечитывается - теперь он в этом процессе.
+    Возвращает False, если исполнителя нет.
+    """
+    owner = contractor_owner(contractor_login)
+    handoff = action == 'chat_id' and not bus.owns(owner)
+    if handoff:
+        await user_state.flush()
+    changed = await bus.request(owner, 'update_contractor', {
+        'contractor_login': contractor_login,
+        'action': action,
+        'value': value
+    })
+    if handoff and changed:
+        async with user_state.locks.barrier.snapshot():
+            user_state.reload_entities({'entrepreneurs': [contractor_login], 'orders': [contractor_login]})
+    return changed
+
+
+async def _offer_order(bot, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Отправляет заказ исполнителю и сохраняет его (выполняется в процессе исполнителя).
+    Проверка и сохранение - под блокировкой исполнителя, отправка - без неё: запрос к Telegram внутри
+    секции задержал бы запись состояния. Исполнителя могут удалить, пока идёт отправка,
+    поэтому перед сохранением он проверяется снова.
+    """
+    contractor_login = payload['contractor_login']
+    async with user_state.locks.hold(('contractor', contractor_login)):
+        contractor = user_state.entrepreneurs.get(contractor_login)
+        if contractor is None or contractor.chat_id is None:
+            return {'sent': False, 'error': 'Исполнитель недоступен'}
+        chat_id = contractor.chat_id
+
+    await bot.send_message(
+        chat_id=chat_id,
+        text=payload['text'],
+        reply_markup=InlineKeyboardMarkup.de_json(payload.get('reply_markup'), bot)
+    )
+
+    async with user_state.locks.hold(('contractor', contractor_login)):
+        if contractor_login not in user_state.entrepreneurs:
+            logger.warning("Исполнитель %s удалён во время отправки заказа, заказ не сохранён", contractor_login)
+            return {'sent': False, 'error': 'Исполнитель удалён'}
+
+        order = Order(
+            description=payload['text'],
+            client_login=payload['client_login'],
+            client_chat_id=payload['client_chat_id'],
+            budget=payload['budget'],
+            deadline_text=payload['deadline_text'],
+            created_at=datetime.now()
+        )
+        user_state.add_order(contractor_login, order)
+        logger.debug("Заказ клиента %s сохранён у исполнителя %s", payload['client_login'], contractor_login)
+
+        end_time = calculate_end_time(payload['deadline_text'])
+        if end_time:
+            order_index = len(user_state.get_orders(contractor_login)) - 1
+            user_state.update_order_timer(contractor_login, order_index, end_time)
+    return {'sent': True, 'end_time': end_time.isoformat() if end_time else None}
+
+
+async def send_to_user(chat_id: int, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> None:
+    """
+    Отправляет сообщение пользователю через процесс, которому он принадлежит
+    (в режиме одного процесса - сразу). Ошибка отправки пробрасывается вызывающему.
+    """
+    await bus.request(chat_id, 'send_message', {
+        'chat_id': chat_id,
+        'text': text,
+        'reply_markup': reply_markup.to_dict() if reply_markup is not None else None
+    })
+
+
+async def offer_order(contractor_login: str, contractor_chat_id: int, text: str,
+                      reply_markup: InlineKeyboardMarkup, client_login: Optional[str], client_chat_id: int,
+                      budget: Optional[float], deadline_text: str) -> Optional[datetime]:
+    """
+    Предлагает заказ исполнителю через его процесс: отправляет предложение, сохраняет заказ и запускает таймер.
+    Возвращает время окончания срока (None - без таймера); если заказ не отправлен, выбрасывает исключение.
+    """
+    result = await bus.request(contractor_chat_id, 'offer_order', {
+        'contractor_login': contractor_login,
+        'text': text,
+        'reply_markup': reply_markup.to_dict(),
+        'client_login': client_login,
+        'client_chat_id': client_chat_id,
+        'budget': budget,
+        'deadline_text': deadline_text
+    })
+    if not result['sent']:
+        raise RuntimeError(result['error'])
+    return datetime.fromisoformat(result['end_time']) if result['end_time'] else None
+
+
+bus.register('send_message', _send_message)
+bus.register('offer_order', _offer_order)
+bus.register('update_contractor', _update_contractor)
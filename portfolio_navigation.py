@@ -0,0 +1,187 @@
+# portfolio_navigation.py
+import logging
+from typing import Any, Dict, Optional
+
+from telegram import InlineKeyboardMarkup, InputMediaPhoto, Message, Update
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+
+from media import remember_upload, send_album
+from portfolio_views import PortfolioViews, portfolio_views
+
+logger = logging.getLogger(__name__)
+
+# Ключ context.user_data с текущей сессией просмотра портфолио
+SESSION_KEY = 'portfolio_session'
+
+
+class PortfolioNavigator:
+    """
+    Просмотр портфолио в одной карточке. Каждый шаг (категории, список работ, карточка работы, листание фото)
+    правит сообщение, на котором нажата кнопка, - один запрос к API вместо отправки нового сообщения
+    и удаления старого, и без промежуточного состояния, когда старое уже удалено, а новое не пришло.
+    На карточке с фото фото меняется через edit_message_media, а списки показываются подписью
+    (edit_message_caption). Новое сообщение отправляется, только когда тип карточки нужно сменить
+    (Telegram не превращает текстовое сообщение в фото и обратно): первое фото за сессию, работа без фото
+    или текст длиннее подписи на карточке с фото, выход из портфолио.
+
+    Сессия просмотра - одна карточка: пока пользователь нажимает кнопки на ней, считаются шаги и запросы
+    к API. Итог сессии пишется в лог при выходе из портфолио или переходе к другому сообщению,
+    общий счёт - в stats.
+    """
+
+    def __init__(self, views: PortfolioViews):
+        self.views = views
+        self.stats = {'sessions': 0, 'steps': 0, 'api_calls': 0}
+
+    def _session(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> Dict[str, int]:
+        """Сессия карточки, на которой нажата кнопка (при переходе к другому сообщению - новая); засчитывает шаг"""
+        message_id = update.callback_query.message.message_id
+        session = context.user_data.get(SESSION_KEY)
+        if session is None or session['message_id'] != message_id:
+            if session is not None:
+                self._close(session)
+            session = {'message_id': message_id, 'steps': 0, 'api_calls': 0}
+            context.user_data[SESSION_KEY] = session
+            self.stats['sessions'] += 1
+        session['steps'] += 1
+        self.stats['steps'] += 1
+        return session
+
+    def _close(self, session: Dict[str, int]) -> None:
+        logger.info("Сессия просмотра портфолио: шагов %d, запросов к API %d (всего сессий %d, запросов на шаг %.2f)",
+                    session['steps'], session['api_calls'], self.stats['sessions'],
+                    self.stats['api_calls'] / max(self.stats['steps'], 1))
+
+    async def _call(self, session: Dict[str, int], method, *args: Any, **kwargs: Any) -> Any:
+        """Запрос к API в счёт сессии"""
+        session['api_calls'] += 1
+        self.stats['api_calls'] += 1
+        return await method(*args, **kwargs)
+
+    async def _edit(self, session: Dict[str, int], method, *args: Any, **kwargs: Any) -> Any:
+        """Правка карточки; повторное нажатие той же кнопки (содержимое не изменилось) - не ошибка"""
+        try:
+            return await self._call(session, method, *args, **kwargs)
+        except BadRequest as e:
+            if 'not modified' in e.message.lower():
+                return None
+            raise
+
+    async def _replace(self, session: Dict[str, int], update: Update, context: ContextTypes.DEFAULT_TYPE,
+                       text: str, reply_markup: Optional[InlineKeyboardMarkup], photo: Optional[str] = None
+                       ) -> Message:
+        """Карточка другого типа: новое сообщение (фото с подписью text или текст) вместо старого"""
+        query = update.callback_query
+        chat_id = query.from_user.id
+        if photo is None:
+            message = await self._call(session, context.bot.send_message, chat_id=chat_id, text=text,
+                                       reply_markup=reply_markup)
+        else:
+            message = await self._call(session, context.bot.send_photo, chat_id=chat_id, photo=photo, caption=text,
+                                       reply_markup=reply_markup)
+        try:
+            await self._call(session, query.delete_message)
+        except Exception:
+            pass
+        session['message_id'] = message.message_id
+        return message
+
+    async def _show(self, session: Dict[str, int], update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                    reply_markup: Optional[InlineKeyboardMarkup], keep_photo: bool = True) -> None:
+        """Текстовый экран на карточке: подписью под фото (keep_photo) или текстом"""
+        query = update.callback_query
+        if query.message.photo:
+            if not keep_photo or len(text) > MessageLimit.CAPTION_LENGTH:
+                await self._replace(session, update, context, text, reply_markup)
+                return
+            edit, kwargs = query.edit_message_caption, {'caption': text}
+        else:
+            edit, kwargs = query.edit_message_text, {'text': text}
+        try:
+            await self._edit(session, edit, reply_markup=reply_markup, **kwargs)
+        except BadRequest as e:
+            # Карточку нельзя изменить (например, её удалили) - показываем экран новым сообщением
+            logger.warning("Не удалось изменить карточку портфолио: %s", e)
+            await self._replace(session, update, context, text, reply_markup)
+
+    async def show_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                        reply_markup: Optional[InlineKeyboardMarkup]) -> None:
+        """Экран портфолио без фото (категории, список работ) на текущей карточке"""
+        await self._show(self._session(update, context), update, context, text, reply_markup)
+
+    async def show_category(self, update: Update, context: ContextTypes.DEFAULT_TYPE, category: str) -> None:
+        """Список работ категории на текущей карточке"""
+        view = self.views.category(category)
+        await self.show_text(update, context, view.text, view.reply_markup)
+
+    async def show_item(self, update: Update, context: ContextTypes.DEFAULT_TYPE, category: str, index: int,
+                        photo: int = 0) -> None:
+        """Карточка работы с фото номер photo"""
+        view = self.views.item(category, index)
+        if view is None:
+            await self.show_text(update, context, "Проект не найден.", None)
+            return
+
+        session = self._session(update, context)
+        if not view.photos:
+            await self._show(session, update, context, view.text, view.reply_markup, keep_photo=False)
+            return
+
+        photo = photo if 0 <= photo < len(view.photos) else 0
+        reply_markup = view.keyboards[photo]
+        query = update.callback_query
+        try:
+            if query.message.photo:
+                media = InputMediaPhoto(view.photos[photo], caption=view.caption)
+                message = await self._edit(session, query.edit_message_media, media, reply_markup=reply_markup)
+            else:
+                message = await self._replace(session, update, context, view.caption, reply_markup,
+                                              photo=view.photos[photo])
+        except Exception as e:
+            # Фото не удалось показать - показываем текст, кнопки листания остаются
+            logger.warning("Не удалось показать фото работы %s/%d: %s", category, index, e)
+            await self._show(session, update, context, view.text, reply_markup, keep_photo=False)
+            return
+
+        if view.uploads[photo] and isinstance(message, Message):
+            # Картинка по ссылке отправлена впервые: дальше она пойдёт по file_id
+            remember_upload(category, view.item, view.uploads[photo], message)
+
+    async def show_album(self, update: Update, context: ContextTypes.DEFAULT_TYPE, category: str,
+                         index: int) -> None:
+        """Все фото работы одним альбомом под карточкой (карточка остаётся, листать можно дальше)"""
+        view = self.views.item(category, index)
+        if view is None or len(view.photos) < 2:
+            return
+        session = self._session(update, context)
+        await self._call(session, send_album, context.bot, update.callback_query.from_user.id, category, view.item,
+                         view.photos, view.uploads, caption=view.caption)
+
+    async def show_full_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE, category: str,
+                             index: int) -> None:
+        """Полный текст работы, не поместившийся в подпись, отдельным сообщением под карточкой"""
+        view = self.views.item(category, index)
+        if view is None:
+            return
+        session = self._session(update, context)
+        await self._call(session, context.bot.send_message, chat_id=update.callback_query.from_user.id,
+                         text=view.text)
+
+    async def leave(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                    reply_markup: Optional[InlineKeyboardMarkup]) -> None:
+        """Выход из портфолио на экран text: карточка с фото заменяется текстом, сессия завершается"""
+        query = update.callback_query
+        session = context.user_data.get(SESSION_KEY)
+        if not query.message.photo and (session is None or session['message_id'] != query.message.message_id):
+            # Не из портфолио - обычная правка сообщения
+            await query.edit_message_text(text, reply_markup=reply_markup)
+            return
+        session = self._session(update, context)
+        await self._show(session, update, context, text, reply_markup, keep_photo=False)
+        self._close(context.user_data.pop(SESSION_KEY))
+
+
+# Глобальный навигатор по портфолио
+portfolio_navigator = PortfolioNavigator(portfolio_views)
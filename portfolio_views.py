@@ -0,0 +1,149 @@
+# portfolio_views.py
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from telegram import InlineKeyboardMarkup
+from telegram.constants import MediaGroupLimit
+
+from keyboards import build_keyboard, build_menu
+from media import photo_for, pending_upload, split_caption
+from models import PortfolioItem
+from state_manager import UserState, user_state
+
+# Заголовки списка категории: (есть работы, работ нет - показываются подкатегории)
+_CATEGORY_TITLES = {
+    'sites': ("Наши сайты:", "Выберите тип сайта:"),
+    'video': ("Наши видео:", "Выберите тип видео:")
+}
+
+# Подкатегории, которые показываются, пока в категории нет работ
+_EMPTY_CATEGORY_MENUS = {
+    'sites': build_menu(
+        ("📄 Лендинги", 'subcategory_landing'),
+        ("🛒 Интернет магазины", 'subcategory_shop'),
+        ("🎨 Сайты на Тильда", 'subcategory_tilda'),
+        ("⚙️ Сайты на WordPress", 'subcategory_wordpress'),
+        ("← Назад", 'our_works')
+    ),
+    'video': build_menu(
+        ("📺 Видео реклама", 'subcategory_ads'),
+        ("🎭 Креативы", 'subcategory_creative'),
+        ("✨ Анимации", 'subcategory_animation'),
+        ("🎬 Моушен графика", 'subcategory_motion'),
+        ("🎮 3D видео", 'subcategory_3d'),
+        ("← Назад", 'our_works')
+    )
+}
+
+
+def _item_keyboards(category: str, index: int, photos: int, caption_rest: bool) -> Tuple[InlineKeyboardMarkup, ...]:
+    """
+    Клавиатуры карточки работы, по одной на фото (без фото - одна): листание фото в той же карточке,
+    альбом со всеми фото, полный текст, если он не поместился в подпись, и возврат к списку категории
+    """
+    rows = []
+    if photos > 1:
+        rows.append([(f"🖼 Все фото ({photos})", f'portfolio_album_{category}_{index}')])
+    if caption_rest:
+        rows.append([("📄 Полный текст", f'portfolio_text_{category}_{index}')])
+    rows.append([("← Назад", f'back_to_{category}')])
+    if photos <= 1:
+        return (build_keyboard(rows),)
+    return tuple(build_keyboard([[("◀", f'portfolio_photo_{category}_{index}_{(photo - 1) % photos}'),
+                                  ("▶", f'portfolio_photo_{category}_{index}_{(photo + 1) % photos}')]] + rows)
+                 for photo in range(photos))
+
+
+class CategoryView(NamedTuple):
+    """Готовый список работ категории"""
+    text: str
+    reply_markup: InlineKeyboardMarkup
+
+
+class ItemView(NamedTuple):
+    """
+    Готовая карточка работы: полный текст (показывается, если фото нет), подпись к фото и остаток текста,
+    не вошедший в подпись, фото для отправки (file_id, если картинка уже загружена в Telegram; не больше,
+    чем помещается в альбом), ссылки картинок, которые нужно запомнить после первой отправки
+    (по одной на фото, None - загружать нечего), клавиатуры карточки (по одной на фото) и сам элемент.
+    """
+    text: str
+    caption: str
+    caption_rest: str
+    photos: Tuple[str, ...]
+    uploads: Tuple[Optional[str], ...]
+    keyboards: Tuple[InlineKeyboardMarkup, ...]
+    item: PortfolioItem
+
+    @property
+    def reply_markup(self) -> InlineKeyboardMarkup:
+        """Клавиатура карточки с первым фото (или без фото)"""
+        return self.keyboards[0]
+
+
+def render_item_text(item: PortfolioItem) -> str:
+    """Текст карточки: НАЗВАНИЕ БОЛЬШИМИ БУКВАМИ, описание и ссылки"""
+    text = f"🔥 {item.title.upper()}\n━━━━━━━━━━━━━━━━━\n\n{item.description}"
+    if item.links:
+        text += "\n\n🔗 Ссылки:" + ''.join(f"\n• {link}" for link in item.links)
+    return text
+
+
+class PortfolioViews:
+    """
+    Кеш готовых представлений портфолио для просмотра клиентами: списков категорий и карточек работ.
+    Портфолио меняет только администратор, а смотрят его все посетители, поэтому представление строится
+    при первом показе и дальше берётся из словаря. Кеш привязан к версии портфолио в UserState:
+    добавление, удаление, загрузка картинки в Telegram или перечитывание портфолио (в том числе записанного
+    другим воркером) меняет версию, и кеш сбрасывается при следующем обращении.
+    """
+
+    def __init__(self, state: UserState):
+        self.state = state
+        self._version: Optional[int] = None
+        self._categories: Dict[str, CategoryView] = {}
+        self._items: Dict[Tuple[str, int], ItemView] = {}
+
+    def _check_version(self) -> None:
+        version = self.state.portfolio_version
+        if version != self._version:
+            self._categories.clear()
+            self._items.clear()
+            self._version = version
+
+    def category(self, category: str) -> CategoryView:
+        """Список работ категории (пока работ нет - подкатегории)"""
+        self._check_version()
+        view = self._categories.get(category)
+        if view is None:
+            items = self.state.portfolio_items.get(category, [])
+            with_items, empty = _CATEGORY_TITLES[category]
+            if items:
+                buttons = [(item.title, f'portfolio_item_{category}_{i}') for i, item in enumerate(items)]
+                view = CategoryView(with_items, build_menu(*buttons, ("← Назад", 'our_works')))
+            else:
+                view = CategoryView(empty, _EMPTY_CATEGORY_MENUS[category])
+            self._categories[category] = view
+        return view
+
+    def item(self, category: str, index: int) -> Optional[ItemView]:
+        """Карточка работы; None - работы с таким индексом нет (отсутствие не кешируется)"""
+        self._check_version()
+        view = self._items.get((category, index))
+        if view is None:
+            items = self.state.portfolio_items.get(category, [])
+            if not 0 <= index < len(items):
+                return None
+            item = items[index]
+            text = render_item_text(item)
+            caption, caption_rest = split_caption(text)
+            images = [image for image in item.images if image][:MediaGroupLimit.MAX_MEDIA_LENGTH]
+            view = ItemView(text, caption, caption_rest,
+                            tuple(photo_for(item, image) for image in images),
+                            tuple(pending_upload(item, image) for image in images),
+                            _item_keyboards(category, index, len(images), bool(images and caption_rest)), item)
+            self._items[(category, index)] = view
+        return view
+
+
+# Глобальный кеш представлений портфолио
+portfolio_views = PortfolioViews(user_state)
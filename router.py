@@ -0,0 +1,189 @@
+# router.py
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import PORTFOLIO_CATEGORIES, ROUTER_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Обработчик маршрута: (update, context, **аргументы) -> None
+RouteHandler = Callable[..., Awaitable[None]]
+
+_ARGUMENT = re.compile(r'\{(\w+)(?::(\w+))?\}')
+_ARGUMENTS = re.compile(r'\{\w+(?::\w+)?\}(?:_\{\w+(?::\w+)?\})*')
+
+
+# Типы аргументов маршрутов: имя типа -> (регулярное выражение значения, преобразование или None).
+# Значение аргумента не может содержать '_', кроме последнего аргумента маршрута типа 'str'
+ARGUMENT_TYPES: Dict[str, Tuple[str, Optional[Callable[[str], Any]]]] = {
+    'str': (r'[^_]+', None),
+    # Только ASCII-цифры: int() принял бы и '1_000', и пробелы, и не-ASCII цифры
+    'int': (r'-?[0-9]+', int),
+    'category': ('|'.join(re.escape(category) for category in PORTFOLIO_CATEGORIES), None)
+}
+
+
+class Route:
+    """
+    Маршрут callback_data.
+    Шаблон без аргументов сравнивается целиком ('admin_back'), с аргументами - по префиксу до первого
+    аргумента (префикс заканчивается на '_'); аргументы разделены '_', последний аргумент типа 'str'
+    получает весь остаток (логин или id чата может содержать '_'):
+    'portfolio_item_{category:category}_{index:int}', 'entrepreneur_{login}'.
+    Аргументы проверяются и выделяются одним регулярным выражением, скомпилированным при регистрации.
+    """
+
+    __slots__ = ('pattern', 'handler', 'kwargs', 'prefix', 'args', '_regex', '_names', '_conversions')
+
+    def __init__(self, pattern: str, handler: RouteHandler, kwargs: Dict[str, Any]):
+        self.pattern = pattern
+        self.handler = handler
+        self.kwargs = kwargs
+        start = pattern.find('{')
+        self.prefix = pattern if start == -1 else pattern[:start]
+        # Аргументы: (имя, преобразование)
+        self.args: List[Tuple[str, Optional[Callable[[str], Any]]]] = []
+        self._regex: Optional[re.Pattern] = None
+        self._names: Tuple[str, ...] = ()
+        self._conversions: Tuple[Tuple[str, Callable[[str], Any]], ...] = ()
+        if start == -1:
+            return
+
+        if not pattern.endswith('_', 0, start) or not _ARGUMENTS.fullmatch(pattern, start):
+            raise ValueError(f"Некорректный шаблон маршрута: {pattern}")
+        arguments = _ARGUMENT.findall(pattern, start)
+        groups = []
+        for position, (name, type_name) in enumerate(arguments):
+            type_name = type_name or 'str'
+            if type_name not in ARGUMENT_TYPES:
+                raise ValueError(f"Неизвестный тип аргумента {type_name} в маршруте {pattern}")
+            value_regex, convert = ARGUMENT_TYPES[type_name]
+            if type_name == 'str' and position == len(arguments) - 1:
+                value_regex = r'.+'
+            groups.append(f"({value_regex})")
+            self.args.append((name, convert))
+        self._regex = re.compile('_'.join(groups), re.DOTALL)
+        self._names = tuple(name for name, _ in self.args)
+        self._conversions = tuple((name, convert) for name, convert in self.args if convert is not None)
+
+    @property
+    def exact(self) -> bool:
+        """Маршрут без аргументов"""
+        return not self.args
+
+    def parse(self, data: str) -> Optional[Dict[str, Any]]:
+        """Разбирает аргументы из callback_data с этим префиксом; None - данные не подходят"""
+        match = self._regex.fullmatch(data, len(self.prefix))
+        if match is None:
+            return None
+        result = dict(zip(self._names, match.groups()))
+        for name, convert in self._conversions:
+            result[name] = convert(result[name])
+        return result
+
+    def __repr__(self) -> str:
+        handler = getattr(self.handler, '__qualname__', repr(self.handler))
+        extra = ''.join(f", {key}={value!r}" for key, value in self.kwargs.items())
+        return f"Route({self.pattern!r} -> {handler}{extra})"
+
+
+class CallbackRouter:
+    """
+    Маршрутизатор callback_data кнопок.
+    Маршруты без аргументов ищутся в словаре, с аргументами - в префиксном дереве по сегментам
+    callback_data между '_': поиск проходит только по длине префикса и берёт самый длинный подходящий
+    префикс (если аргументы не разобрались - следующий по длине). Стоимость не зависит от числа маршрутов.
+    Разбор повторяющихся callback_data (одни и те же кнопки у многих пользователей) кешируется.
+    """
+
+    def __init__(self, cache_size: int = ROUTER_CACHE_SIZE):
+        self._exact: Dict[str, Route] = {}
+        # Узел дерева: {сегмент: узел, None: маршрут с префиксом до этого узла}
+        self._trie: Dict[Any, Any] = {}
+        self._routes: List[Route] = []
+        # Кеш разбора: callback_data -> (маршрут, аргументы); аргументы из кеша не изменяются
+        self._resolve_cached = lru_cache(maxsize=cache_size)(self._resolve_prefix)
+
+    def add(self, pattern: str, handler: RouteHandler, **kwargs: Any) -> Route:
+        """Добавляет маршрут; kwargs передаются обработчику вместе с аргументами из callback_data"""
+        route = Route(pattern, handler, kwargs)
+        clashes = set(kwargs) & {name for name, _ in route.args}
+        if clashes:
+            raise ValueError(f"Аргументы {sorted(clashes)} маршрута {pattern} переданы и в kwargs")
+        if route.exact:
+            if pattern in self._exact:
+                raise ValueError(f"Маршрут {pattern} уже зарегистрирован: {self._exact[pattern]}")
+            self._exact[pattern] = route
+        else:
+            node = self._trie
+            for segment in route.prefix[:-1].split('_'):
+                node = node.setdefault(segment, {})
+            if None in node:
+                raise ValueError(f"Префикс {route.prefix} уже зарегистрирован: {node[None]}")
+            node[None] = route
+        self._routes.append(route)
+        self._resolve_cached.cache_clear()
+        return route
+
+    def route(self, pattern: str, **kwargs: Any) -> Callable[[RouteHandler], RouteHandler]:
+        """Декоратор регистрации обработчика; можно применять несколько раз к одной функции"""
+        def decorator(handler: RouteHandler) -> RouteHandler:
+            self.add(pattern, handler, **kwargs)
+            return handler
+        return decorator
+
+    def _resolve_prefix(self, data: str) -> Optional[Tuple[Route, Dict[str, Any]]]:
+        candidates = []
+        node = self._trie
+        start = 0
+        position = data.find('_')
+        while position != -1:
+            node = node.get(data[start:position])
+            if node is None:
+                break
+            route = node.get(None)
+            if route is not None:
+                candidates.append(route)
+            start = position + 1
+            position = data.find('_', start)
+        for route in reversed(candidates):
+            args = route.parse(data)
+            if args is not None:
+                return route, args
+        return None
+
+    def resolve(self, data: str) -> Optional[Tuple[Route, Dict[str, Any]]]:
+        """Находит маршрут и аргументы для callback_data; None - подходящего маршрута нет"""
+        route = self._exact.get(data)
+        if route is not None:
+            return route, {}
+        resolved = self._resolve_cached(data)
+        return None if resolved is None else (resolved[0], dict(resolved[1]))
+
+    async def dispatch(self, data: str, update: Any, context: Any) -> bool:
+        """Вызывает обработчик маршрута; False - маршрут не найден"""
+        route = self._exact.get(data)
+        if route is not None:
+            await route.handler(update, context, **route.kwargs)
+            return True
+        resolved = self._resolve_cached(data)
+        if resolved is None:
+            return False
+        route, args = resolved
+        await route.handler(update, context, **route.kwargs, **args)
+        return True
+
+    @property
+    def routes(self) -> List[Route]:
+        """Таблица маршрутов в порядке регистрации"""
+        return list(self._routes)
+
+    def describe(self) -> str:
+        """Таблица маршрутов текстом (для отладки)"""
+        return '\n'.join(repr(route) for route in sorted(self._routes, key=lambda route: route.pattern))
+
+
+# Глобальный маршрутизатор кнопок
+callback_router = CallbackRouter()
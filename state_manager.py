@@ -1,189 +1,758 @@
 # state_manager.py
-import json
-from typing import Dict, List, Optional, Any
+import asyncio
+import bisect
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Any, Set, Tuple
 from datetime import datetime, timedelta
-from config import DATA_FILE, DEFAULT_BALANCE, DEFAULT_RATING, DEFAULT_CLIENT_STATUS
+from config import (DATA_FILE, DEFAULT_BALANCE, DEFAULT_RATING, DEFAULT_CLIENT_STATUS,
+                    PERSISTENCE_MODE, SAVE_INTERVAL_MS, SAVE_MAX_PENDING, STORAGE_BACKEND,
+                    CHECK_STATE_INVARIANTS, DIALOG_TTL_SECONDS, DIALOG_TOUCH_SAVE_SECONDS,
+                    ARCHIVE_ORDER_AGE_DAYS)
+from locks import EntityLocks
+from models import Entrepreneur, Client, ClientOrder, Order, Chat, PortfolioItem, decode_entity
+from storage import COLLECTIONS, create_storage
+
+logger = logging.getLogger(__name__)
 
 
 class UserState:
-    def __init__(self, filename: str = DATA_FILE):
+    def __init__(self, filename: str = DATA_FILE, persistence_mode: str = PERSISTENCE_MODE,
+                 backend: str = STORAGE_BACKEND):
         self.filename = filename
-        self.state: Dict[int, str] = {}
-        self.entrepreneurs = self.load_entrepreneurs()
-        self.clients = self.load_clients()
-        self.orders = self.load_orders()
-        self.active_chats = self.load_chats()
-        self.portfolio_items = self.load_portfolio_items()
-
-    def load_entrepreneurs(self) -> Dict[str, Dict[str, Any]]:
-        """Загружает данные исполнителей из файла"""
-        try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            entrepreneurs = data.get('entrepreneurs', {})
-
-            # Добавляем баланс для существующих исполнителей, если его нет
-            for login in entrepreneurs:
-                if 'balance' not in entrepreneurs[login]:
-                    entrepreneurs[login]['balance'] = DEFAULT_BALANCE
-            return entrepreneurs
-        except FileNotFoundError:
-            return {}
-
-    def load_clients(self) -> Dict[str, Dict[str, Any]]:
-        """Загружает данные клиентов из файла"""
-        try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return data.get('clients', {})
-        except FileNotFoundError:
-            return {}
-
-    def load_orders(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Загружает заказы из файла"""
-        try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return data.get('orders', {})
-        except FileNotFoundError:
-            return {}
-
-    def load_chats(self) -> Dict[str, Dict[str, Any]]:
-        """Загружает активные чаты из файла"""
-        try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return data.get('active_chats', {})
-        except FileNotFoundError:
-            return {}
-
-    def load_portfolio_items(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Загружает элементы портфолио из файла"""
-        try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return data.get('portfolio_items', {})
-        except FileNotFoundError:
-            return {}
+        self.persistence_mode = persistence_mode
+        self.storage = create_storage(backend, filename)
+        # Диалоги пользователей: str(user_id) -> {'state', 'data', 'touched'},
+        # упорядочены по последнему обращению (старые - в начале)
+        self.dialogs: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
 
-    def save_data(self) -> None:
-        """Сохраняет все данные в файл"""
-        data = {
+        # Состояние отложенной записи: изменённые сущности по коллекциям
+        self._dirty = False
+        self._changes: Dict[str, Set[str]] = {collection: set() for collection in COLLECTIONS}
+        self._changes_all = False
+        self._pending_changes = 0
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._dirty_event: Optional[asyncio.Event] = None
+        self._flush_now_event: Optional[asyncio.Event] = None
+        # Блокировки сущностей для изменений, растянутых на несколько await, и барьер записи снимков;
+        # изменения под блокировкой подтверждаются записью (commit) до её снятия
+        self.locks = EntityLocks(commit=self.commit)
+
+        self.entrepreneurs: Dict[str, Entrepreneur] = {}
+        self.clients: Dict[str, Client] = {}
+        self.orders: Dict[str, List[Order]] = {}
+        self.active_chats: Dict[str, Chat] = {}
+        self.portfolio_items: Dict[str, List[PortfolioItem]] = {}
+        # Версия портфолио: растёт при каждом изменении (по ней сбрасываются готовые представления портфолио)
+        self.portfolio_version = 0
+        self.load_stats: Dict[str, Any] = {}
+        self._migrated = 0
+
+        # Обратные индексы chat_id -> логины (в порядке назначения chat_id)
+        self._entrepreneur_by_chat: Dict[int, List[str]] = {}
+        self._client_by_chat: Dict[int, List[str]] = {}
+        # Исполнители по убыванию рейтинга: все и только доступные (с chat_id)
+        self._rating_order: List[Tuple[Any, int, str]] = []
+        self._available_order: List[Tuple[Any, int, str]] = []
+        self._entrepreneur_seq: Dict[str, int] = {}
+        self._next_entrepreneur_seq = 0
+        # Индексы активных чатов: участник -> чаты, (клиент, исполнитель) -> чаты
+        self._chats_by_participant: Dict[int, Dict[str, None]] = {}
+        self._chats_by_pair: Dict[Tuple[str, str], Dict[str, None]] = {}
+        # Индекс заказов клиента: логин клиента -> (логин исполнителя, заказ)
+        self._orders_by_client: Dict[str, List[Tuple[str, Order]]] = {}
+        # Заказы с активным таймером: id(заказа) -> (логин исполнителя, заказ)
+        self._active_timers: Dict[int, Tuple[str, Order]] = {}
+        # Подписчики на изменение таймеров заказов (планировщик сроков)
+        self.timer_listeners: List[Callable[[str, Order], None]] = []
+        # Подписчики на запись изменений в хранилище: коллекция -> записанные ключи, None - записано всё
+        # (воркеры кластера рассылают их другим воркерам)
+        self.flush_listeners: List[Callable[[Optional[Dict[str, Set[str]]]], None]] = []
+        # Хранилище общее с другими процессами (воркер кластера): каждый пишет только изменённые им сущности
+        self.shared_storage = False
+        self.check_invariants_enabled = CHECK_STATE_INVARIANTS
+
+        self.load_data()
+
+    def load_data(self) -> None:
+        """
+        Загружает все коллекции из хранилища за один проход.
+        Хранилище передаёт записи по одной в _decode_record, поэтому в памяти не бывает
+        одновременно всех сырых словарей и готовых сущностей.
+        """
+        started = time.perf_counter()
+        stats: Dict[str, Any] = {'file_size': 0}
+        self._migrated = 0
+
+        data = self.storage.load(stats, self._decode_record)
+        load_done = time.perf_counter()
+
+        self.entrepreneurs = data.get('entrepreneurs', {})
+        self.clients = data.get('clients', {})
+        self.orders = data.get('orders', {})
+        self.active_chats = data.get('active_chats', {})
+        self.portfolio_items = data.get('portfolio_items', {})
+        self.portfolio_version += 1
+        self.dialogs = OrderedDict(sorted(data.get('dialogs', {}).items(),
+                                          key=lambda item: item[1].get('touched', 0)))
+        self._rebuild_indexes()
+
+        stats['migrated'] = self._migrated
+        stats['index_time'] = time.perf_counter() - load_done
+        stats['total_time'] = time.perf_counter() - started
+        stats['counts'] = {
+            'entrepreneurs': len(self.entrepreneurs),
+            'clients': len(self.clients),
+            'orders': sum(len(orders) for orders in self.orders.values()),
+            'active_chats': len(self.active_chats),
+            'portfolio_items': sum(len(items) for items in self.portfolio_items.values()),
+            'dialogs': len(self.dialogs)
+        }
+        self.load_stats = stats
+
+    def _decode_record(self, collection: str, key: str, value: Any) -> Any:
+        """Приводит запись из хранилища к текущему формату и декодирует её в сущность"""
+        migrated = self._migrate_legacy_record(collection, value)
+        if migrated:
+            # Сохраняем исправленную запись, чтобы не мигрировать её при каждом запуске
+            self._migrated += migrated
+            self._changes[collection].add(key)
+            self._dirty = True
+        return decode_entity(collection, value)
+
+    @staticmethod
+    def _migrate_legacy_record(collection: str, value: Any) -> int:
+        """Исправляет устаревшую запись на месте, возвращает число исправлений"""
+        migrated = 0
+        if collection == 'orders':
+            for i, order in enumerate(value):
+                # Заказы старого формата были строками с описанием
+                if isinstance(order, str):
+                    order = value[i] = {'description': order}
+                    migrated += 1
+                # Убираем contractor_login, который раньше дописывался в заказы при чтении
+                elif 'contractor_login' in order:
+                    del order['contractor_login']
+                    migrated += 1
+                # Заказу без идентификатора он выдаётся по позиции при загрузке - одинаково во всех процессах
+                # (идентификатор уникален среди заказов исполнителя); после записи от позиции уже не зависит
+                if 'order_id' not in order:
+                    order['order_id'] = str(i)
+                    migrated += 1
+        # Добавляем баланс для существующих исполнителей, если его нет
+        elif collection == 'entrepreneurs' and 'balance' not in value:
+            value['balance'] = DEFAULT_BALANCE
+            migrated += 1
+        return migrated
+
+    # === Индексы ===
+
+    @staticmethod
+    def _index_add(index: Dict[Any, List[str]], key: Any, login: str) -> None:
+        """Добавляет логин в индекс по ключу"""
+        if key is not None:
+            index.setdefault(key, []).append(login)
+
+    @staticmethod
+    def _index_remove(index: Dict[Any, List[str]], key: Any, login: str) -> None:
+        """Удаляет логин из индекса по ключу"""
+        logins = index.get(key)
+        if logins and login in logins:
+            logins.remove(login)
+            if not logins:
+                del index[key]
+
+    def _rebuild_indexes(self) -> None:
+        """Строит индексы заново по загруженным данным"""
+        self._entrepreneur_by_chat = {}
+        self._rating_order = []
+        self._available_order = []
+        self._entrepreneur_seq = {}
+        for login in self.entrepreneurs:
+            self._index_entrepreneur(login)
+
+        self._client_by_chat = {}
+        for login, client in self.clients.items():
+            self._index_add(self._client_by_chat, client.chat_id, login)
+
+        self._chats_by_participant = {}
+        self._chats_by_pair = {}
+        for chat_id in self.active_chats:
+            self._index_chat(chat_id)
+
+        self._orders_by_client = {}
+        self._active_timers = {}
+        for contractor_login, orders in self.orders.items():
+            for order in orders:
+                self._index_order(contractor_login, order)
+
+    def _index_order(self, contractor_login: str, order: Order) -> None:
+        """Добавляет заказ в индексы заказов клиента и активных таймеров"""
+        if order.client_login is not None:
+            self._orders_by_client.setdefault(order.client_login, []).append((contractor_login, order))
+        if order.timer_active and order.timer_end is not None:
+            self._active_timers[id(order)] = (contractor_login, order)
+
+    def _unindex_contractor_orders(self, contractor_login: str) -> None:
+        """Убирает из индекса заказов клиентов все заказы исполнителя"""
+        client_logins = {order.client_login for order in self.orders.get(contractor_login, [])}
+        for client_login in client_logins:
+            refs = self._orders_by_client.get(client_login)
+            if refs is None:
+                continue
+            refs[:] = [ref for ref in refs if ref[0] != contractor_login]
+            if not refs:
+                del self._orders_by_client[client_login]
+
+        for order in self.orders.get(contractor_login, []):
+            if self._active_timers.pop(id(order), None) is not None:
+                self._notify_timer(contractor_login, order)
+
+    def _notify_timer(self, contractor_login: str, order: Order) -> None:
+        """Сообщает подписчикам об изменении таймера заказа"""
+        for listener in self.timer_listeners:
+            listener(contractor_login, order)
+
+    def _rating_key(self, login: str) -> Tuple[Any, int, str]:
+        """Ключ сортировки исполнителя: рейтинг по убыванию, затем порядок регистрации"""
+        if login not in self._entrepreneur_seq:
+            self._entrepreneur_seq[login] = self._next_entrepreneur_seq
+            self._next_entrepreneur_seq += 1
+        return -self.entrepreneurs[login].rating, self._entrepreneur_seq[login], login
+
+    def _index_entrepreneur(self, login: str) -> None:
+        """Добавляет исполнителя в индексы по chat_id и рейтингу"""
+        chat_id = self.entrepreneurs[login].chat_id
+        key = self._rating_key(login)
+        self._index_add(self._entrepreneur_by_chat, chat_id, login)
+        bisect.insort(self._rating_order, key)
+        if chat_id is not None:
+            bisect.insort(self._available_order, key)
+
+    def _unindex_entrepreneur(self, login: str) -> None:
+        """Убирает исполнителя из индексов по chat_id и рейтингу (до изменения его данных)"""
+        key = self._rating_key(login)
+        self._index_remove(self._entrepreneur_by_chat, self.entrepreneurs[login].chat_id, login)
+        for order in (self._rating_order, self._available_order):
+            position = bisect.bisect_left(order, key)
+            if position < len(order) and order[position] == key:
+                del order[position]
+
+    def _chat_index_keys(self, chat_id: str) -> List[Tuple[Dict[Any, Dict[str, None]], Any]]:
+        """Возвращает ключи индексов, под которыми числится чат"""
+        chat = self.active_chats[chat_id]
+        keys = [(self._chats_by_pair, (chat.client_login, chat.contractor_login))]
+        for participant in {chat.client_chat_id, chat.contractor_chat_id}:
+            if participant is not None:
+                keys.append((self._chats_by_participant, participant))
+        return keys
+
+    def _index_chat(self, chat_id: str) -> None:
+        """Добавляет чат в индексы, если он активен"""
+        if self.active_chats[chat_id].active:
+            for index, key in self._chat_index_keys(chat_id):
+                index.setdefault(key, {})[chat_id] = None
+
+    def _unindex_chat(self, chat_id: str) -> None:
+        """Убирает чат из индексов"""
+        for index, key in self._chat_index_keys(chat_id):
+            chats = index.get(key)
+            if chats is not None:
+                chats.pop(chat_id, None)
+                if not chats:
+                    del index[key]
+
+    def check_invariants(self) -> None:
+        """Сверяет индексы с данными; при расхождении выбрасывает AssertionError"""
+        for name, entities, index in (('entrepreneurs', self.entrepreneurs, self._entrepreneur_by_chat),
+                                      ('clients', self.clients, self._client_by_chat)):
+            expected: Dict[int, List[str]] = {}
+            for login, entity in entities.items():
+                self._index_add(expected, entity.chat_id, login)
+            actual = {chat_id: sorted(logins) for chat_id, logins in index.items()}
+            expected = {chat_id: sorted(logins) for chat_id, logins in expected.items()}
+            assert actual == expected, f"Индекс chat_id -> {name} рассогласован: {actual} != {expected}"
+
+        expected_rating = sorted(self._rating_key(login) for login in self.entrepreneurs)
+        assert self._rating_order == expected_rating, "Индекс исполнителей по рейтингу рассогласован"
+        expected_available = [key for key in expected_rating if self.entrepreneurs[key[2]].chat_id is not None]
+        assert self._available_order == expected_available, "Индекс доступных исполнителей рассогласован"
+
+        active = {chat_id for chat_id, chat in self.active_chats.items() if chat.active}
+        for name, index in (('участникам', self._chats_by_participant), ('парам', self._chats_by_pair)):
+            indexed = set()
+            for key, chats in index.items():
+                assert chats, f"Пустая запись в индексе чатов по {name}: {key}"
+                indexed.update(chats)
+            assert indexed == active, f"Индекс чатов по {name} рассогласован: {indexed ^ active}"
+        for chat_id in active:
+            for index, key in self._chat_index_keys(chat_id):
+                assert chat_id in index.get(key, {}), f"Чат {chat_id} отсутствует в индексе по ключу {key}"
+
+        expected_orders: Dict[str, List[Tuple[str, int]]] = {}
+        for contractor_login, orders in self.orders.items():
+            for order in orders:
+                if order.client_login is not None:
+                    expected_orders.setdefault(order.client_login, []).append((contractor_login, id(order)))
+        actual_orders = {client_login: sorted((contractor_login, id(order)) for contractor_login, order in refs)
+                         for client_login, refs in self._orders_by_client.items()}
+        expected_orders = {client_login: sorted(refs) for client_login, refs in expected_orders.items()}
+        assert actual_orders == expected_orders, "Индекс заказов клиентов рассогласован"
+
+        expected_timers = {id(order) for orders in self.orders.values() for order in orders
+                           if order.timer_active and order.timer_end is not None}
+        assert set(self._active_timers) == expected_timers, "Индекс активных таймеров рассогласован"
+
+    def format_load_report(self) -> str:
+        """Формирует отчёт о времени загрузки данных"""
+        stats = self.load_stats
+        counts = ', '.join(f"{name}={count}" for name, count in stats['counts'].items())
+        return (f"Данные загружены из {self.storage.filename} ({stats['file_size'] / 1024 / 1024:.1f} МБ) "
+                f"за {stats['total_time'] * 1000:.0f} мс: "
+                f"чтение {stats['read_time'] * 1000:.0f} мс, "
+                f"разбор {stats['parse_time'] * 1000:.0f} мс, "
+                f"индексы {stats['index_time'] * 1000:.0f} мс "
+                f"(исправлено записей: {stats['migrated']})"
+                + (f", журнал {stats['replayed']} записей за {stats['replay_time'] * 1000:.0f} мс"
+                   if 'replayed' in stats else '')
+                + (f", шарды: отсутствует {stats['shards']['missing']}, устарело {stats['shards']['stale']}, "
+                   f"отброшено заказов без исполнителя {stats['shards']['orphans']}"
+                   if 'shards' in stats else '')
+                + f"; {counts}")
+
+    def collections(self) -> Dict[str, Any]:
+        """Возвращает все коллекции по именам"""
+        return {
             'entrepreneurs': self.entrepreneurs,
             'clients': self.clients,
             'orders': self.orders,
             'active_chats': self.active_chats,
-            'portfolio_items': self.portfolio_items
+            'portfolio_items': self.portfolio_items,
+            'dialogs': self.dialogs
         }
-        with open(self.filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+
+    def _take_changes(self) -> Any:
+        """Снимает отметку об изменениях и кодирует их для записи в хранилище"""
+        changes = None if self._changes_all else self._changes
+        payload = self.storage.encode_changes(self.collections(), changes)
+        self._dirty = False
+        self._changes = {collection: set() for collection in COLLECTIONS}
+        self._changes_all = False
+        self._pending_changes = 0
+        if self._flush_now_event is not None:
+            self._flush_now_event.clear()
+            self._dirty_event.clear()
+        return payload
+
+    def save_data(self) -> None:
+        """Отмечает изменёнными все данные"""
+        if self.shared_storage:
+            # Полная перезапись из памяти одного процесса затёрла бы изменения остальных
+            raise RuntimeError("Полная перезапись общего хранилища запрещена: изменения пишутся по сущностям")
+        self._changes_all = True
+        self._schedule_save()
+
+    def _save_entity(self, collection: str, key: str) -> None:
+        """Отмечает изменённой одну сущность коллекции"""
+        self._changes[collection].add(key)
+        self._schedule_save()
+
+    def _schedule_save(self) -> None:
+        """
+        Планирует запись изменений.
+        В режиме 'write_behind' запись выполняется фоновой задачей не чаще раза в SAVE_INTERVAL_MS
+        (или сразу после SAVE_MAX_PENDING изменений). В режиме 'durable' фоновая запись начинается сразу,
+        а обработчик дожидается её через commit() до ответа пользователю; сам метод на диск не пишет.
+        """
+        self._dirty = True
+        self._pending_changes += 1
+
+        if self.check_invariants_enabled:
+            self.check_invariants()
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Вне event loop (скрипты, инициализация) пишем синхронно
+            self.flush_sync()
+            return
+
+        self._ensure_flush_task(loop)
+        self._dirty_event.set()
+        if self.persistence_mode == 'durable' or self._pending_changes >= SAVE_MAX_PENDING:
+            self._flush_now_event.set()
+
+    async def commit(self) -> None:
+        """
+        В режиме 'durable' дожидается записи накопленных изменений (в рабочем потоке, через flush);
+        в режиме 'write_behind' ничего не ждёт - изменения запишет фоновая задача.
+        Изменения могла уже забрать фоновая запись: flush дождётся её под общей блокировкой записи.
+        """
+        if self.persistence_mode == 'durable':
+            await self.flush()
+
+    def _notify_flushed(self, changes: Optional[Dict[str, Set[str]]]) -> None:
+        """Сообщает подписчикам о записанных изменениях"""
+        for listener in self.flush_listeners:
+            try:
+                listener(changes)
+            except Exception:
+                logger.exception("Ошибка подписчика на запись изменений")
+
+    def flush_sync(self) -> None:
+        """Синхронно записывает накопленные изменения"""
+        if self._dirty:
+            changes = None if self._changes_all else self._changes
+            self.storage.write(self._take_changes())
+            self._notify_flushed(changes)
+
+    async def flush(self) -> None:
+        """Записывает накопленные изменения в рабочем потоке, не блокируя event loop"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            # Снимок не должен застать на полпути изменение, растянутое на несколько await
+            async with self.locks.barrier.snapshot():
+                changes = None if self._changes_all else self._changes
+                payload = self._take_changes()
+            try:
+                await asyncio.to_thread(self.storage.write, payload)
+            except Exception:
+                # Не теряем изменения: следующая попытка запишет их снова (вместе с новыми)
+                self._dirty = True
+                if changes is None:
+                    self._changes_all = True
+                else:
+                    for collection, keys in changes.items():
+                        self._changes[collection] |= keys
+                raise
+            self._notify_flushed(changes)
+
+    def _ensure_flush_task(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Запускает фоновую задачу записи, если она ещё не запущена"""
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        self._dirty_event = asyncio.Event()
+        self._flush_now_event = asyncio.Event()
+        self._flush_task = loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        """Фоновая запись: ждёт изменений, копит их до интервала или лимита и сбрасывает на диск"""
+        while True:
+            await self._dirty_event.wait()
+            try:
+                await asyncio.wait_for(self._flush_now_event.wait(), timeout=SAVE_INTERVAL_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Ошибка фоновой записи данных")
+                await asyncio.sleep(SAVE_INTERVAL_MS / 1000)
+
+    async def close(self) -> None:
+        """Останавливает фоновую запись и сохраняет оставшиеся изменения"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    # === Методы для работы с диалогами ===
+
+    def _touch_dialog(self, key: str, force: bool = True) -> None:
+        """
+        Отмечает обращение к диалогу: переносит его в конец очереди вытеснения.
+        Отметка времени сохраняется при изменении диалога или, без изменений,
+        не чаще раза в DIALOG_TOUCH_SAVE_SECONDS.
+        """
+        dialog = self.dialogs[key]
+        self.dialogs.move_to_end(key)
+        now = time.time()
+        if force or now - dialog['touched'] >= DIALOG_TOUCH_SAVE_SECONDS:
+            dialog['touched'] = now
+            self._save_entity('dialogs', key)
+
+    def _drop_dialog_if_empty(self, key: str) -> bool:
+        """Удаляет диалог без состояния и данных"""
+        dialog = self.dialogs[key]
+        if dialog['state'] is None and not dialog['data']:
+            del self.dialogs[key]
+            self._save_entity('dialogs', key)
+            return True
+        return False
 
     def set_state(self, user_id: int, state: Optional[str]) -> None:
         """Устанавливает состояние пользователя"""
-        if state is None:
-            self.state.pop(user_id, None)
-        else:
-            self.state[user_id] = state
+        key = str(user_id)
+        if key not in self.dialogs:
+            if state is None:
+                return
+            self.dialogs[key] = {'state': None, 'data': {}, 'touched': 0}
+
+        self.dialogs[key]['state'] = state
+        if not self._drop_dialog_if_empty(key):
+            self._touch_dialog(key)
 
     def get_state(self, user_id: int) -> Optional[str]:
         """Получает состояние пользователя"""
-        return self.state.get(user_id)
+        key = str(user_id)
+        dialog = self.dialogs.get(key)
+        if dialog is None:
+            return None
+        self._touch_dialog(key, force=False)
+        return dialog['state']
+
+    def set_dialog_data(self, user_id: int, data: Dict[str, Any]) -> None:
+        """Сохраняет ключи диалога из context.user_data"""
+        key = str(user_id)
+        if key not in self.dialogs:
+            if not data:
+                return
+            self.dialogs[key] = {'state': None, 'data': {}, 'touched': 0}
+        elif self.dialogs[key]['data'] == data:
+            return
+
+        self.dialogs[key]['data'] = dict(data)
+        if not self._drop_dialog_if_empty(key):
+            self._touch_dialog(key)
+
+    def get_dialog_data(self) -> Dict[int, Dict[str, Any]]:
+        """Возвращает сохранённые ключи диалогов всех пользователей"""
+        return {int(key): dict(dialog['data']) for key, dialog in self.dialogs.items() if dialog['data']}
+
+    def evict_stale_dialogs(self, ttl: float = DIALOG_TTL_SECONDS, now: Optional[float] = None) -> List[int]:
+        """
+        Удаляет диалоги, к которым не обращались дольше ttl секунд.
+        Проверяет только начало очереди, поэтому не перебирает все диалоги.
+        Возвращает id пользователей с удалёнными диалогами.
+        """
+        cutoff = (time.time() if now is None else now) - ttl
+        evicted = []
+        while self.dialogs:
+            key, dialog = next(iter(self.dialogs.items()))
+            if dialog['touched'] > cutoff:
+                break
+            del self.dialogs[key]
+            self._save_entity('dialogs', key)
+            evicted.append(int(key))
+        return evicted
+
+    def retain_dialogs(self, keep: Callable[[int], bool]) -> int:
+        """
+        Оставляет в памяти только диалоги пользователей, для которых keep(user_id) истинно (без записи в хранилище).
+        Воркер кластера держит только диалоги своих пользователей. Возвращает количество убранных диалогов.
+        """
+        foreign = [key for key in self.dialogs if not keep(int(key))]
+        for key in foreign:
+            del self.dialogs[key]
+        return len(foreign)
+
+    # === Перечитывание изменений других процессов ===
+
+    def _replace_entity(self, collection: str, key: str, value: Any) -> None:
+        """Заменяет сущность значением из хранилища (None - удаляет) с обновлением индексов, без записи"""
+        if collection == 'entrepreneurs':
+            if key in self.entrepreneurs:
+                self._unindex_entrepreneur(key)
+                del self.entrepreneurs[key]
+            if value is None:
+                self._entrepreneur_seq.pop(key, None)
+            else:
+                self.entrepreneurs[key] = value
+                self._index_entrepreneur(key)
+        elif collection == 'clients':
+            old = self.clients.pop(key, None)
+            if old is not None:
+                self._index_remove(self._client_by_chat, old.chat_id, key)
+            if value is not None:
+                self.clients[key] = value
+                self._index_add(self._client_by_chat, value.chat_id, key)
+        elif collection == 'orders':
+            if key in self.orders:
+                self._unindex_contractor_orders(key)
+                del self.orders[key]
+            if value is not None:
+                self.orders[key] = value
+                for order in value:
+                    self._index_order(key, order)
+                    if order.timer_active and order.timer_end is not None:
+                        self._notify_timer(key, order)
+        elif collection == 'active_chats':
+            if key in self.active_chats:
+                self._unindex_chat(key)
+                del self.active_chats[key]
+            if value is not None:
+                self.active_chats[key] = value
+                self._index_chat(key)
+        elif collection == 'portfolio_items':
+            if value is None:
+                self.portfolio_items.pop(key, None)
+            else:
+                self.portfolio_items[key] = value
+            self.portfolio_version += 1
+
+    def reload_entities(self, changes: Optional[Dict[str, List[str]]]) -> int:
+        """
+        Перечитывает из хранилища сущности, записанные другим процессом: коллекция -> ключи, None - всё.
+        Диалоги не перечитываются (у каждого пользователя один воркер), сущности с ещё не записанными
+        локальными изменениями - тоже: их запись придёт в хранилище и к остальным процессам позже.
+        Возвращает количество перечитанных сущностей.
+        """
+        if self._changes_all:
+            # Все локальные данные будут записаны заново и разосланы остальным
+            return 0
+
+        def decode(collection: str, key: str, value: Any) -> Any:
+            return decode_entity(collection, value)
+
+        if changes is None:
+            data = self.storage.load({}, decode)
+            current = self.collections()
+            keys = {collection: set(current[collection]) | set(data.get(collection, {}))
+                    for collection in COLLECTIONS if collection != 'dialogs'}
+        else:
+            keys = {collection: set(collection_keys) for collection, collection_keys in changes.items()
+                    if collection != 'dialogs'}
+        keys = {collection: collection_keys - self._changes[collection]
+                for collection, collection_keys in keys.items()}
+        if changes is not None:
+            data = self.storage.load_keys(keys, decode)
+
+        reloaded = 0
+        for collection, collection_keys in keys.items():
+            loaded = data.get(collection, {})
+            for key in collection_keys:
+                self._replace_entity(collection, key, loaded.get(key))
+                reloaded += 1
+        if self.check_invariants_enabled:
+            self.check_invariants()
+        return reloaded
 
     # === Методы для работы с исполнителями ===
 
     def register_entrepreneur(self, login: str, password: str, rating: int = DEFAULT_RATING,
                               chat_id: Optional[int] = None) -> None:
         """Регистрирует нового исполнителя"""
-        self.entrepreneurs[login] = {
-            'password': password,
-            'rating': rating,
-            'balance': DEFAULT_BALANCE
-        }
-        if chat_id is not None:
-            self.entrepreneurs[login]['chat_id'] = chat_id
-        self.save_data()
+        self._release_entrepreneur_chat_id(chat_id, login)
+        if login in self.entrepreneurs:
+            self._unindex_entrepreneur(login)
+        self.entrepreneurs[login] = Entrepreneur(password=password, rating=rating, balance=DEFAULT_BALANCE,
+                                                 chat_id=chat_id)
+        self._index_entrepreneur(login)
+        self._save_entity('entrepreneurs', login)
 
     def check_entrepreneur(self, login: str, password: str) -> bool:
         """Проверяет логин и пароль исполнителя"""
         if login in self.entrepreneurs:
-            return self.entrepreneurs[login]['password'] == password
+            return self.entrepreneurs[login].password == password
         return False
 
     def get_entrepreneur_by_chat_id(self, chat_id: int) -> Optional[str]:
-        """Находит логин исполнителя по chat_id"""
-        for login, data in self.entrepreneurs.items():
-            if data.get('chat_id') == chat_id:
-                return login
-        return None
+        """
+        Находит логин исполнителя по chat_id. Один чат принадлежит одному исполнителю: вход под другим логином
+        снимает chat_id с прежнего владельца. Если в старых данных chat_id повторяется, возвращается
+        первый исполнитель в порядке хранения - как при прежнем переборе.
+        """
+        logins = self._entrepreneur_by_chat.get(chat_id)
+        return logins[0] if logins else None
 
     def get_entrepreneur_rating(self, login: str) -> Optional[int]:
         """Получает рейтинг исполнителя"""
         if login in self.entrepreneurs:
-            return self.entrepreneurs[login]['rating']
+            return self.entrepreneurs[login].rating
         return None
 
     def get_entrepreneur_balance(self, login: str) -> float:
         """Получает баланс исполнителя"""
         if login in self.entrepreneurs:
-            return self.entrepreneurs[login].get('balance', DEFAULT_BALANCE)
+            return self.entrepreneurs[login].balance
         return DEFAULT_BALANCE
 
     def update_entrepreneur_rating(self, login: str, rating: int) -> bool:
         """Обновляет рейтинг исполнителя"""
         if login in self.entrepreneurs:
-            self.entrepreneurs[login]['rating'] = rating
-            self.save_data()
+            self._unindex_entrepreneur(login)
+            self.entrepreneurs[login].rating = rating
+            self._index_entrepreneur(login)
+            self._save_entity('entrepreneurs', login)
             return True
         return False
 
     def update_entrepreneur_balance(self, login: str, amount: float) -> bool:
         """Изменяет баланс исполнителя на указанную сумму"""
         if login in self.entrepreneurs:
-            self.entrepreneurs[login]['balance'] += amount
-            self.save_data()
+            self.entrepreneurs[login].balance += amount
+            self._save_entity('entrepreneurs', login)
             return True
         return False
 
     def set_entrepreneur_balance(self, login: str, balance: float) -> bool:
         """Устанавливает баланс исполнителя"""
         if login in self.entrepreneurs:
-            self.entrepreneurs[login]['balance'] = balance
-            self.save_data()
+            self.entrepreneurs[login].balance = balance
+            self._save_entity('entrepreneurs', login)
             return True
         return False
 
+    def _release_entrepreneur_chat_id(self, chat_id: Optional[int], login: str) -> None:
+        """Снимает chat_id со всех исполнителей, кроме login"""
+        if chat_id is None:
+            return
+        for owner in list(self._entrepreneur_by_chat.get(chat_id, ())):
+            if owner != login:
+                self.remove_entrepreneur_chat_id(owner)
+
     def set_entrepreneur_chat_id(self, login: str, chat_id: int) -> bool:
-        """Устанавливает chat_id для исполнителя"""
+        """Устанавливает chat_id для исполнителя; прежний владелец этого chat_id его теряет"""
         if login in self.entrepreneurs:
-            self.entrepreneurs[login]['chat_id'] = chat_id
-            self.save_data()
+            self._release_entrepreneur_chat_id(chat_id, login)
+            self._unindex_entrepreneur(login)
+            self.entrepreneurs[login].chat_id = chat_id
+            self._index_entrepreneur(login)
+            self._save_entity('entrepreneurs', login)
             return True
         return False
 
     def remove_entrepreneur_chat_id(self, login: str) -> bool:
         """Убирает chat_id у исполнителя"""
-        if login in self.entrepreneurs and 'chat_id' in self.entrepreneurs[login]:
-            del self.entrepreneurs[login]['chat_id']
-            self.save_data()
+        if login in self.entrepreneurs and self.entrepreneurs[login].chat_id is not None:
+            self._unindex_entrepreneur(login)
+            self.entrepreneurs[login].chat_id = None
+            self._index_entrepreneur(login)
+            self._save_entity('entrepreneurs', login)
             return True
         return False
 
     def delete_entrepreneur(self, login: str) -> bool:
         """Удаляет исполнителя"""
         if login in self.entrepreneurs:
+            self._unindex_entrepreneur(login)
+            self._entrepreneur_seq.pop(login, None)
             del self.entrepreneurs[login]
+            self._save_entity('entrepreneurs', login)
             # Также удаляем его заказы
             if login in self.orders:
+                self._unindex_contractor_orders(login)
                 del self.orders[login]
-            self.save_data()
+                self._save_entity('orders', login)
             return True
         return False
 
     def get_top_entrepreneur(self) -> Optional[str]:
         """Находит исполнителя с наивысшим рейтингом"""
-        if not self.entrepreneurs:
-            return None
-        return max(self.entrepreneurs, key=lambda x: self.entrepreneurs[x]['rating'])
+        return self._rating_order[0][2] if self._rating_order else None
+
+    def get_available_entrepreneurs(self, limit: int) -> List[str]:
+        """Возвращает до limit доступных (вошедших в систему) исполнителей по убыванию рейтинга"""
+        return [login for _, _, login in self._available_order[:limit]]
 
     def get_entrepreneurs_count(self) -> int:
         """Возвращает количество исполнителей"""
@@ -196,87 +765,117 @@ class UserState:
         if login in self.clients:
             return False  # Клиент уже существует
 
-        self.clients[login] = {
-            'password': password,
-            'status': DEFAULT_CLIENT_STATUS,
-            'created_at': datetime.now()
-        }
-        if chat_id is not None:
-            self.clients[login]['chat_id'] = chat_id
-        self.save_data()
+        self._release_client_chat_id(chat_id, login)
+        self.clients[login] = Client(password=password, status=DEFAULT_CLIENT_STATUS, created_at=datetime.now(),
+                                     chat_id=chat_id)
+        self._index_add(self._client_by_chat, chat_id, login)
+        self._save_entity('clients', login)
         return True
 
     def check_client(self, login: str, password: str) -> bool:
         """Проверяет логин и пароль клиента"""
         if login in self.clients:
-            return self.clients[login]['password'] == password
+            return self.clients[login].password == password
         return False
 
     def get_client_by_chat_id(self, chat_id: int) -> Optional[str]:
-        """Находит логин клиента по chat_id"""
-        for login, data in self.clients.items():
-            if data.get('chat_id') == chat_id:
-                return login
-        return None
+        """Находит логин клиента по chat_id (один чат - один клиент, см. get_entrepreneur_by_chat_id)"""
+        logins = self._client_by_chat.get(chat_id)
+        return logins[0] if logins else None
+
+    def _release_client_chat_id(self, chat_id: Optional[int], login: str) -> None:
+        """Снимает chat_id со всех клиентов, кроме login"""
+        if chat_id is None:
+            return
+        for owner in list(self._client_by_chat.get(chat_id, ())):
+            if owner != login:
+                self.remove_client_chat_id(owner)
 
     def set_client_chat_id(self, login: str, chat_id: int) -> bool:
-        """Устанавливает chat_id для клиента"""
+        """Устанавливает chat_id для клиента; прежний владелец этого chat_id его теряет"""
         if login in self.clients:
-            self.clients[login]['chat_id'] = chat_id
-            self.save_data()
+            self._release_client_chat_id(chat_id, login)
+            self._index_remove(self._client_by_chat, self.clients[login].chat_id, login)
+            self.clients[login].chat_id = chat_id
+            self._index_add(self._client_by_chat, chat_id, login)
+            self._save_entity('clients', login)
             return True
         return False
 
     def remove_client_chat_id(self, login: str) -> bool:
         """Убирает chat_id у клиента"""
-        if login in self.clients and 'chat_id' in self.clients[login]:
-            del self.clients[login]['chat_id']
-            self.save_data()
+        if login in self.clients and self.clients[login].chat_id is not None:
+            self._index_remove(self._client_by_chat, self.clients[login].chat_id, login)
+            self.clients[login].chat_id = None
+            self._save_entity('clients', login)
             return True
         return False
 
     # === Методы для работы с заказами ===
 
-    def add_order(self, contractor_login: str, order: Dict[str, Any]) -> None:
+    def add_order(self, contractor_login: str, order: Order) -> None:
         """Добавляет заказ исполнителю"""
         if contractor_login not in self.orders:
             self.orders[contractor_login] = []
         self.orders[contractor_login].append(order)
-        self.save_data()
+        self._index_order(contractor_login, order)
+        self._save_entity('orders', contractor_login)
 
-    def get_orders(self, contractor_login: str) -> List[Dict[str, Any]]:
+    def get_orders(self, contractor_login: str) -> List[Order]:
         """Получает заказы исполнителя"""
         return self.orders.get(contractor_login, [])
 
-    def get_client_orders(self, client_login: str) -> List[Dict[str, Any]]:
-        """Получает заказы клиента"""
-        client_orders = []
-        for contractor_login, orders in self.orders.items():
-            for order in orders:
-                if order.get('client_login') == client_login:
-                    order['contractor_login'] = contractor_login
-                    client_orders.append(order)
-        return client_orders
+    def get_client_orders(self, client_login: str) -> List[ClientOrder]:
+        """Получает снимки заказов клиента (живые заказы наружу не отдаются)"""
+        return [ClientOrder.of(contractor_login, order)
+                for contractor_login, order in self._orders_by_client.get(client_login, [])]
 
     def update_order_timer(self, contractor_login: str, order_index: int, end_time: datetime) -> bool:
         """Обновляет таймер заказа"""
         if contractor_login in self.orders and order_index < len(self.orders[contractor_login]):
-            self.orders[contractor_login][order_index]['timer_end'] = end_time
-            self.orders[contractor_login][order_index]['timer_active'] = True
-            self.save_data()
+            order = self.orders[contractor_login][order_index]
+            order.timer_end = end_time
+            order.timer_active = True
+            self._active_timers[id(order)] = (contractor_login, order)
+            self._save_entity('orders', contractor_login)
+            self._notify_timer(contractor_login, order)
+            return True
+        return False
+
+    def deactivate_order_timer(self, contractor_login: str, order: Order, expired: bool = False) -> bool:
+        """Отключает таймер заказа; expired=True отмечает, что срок истёк"""
+        if self._active_timers.pop(id(order), None) is None:
+            return False
+        order.timer_active = False
+        if expired:
+            order.expired = True
+        self._save_entity('orders', contractor_login)
+        self._notify_timer(contractor_login, order)
+        return True
+
+    def is_timer_active(self, order: Order) -> bool:
+        """Проверяет, что таймер заказа активен"""
+        entry = self._active_timers.get(id(order))
+        return entry is not None and entry[1] is order
+
+    def iter_active_timers(self) -> List[Tuple[str, Order]]:
+        """Возвращает (логин исполнителя, заказ) для всех заказов с активным таймером"""
+        return list(self._active_timers.values())
+
+    def accept_order(self, contractor_login: str, order_index: int) -> bool:
+        """Отмечает заказ принятым"""
+        if contractor_login in self.orders and order_index < len(self.orders[contractor_login]):
+            self.orders[contractor_login][order_index].accepted = True
+            self._save_entity('orders', contractor_login)
             return True
         return False
 
-    def get_active_orders_with_timers(self) -> List[Dict[str, Any]]:
-        """Получает все активные заказы с таймерами"""
+    def get_active_orders_with_timers(self) -> List[Tuple[str, int, Order]]:
+        """Получает все активные заказы с таймерами: (логин исполнителя, номер заказа, заказ)"""
         active_orders = []
-        for contractor_login, orders in self.orders.items():
-            for i, order in enumerate(orders):
-                if order.get('timer_active', False):
-                    order_copy = order.copy()
-                    order_copy['contractor_login'] = contractor_login
-                    order_copy['order_index'] = i
-                    active_orders.append(order_copy)
+        for contractor_login, order in self._active_timers.values():
+            order_index = next(i for i, item in enumerate(self.orders[contractor_login]) if item is order)
+            active_orders.append((contractor_login, order_index, order))
         return active_orders
 
     # === Методы для работы с чатами ===
@@ -285,100 +884,187 @@ class UserState:
                     order_id: str) -> str:
         """Создает новый чат между клиентом и исполнителем"""
         chat_id = f"{client_login}_{contractor_login}_{order_id}"
-        self.active_chats[chat_id] = {
-            'client_login': client_login,
-            'client_chat_id': client_chat_id,
-            'contractor_login': contractor_login,
-            'contractor_chat_id': contractor_chat_id,
-            'order_id': order_id,
-            'created_at': datetime.now(),
-            'active': True
-        }
-        self.save_data()
+        if chat_id in self.active_chats:
+            # Чат заказа уже есть: заменять его нельзя, иначе пропадёт переписка
+            logger.warning("Чат %s уже существует и не пересоздаётся", chat_id)
+            return chat_id
+        self.active_chats[chat_id] = Chat(
+            client_login=client_login,
+            client_chat_id=client_chat_id,
+            contractor_login=contractor_login,
+            contractor_chat_id=contractor_chat_id,
+            order_id=order_id,
+            created_at=datetime.now(),
+            active=True
+        )
+        self._index_chat(chat_id)
+        self._save_entity('active_chats', chat_id)
         return chat_id
 
     def get_chat_by_user(self, user_chat_id: int) -> Optional[str]:
         """Находит активный чат по chat_id пользователя"""
-        for chat_id, chat_data in self.active_chats.items():
-            if chat_data.get('active', False):
-                if (chat_data.get('client_chat_id') == user_chat_id or
-                        chat_data.get('contractor_chat_id') == user_chat_id):
-                    return chat_id
-        return None
+        chats = self._chats_by_participant.get(user_chat_id)
+        return next(iter(chats)) if chats else None
 
     def get_chat_partner(self, chat_id: str, user_chat_id: int) -> Optional[int]:
         """Получает chat_id партнера по чату"""
         if chat_id in self.active_chats:
-            chat_data = self.active_chats[chat_id]
-            if chat_data.get('client_chat_id') == user_chat_id:
-                return chat_data.get('contractor_chat_id')
-            elif chat_data.get('contractor_chat_id') == user_chat_id:
-                return chat_data.get('client_chat_id')
+            chat = self.active_chats[chat_id]
+            if chat.client_chat_id == user_chat_id:
+                return chat.contractor_chat_id
+            elif chat.contractor_chat_id == user_chat_id:
+                return chat.client_chat_id
         return None
 
-    def get_chat_info(self, chat_id: str) -> Optional[Dict[str, Any]]:
+    def get_chat_info(self, chat_id: str) -> Optional[Chat]:
         """Получает информацию о чате"""
         return self.active_chats.get(chat_id)
 
     def close_chat(self, chat_id: str) -> bool:
         """Закрывает чат"""
         if chat_id in self.active_chats:
-            self.active_chats[chat_id]['active'] = False
-            self.save_data()
+            self._unindex_chat(chat_id)
+            self.active_chats[chat_id].active = False
+            self._save_entity('active_chats', chat_id)
             return True
         return False
 
     def find_chat_for_order(self, client_login: str, contractor_login: str) -> Optional[str]:
         """Находит активный чат для заказа между клиентом и исполнителем"""
-        for chat_id, chat_data in self.active_chats.items():
-            if (chat_data.get('active', False) and
-                    chat_data.get('client_login') == client_login and
-                    chat_data.get('contractor_login') == contractor_login):
-                return chat_id
-        return None
+        chats = self._chats_by_pair.get((client_login, contractor_login))
+        return next(iter(chats)) if chats else None
+
+    # === Методы для работы с архивом ===
+
+    def is_order_finished(self, order: Order, now: datetime, max_age: timedelta) -> bool:
+        """Проверяет, что заказ завершён: срок истёк, прошёл или заказ старше max_age без активного таймера"""
+        if self.is_timer_active(order):
+            return False
+        if order.expired or (order.timer_end is not None and order.timer_end <= now):
+            return True
+        return order.created_at is not None and now - order.created_at >= max_age
+
+    def find_archivable(self, now: Optional[datetime] = None,
+                        order_age_days: int = ARCHIVE_ORDER_AGE_DAYS) -> List[Tuple[str, str, Any]]:
+        """Находит завершённые заказы и закрытые чаты: (коллекция, ключ, сущность)"""
+        now = now or datetime.now()
+        max_age = timedelta(days=order_age_days)
+        records: List[Tuple[str, str, Any]] = []
+        for contractor_login, orders in self.orders.items():
+            for order in orders:
+                if self.is_order_finished(order, now, max_age):
+                    records.append(('orders', contractor_login, order))
+        for chat_id, chat in self.active_chats.items():
+            if not chat.active:
+                records.append(('active_chats', chat_id, chat))
+        return records
+
+    def drop_archived(self, records: List[Tuple[str, str, Any]]) -> int:
+        """
+        Удаляет из памяти сущности, записанные в архив.
+        Сущности сравниваются по идентичности: заменённые или снова активные за время записи остаются.
+        Возвращает количество удалённых сущностей.
+        """
+        archived_orders: Dict[str, Set[int]] = {}
+        dropped = 0
+        for collection, key, entity in records:
+            if collection == 'orders':
+                archived_orders.setdefault(key, set()).add(id(entity))
+            elif collection == 'active_chats':
+                if self.active_chats.get(key) is entity and not entity.active:
+                    del self.active_chats[key]
+                    self._changes['active_chats'].add(key)
+                    dropped += 1
+
+        affected_clients: Set[str] = set()
+        dropped_ids: Set[int] = set()
+        for contractor_login, order_ids in archived_orders.items():
+            orders = self.orders.get(contractor_login)
+            if not orders:
+                continue
+            kept = []
+            for order in orders:
+                if id(order) in order_ids and not self.is_timer_active(order):
+                    affected_clients.add(order.client_login)
+                    dropped_ids.add(id(order))
+                else:
+                    kept.append(order)
+            if len(kept) == len(orders):
+                continue
+            dropped += len(orders) - len(kept)
+            if kept:
+                orders[:] = kept
+            else:
+                del self.orders[contractor_login]
+            self._changes['orders'].add(contractor_login)
+
+        # Ссылки на удалённые заказы убираем из индекса заказов клиентов одним проходом по каждому клиенту
+        for client_login in affected_clients:
+            refs = self._orders_by_client.get(client_login)
+            if refs is None:
+                continue
+            refs[:] = [ref for ref in refs if id(ref[1]) not in dropped_ids]
+            if not refs:
+                del self._orders_by_client[client_login]
+
+        # Запись планируем один раз, когда индексы уже согласованы с данными
+        if dropped:
+            self._schedule_save()
+        return dropped
 
     # === Методы для работы с портфолио ===
 
     def add_portfolio_item(self, category: str, title: str, description: str, images: List[str],
-                           links: List[str] = None) -> None:
-        """Добавляет элемент в портфолио"""
-        print(f"DEBUG add_portfolio_item: category={category}, title={title}")
-
+                           links: List[str] = None) -> PortfolioItem:
+        """Добавляет элемент в портфолио и возвращает его"""
         if category not in self.portfolio_items:
             self.portfolio_items[category] = []
-            print(f"DEBUG: Создана новая категория {category}")
-
-        item = {
-            'title': title,
-            'description': description,
-            'images': images,
-            'links': links or [],
-            'created_at': datetime.now()
-        }
+            logger.debug("Создана категория портфолио %s", category)
 
-        self.portfolio_items[category].append(item)
-        print(f"DEBUG: Добавлен элемент в категорию {category}. Всего элементов: {len(self.portfolio_items[category])}")
+        item = PortfolioItem(
+            title=title,
+            description=description,
+            images=images,
+            links=links or [],
+            created_at=datetime.now()
+        )
 
-        # Сразу проверяем, что добавилось
-        print(f"DEBUG: Содержимое портфолио: {self.portfolio_items}")
+        self.portfolio_items[category].append(item)
+        self.portfolio_version += 1
+        logger.debug("Добавлен элемент портфолио %r в категорию %s, всего элементов: %d",
+                     title, category, len(self.portfolio_items[category]))
 
-        self.save_data()
-        print(f"DEBUG: Данные сохранены в файл")
+        self._save_entity('portfolio_items', category)
+        return item
 
-    def get_portfolio_items(self, category: str) -> List[Dict[str, Any]]:
+    def get_portfolio_items(self, category: str) -> List[PortfolioItem]:
         """Получает элементы портфолио по категории"""
-        items = self.portfolio_items.get(category, [])
-        print(f"DEBUG get_portfolio_items: category={category}, found {len(items)} items")
-        return items
+        return self.portfolio_items.get(category, [])
 
     def delete_portfolio_item(self, category: str, index: int) -> bool:
         """Удаляет элемент портфолио"""
         if category in self.portfolio_items and 0 <= index < len(self.portfolio_items[category]):
             del self.portfolio_items[category][index]
-            self.save_data()
+            self.portfolio_version += 1
+            self._save_entity('portfolio_items', category)
             return True
         return False
 
+    def set_portfolio_media(self, category: str, item: PortfolioItem, source: str, file_id: str,
+                            file_unique_id: str) -> bool:
+        """
+        Запоминает file_id картинки элемента портфолио, загруженной по ссылке source.
+        Элемент ищется по идентичности: пока картинка загружалась, его могли удалить или сдвинуть.
+        """
+        if not any(candidate is item for candidate in self.portfolio_items.get(category, ())):
+            return False
+        if item.media is None:
+            item.media = {}
+        item.media[source] = {'file_id': file_id, 'file_unique_id': file_unique_id}
+        self.portfolio_version += 1
+        self._save_entity('portfolio_items', category)
+        return True
+
     def get_all_categories(self) -> List[str]:
         """Получает все категории портфолио"""
         return list(self.portfolio_items.keys())
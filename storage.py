@@ -0,0 +1,799 @@
+# storage.py
+import codecs
+import json
+import logging
+import marshal
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote, unquote
+from config import DATA_FILE, JOURNAL_COMPACT_BYTES, SNAPSHOT_FORMAT, LOAD_CHUNK_SIZE
+from models import encode_value, encode_plain
+
+logger = logging.getLogger(__name__)
+
+# Коллекции, из которых состоит состояние бота
+COLLECTIONS = ('entrepreneurs', 'clients', 'orders', 'active_chats', 'portfolio_items', 'dialogs')
+
+# Изменения для записи: коллекция -> изменённые ключи; None - изменилось всё
+Changes = Optional[Dict[str, Set[str]]]
+
+# Декодер записей при загрузке: (коллекция, ключ, значение из хранилища) -> значение в памяти
+Decoder = Callable[[str, str, Any], Any]
+
+
+def _as_is(collection: str, key: str, value: Any) -> Any:
+    return value
+
+
+def encode_json(data: Any) -> str:
+    """Компактно сериализует данные (в том числе сущности и даты) в JSON"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=encode_value)
+
+
+def write_file_atomic(filename: str, payload: bytes) -> None:
+    """Атомарно записывает файл: временный файл + переименование"""
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+
+class _JsonStream:
+    """
+    Потоковое чтение JSON: файл читается порциями, значения разбираются по одному
+    через JSONDecoder.raw_decode, в памяти - только текущая порция и разобранное значение.
+    """
+
+    _WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, f: BinaryIO, chunk_size: int):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._position = 0
+        self._eof = False
+        self.read_time = 0.0
+
+    def _read(self, size: int) -> bool:
+        """Дочитывает порцию файла в буфер; False - файл закончился"""
+        if self._eof:
+            return False
+        started = time.perf_counter()
+        raw = self._file.read(size)
+        self.read_time += time.perf_counter() - started
+        if not raw:
+            self._eof = True
+            self._utf8.decode(b'', final=True)
+            return False
+        self._buffer = self._buffer[self._position:] + self._utf8.decode(raw)
+        self._position = 0
+        return True
+
+    def peek(self) -> str:
+        """Следующий значимый символ (пропуская пробелы); '' - конец файла"""
+        while True:
+            self._position = self._WHITESPACE.match(self._buffer, self._position).end()
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._read(self._chunk_size):
+                return ''
+
+    def expect(self, char: str) -> None:
+        """Пропускает ожидаемый символ-разделитель"""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Ожидался символ {char!r}, найден {found!r}")
+        self._position += 1
+
+    def value(self) -> Any:
+        """Разбирает очередное JSON-значение, при необходимости дочитывая файл"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                # Значение не поместилось в буфер - дочитываем (с удвоением для больших значений)
+                if not self._read(max(self._chunk_size, len(self._buffer) - self._position)):
+                    raise
+                continue
+            # Число у конца порции могло быть обрезано ("1" из "1.5", "1.5" из "1.5e3")
+            if (isinstance(value, (int, float)) and len(self._buffer) - end < 3
+                    and self._read(self._chunk_size)):
+                continue
+            self._position = end
+            return value
+
+
+def iter_json_entities(f: BinaryIO, chunk_size: int = LOAD_CHUNK_SIZE,
+                       stats: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, Optional[str], Any]]:
+    """
+    Потоково разбирает файл данных {коллекция: {ключ: значение}}.
+    Возвращает (коллекция, ключ, значение) по одной записи; значение коллекции,
+    которое не является объектом, возвращается целиком с ключом None.
+    """
+    stream = _JsonStream(f, chunk_size)
+    try:
+        if stream.peek() == '':
+            return
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            collection = stream.value()
+            stream.expect(':')
+            if stream.peek() == '{':
+                stream.expect('{')
+                if stream.peek() != '}':
+                    while True:
+                        key = stream.value()
+                        stream.expect(':')
+                        yield collection, key, stream.value()
+                        if stream.peek() != ',':
+                            break
+                        stream.expect(',')
+                stream.expect('}')
+            else:
+                yield collection, None, stream.value()
+            if stream.peek() != ',':
+                break
+            stream.expect(',')
+        stream.expect('}')
+        if stream.peek() != '':
+            raise ValueError("Лишние данные после конца JSON")
+    finally:
+        if stats is not None:
+            stats['read_time'] = stats.get('read_time', 0.0) + stream.read_time
+
+
+# Двоичный снимок:
+#   заголовок: сигнатура, смещение и число записей индекса;
+#   записи: marshal.dumps((ключ, значение)) подряд;
+#   индекс: записи фиксированного размера (номер коллекции, смещение, длина) - читается через mmap
+SNAPSHOT_MAGIC = b'TGBSNAP1'
+SNAPSHOT_HEADER = struct.Struct('<8sQQ')
+SNAPSHOT_INDEX_ENTRY = struct.Struct('<BQI')
+
+
+def encode_binary_snapshot(data: Dict[str, Any]) -> bytes:
+    """Кодирует все коллекции в двоичный снимок"""
+    records = []
+    index = []
+    offset = SNAPSHOT_HEADER.size
+    for number, collection in enumerate(COLLECTIONS):
+        for key, value in data.get(collection, {}).items():
+            record = marshal.dumps((key, encode_plain(value)))
+            records.append(record)
+            index.append(SNAPSHOT_INDEX_ENTRY.pack(number, offset, len(record)))
+            offset += len(record)
+    return b''.join([SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, offset, len(index))] + records + index)
+
+
+def read_binary_snapshot(filename: str, stats: Dict[str, Any], decode: Decoder) -> Dict[str, Any]:
+    """Загружает двоичный снимок, декодируя записи по одной"""
+    started = time.perf_counter()
+    data: Dict[str, Any] = {collection: {} for collection in COLLECTIONS}
+    with open(filename, 'rb') as f:
+        stats['file_size'] = os.fstat(f.fileno()).st_size
+        if stats['file_size'] == 0:
+            return data
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            magic, index_offset, count = SNAPSHOT_HEADER.unpack_from(view, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{filename} не является снимком данных бота")
+            index_end = index_offset + count * SNAPSHOT_INDEX_ENTRY.size
+            for number, offset, length in SNAPSHOT_INDEX_ENTRY.iter_unpack(view[index_offset:index_end]):
+                collection = COLLECTIONS[number]
+                key, value = marshal.loads(view[offset:offset + length])
+                data[collection][key] = decode(collection, key, value)
+    stats['read_time'] = 0.0
+    stats['parse_time'] = time.perf_counter() - started
+    return data
+
+
+def binary_snapshot_filename(filename: str) -> str:
+    """Имя двоичного снимка рядом с файлом данных (data.json -> data.snap)"""
+    return f"{os.path.splitext(filename)[0]}.snap"
+
+
+class JsonFileStorage:
+    """
+    Хранит все данные в одном файле-снимке, каждая запись переписывает его целиком.
+    Снимок - JSON (DATA_FILE) или двоичный (data.snap, SNAPSHOT_FORMAT = 'binary');
+    если двоичного снимка ещё нет, данные читаются из JSON и переносятся при первой записи.
+    """
+
+    def __init__(self, filename: str, snapshot_format: str = SNAPSHOT_FORMAT):
+        self.json_filename = filename
+        self.snapshot_format = snapshot_format
+        self.filename = binary_snapshot_filename(filename) if snapshot_format == 'binary' else filename
+        self._lock = threading.Lock()
+
+    def _read_snapshot(self, stats: Dict[str, Any], decode: Decoder) -> Dict[str, Any]:
+        """Читает снимок, декодируя записи по одной"""
+        if self.snapshot_format == 'binary' and os.path.exists(self.filename):
+            return read_binary_snapshot(self.filename, stats, decode)
+
+        started = time.perf_counter()
+        data: Dict[str, Any] = {}
+        stats['read_time'] = 0.0
+        try:
+            with open(self.json_filename, 'rb') as f:
+                stats['file_size'] = os.fstat(f.fileno()).st_size
+                for collection, key, value in iter_json_entities(f, stats=stats):
+                    if key is None:
+                        data[collection] = value
+                    else:
+                        data.setdefault(collection, {})[key] = decode(collection, key, value)
+        except FileNotFoundError:
+            stats['file_size'] = 0
+        stats['parse_time'] = time.perf_counter() - started - stats['read_time']
+        return data
+
+    def load(self, stats: Dict[str, Any], decode: Decoder = _as_is) -> Dict[str, Any]:
+        """Загружает все коллекции, заполняя статистику загрузки"""
+        return self._read_snapshot(stats, decode)
+
+    def _encode_snapshot(self, data: Dict[str, Any]) -> bytes:
+        """Кодирует снимок в выбранном формате"""
+        if self.snapshot_format == 'binary':
+            return encode_binary_snapshot(data)
+        return encode_json(data).encode('utf-8')
+
+    def encode_changes(self, data: Dict[str, Any], changes: Changes) -> Any:
+        """
+        Готовит изменения к записи.
+        Вызывается в event loop, пока данные не меняются; результат передаётся в write().
+        """
+        return self._encode_snapshot(data)
+
+    def write(self, payload: Any) -> None:
+        """Записывает подготовленные изменения (может выполняться в рабочем потоке)"""
+        with self._lock:
+            write_file_atomic(self.filename, payload)
+
+
+class JournalStorage(JsonFileStorage):
+    """
+    Снимок в JSON-файле плюс журнал изменений (write-ahead log).
+    Каждое изменение дописывает в журнал запись об изменённой сущности,
+    а когда журнал превышает порог, он сворачивается в новый снимок.
+    Свёртка выполняется в рабочем потоке записи по файлам (снимок + журнал, в котором уже есть
+    все изменения), поэтому цикл событий не кодирует всё состояние.
+    """
+
+    def __init__(self, filename: str, journal_filename: Optional[str] = None,
+                 compact_bytes: int = JOURNAL_COMPACT_BYTES, snapshot_format: str = SNAPSHOT_FORMAT):
+        super().__init__(filename, snapshot_format)
+        self.journal_filename = journal_filename or f"{filename}.journal"
+        self.compact_bytes = compact_bytes
+        self._journal_size = 0
+
+    def load(self, stats: Dict[str, Any], decode: Decoder = _as_is) -> Dict[str, Any]:
+        """Загружает последний снимок и применяет к нему хвост журнала"""
+        data = self._read_snapshot(stats, decode)
+        started = time.perf_counter()
+        stats['replayed'] = self._replay_journal(data, decode)
+        stats['replay_time'] = time.perf_counter() - started
+        return data
+
+    def _replay_journal(self, data: Dict[str, Any], decode: Decoder) -> int:
+        """Применяет записи журнала к данным снимка, возвращает число применённых записей"""
+        try:
+            with open(self.journal_filename, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            self._journal_size = 0
+            return 0
+
+        replayed = 0
+        position = 0
+        while position < len(raw):
+            end = raw.find(b'\n', position)
+            if end == -1:
+                # Запись оборвана на середине (сбой во время записи)
+                break
+            try:
+                record = json.loads(raw[position:end])
+                collection = data.setdefault(record['c'], {})
+                if 'v' in record:
+                    collection[record['k']] = decode(record['c'], record['k'], record['v'])
+                else:
+                    collection.pop(record['k'], None)
+            except (ValueError, KeyError, TypeError, AttributeError):
+                break
+            replayed += 1
+            position = end + 1
+
+        if position < len(raw):
+            logger.warning("Журнал %s повреждён: отброшено %d байт после записи №%d",
+                           self.journal_filename, len(raw) - position, replayed)
+            with open(self.journal_filename, 'r+b') as f:
+                f.truncate(position)
+
+        self._journal_size = position
+        return replayed
+
+    def encode_changes(self, data: Dict[str, Any], changes: Changes) -> Tuple[str, bytes]:
+        """
+        Кодирует изменённые сущности в записи журнала ('journal'; 'compact' - после записи свернуть
+        журнал в снимок). Если изменилось всё, кодируется новый снимок ('snapshot').
+        """
+        if changes is None:
+            return 'snapshot', self._encode_snapshot(data)
+
+        lines = []
+        for collection, keys in changes.items():
+            entities = data[collection]
+            for key in keys:
+                if key in entities:
+                    lines.append(encode_json({'c': collection, 'k': key, 'v': entities[key]}))
+                else:
+                    lines.append(encode_json({'c': collection, 'k': key}))
+
+        payload = ('\n'.join(lines) + '\n').encode('utf-8') if lines else b''
+        # Размер журнала меняется только в write(), после успешной записи
+        kind = 'compact' if self._journal_size + len(payload) >= self.compact_bytes else 'journal'
+        return kind, payload
+
+    def write(self, payload: Tuple[str, bytes]) -> None:
+        """Дописывает записи в журнал (и при необходимости сворачивает его) или записывает новый снимок"""
+        kind, body = payload
+        with self._lock:
+            if kind == 'snapshot':
+                self._write_snapshot(body)
+                return
+            if body:
+                with open(self.journal_filename, 'ab') as f:
+                    f.write(body)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._journal_size += len(body)
+            if kind == 'compact':
+                self._compact()
+
+    def _write_snapshot(self, body: bytes) -> None:
+        """Записывает снимок и очищает журнал (снимок уже содержит все его изменения)"""
+        write_file_atomic(self.filename, body)
+        with open(self.journal_filename, 'wb') as f:
+            os.fsync(f.fileno())
+        self._journal_size = 0
+
+    def _compact(self) -> None:
+        """Сворачивает журнал в новый снимок: последний снимок с применённым журналом (под self._lock)"""
+        started = time.perf_counter()
+        data = self._read_snapshot({}, _as_is)
+        replayed = self._replay_journal(data, _as_is)
+        self._write_snapshot(self._encode_snapshot(data))
+        logger.info("Журнал %s свёрнут в снимок: %d записей за %.1f мс", self.journal_filename, replayed,
+                    (time.perf_counter() - started) * 1000)
+
+
+class SqliteStorage:
+    """
+    Хранит данные в SQLite (режим WAL): по строке на сущность, с индексами по chat_id
+    пользователей, логинам в заказах и участникам чатов.
+    Запись затрагивает только изменённые сущности.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entrepreneurs (
+            login TEXT PRIMARY KEY,
+            chat_id INTEGER,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_entrepreneurs_chat_id ON entrepreneurs (chat_id);
+
+        CREATE TABLE IF NOT EXISTS clients (
+            login TEXT PRIMARY KEY,
+            chat_id INTEGER,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_clients_chat_id ON clients (chat_id);
+
+        CREATE TABLE IF NOT EXISTS orders (
+            contractor_login TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            client_login TEXT,
+            data TEXT NOT NULL,
+            PRIMARY KEY (contractor_login, position)
+        );
+        CREATE INDEX IF NOT EXISTS idx_orders_client_login ON orders (client_login);
+        CREATE INDEX IF NOT EXISTS idx_orders_contractor_login ON orders (contractor_login);
+
+        CREATE TABLE IF NOT EXISTS active_chats (
+            chat_id TEXT PRIMARY KEY,
+            client_login TEXT,
+            client_chat_id INTEGER,
+            contractor_login TEXT,
+            contractor_chat_id INTEGER,
+            active INTEGER NOT NULL DEFAULT 1,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_chats_client_chat_id ON active_chats (client_chat_id);
+        CREATE INDEX IF NOT EXISTS idx_chats_contractor_chat_id ON active_chats (contractor_chat_id);
+        CREATE INDEX IF NOT EXISTS idx_chats_participants ON active_chats (client_login, contractor_login);
+
+        CREATE TABLE IF NOT EXISTS portfolio_items (
+            category TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (category, position)
+        );
+
+        CREATE TABLE IF NOT EXISTS dialogs (
+            user_id TEXT PRIMARY KEY,
+            touched REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_dialogs_touched ON dialogs (touched);
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._lock = threading.Lock()
+        # Соединение используется из рабочих потоков, доступ к нему защищён блокировкой
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(self.SCHEMA)
+
+    def load(self, stats: Dict[str, Any], decode: Decoder = _as_is) -> Dict[str, Any]:
+        """Загружает все коллекции из базы"""
+        started = time.perf_counter()
+        data: Dict[str, Any] = {collection: {} for collection in COLLECTIONS}
+
+        with self._lock:
+            connection = self._connection
+            for collection, query in (('entrepreneurs', 'SELECT login, data FROM entrepreneurs ORDER BY rowid'),
+                                      ('clients', 'SELECT login, data FROM clients ORDER BY rowid'),
+                                      ('active_chats', 'SELECT chat_id, data FROM active_chats ORDER BY rowid'),
+                                      ('dialogs', 'SELECT user_id, data FROM dialogs ORDER BY touched')):
+                entities = data[collection]
+                for key, raw in connection.execute(query):
+                    entities[key] = decode(collection, key, json.loads(raw))
+            # Строки списков (заказы исполнителя, элементы категории) собираются в одну запись
+            for collection, query in (
+                    ('orders', 'SELECT contractor_login, data FROM orders ORDER BY contractor_login, position'),
+                    ('portfolio_items', 'SELECT category, data FROM portfolio_items ORDER BY category, position')):
+                entities = data[collection]
+                key, items = None, []
+                for row_key, raw in connection.execute(query):
+                    if row_key != key:
+                        if items:
+                            entities[key] = decode(collection, key, items)
+                        key, items = row_key, []
+                    items.append(json.loads(raw))
+                if items:
+                    entities[key] = decode(collection, key, items)
+
+        stats['file_size'] = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+        stats['read_time'] = 0.0
+        stats['parse_time'] = time.perf_counter() - started
+        return data
+
+    # Запросы чтения отдельных сущностей по ключу (для списочных коллекций - в порядке позиций)
+    KEY_QUERIES = {
+        'entrepreneurs': 'SELECT data FROM entrepreneurs WHERE login = ?',
+        'clients': 'SELECT data FROM clients WHERE login = ?',
+        'orders': 'SELECT data FROM orders WHERE contractor_login = ? ORDER BY position',
+        'active_chats': 'SELECT data FROM active_chats WHERE chat_id = ?',
+        'portfolio_items': 'SELECT data FROM portfolio_items WHERE category = ? ORDER BY position',
+        'dialogs': 'SELECT data FROM dialogs WHERE user_id = ?'
+    }
+
+    def load_keys(self, keys: Dict[str, Any], decode: Decoder = _as_is) -> Dict[str, Dict[str, Any]]:
+        """
+        Читает отдельные сущности по ключам: коллекция -> ключи.
+        Возвращает коллекция -> ключ -> значение; удалённых ключей в результате нет.
+        """
+        data: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for collection, collection_keys in keys.items():
+                entities = data[collection] = {}
+                query = self.KEY_QUERIES[collection]
+                for key in collection_keys:
+                    rows = [json.loads(raw) for raw, in self._connection.execute(query, (key,))]
+                    if not rows:
+                        continue
+                    value = rows if collection in ('orders', 'portfolio_items') else rows[0]
+                    entities[key] = decode(collection, key, value)
+        return data
+
+    @staticmethod
+    def _encode_rows(collection: str, key: str, value: Any) -> List[Tuple]:
+        """Превращает сущность коллекции в строки таблицы"""
+        if collection in ('entrepreneurs', 'clients'):
+            return [(key, value.chat_id, encode_json(value))]
+        if collection == 'orders':
+            return [(key, position, order.client_login, encode_json(order)) for position, order in enumerate(value)]
+        if collection == 'active_chats':
+            return [(key, value.client_login, value.client_chat_id, value.contractor_login,
+                     value.contractor_chat_id, 1 if value.active else 0, encode_json(value))]
+        if collection == 'dialogs':
+            return [(key, value.get('touched', 0), encode_json(value))]
+        return [(key, position, encode_json(item)) for position, item in enumerate(value)]
+
+    def encode_changes(self, data: Dict[str, Any], changes: Changes) -> Tuple[bool, List[Tuple]]:
+        """Кодирует изменённые сущности в строки таблиц; None вместо строк означает удаление"""
+        operations = []
+        for collection in COLLECTIONS:
+            entities = data[collection]
+            keys = entities.keys() if changes is None else changes.get(collection, ())
+            for key in keys:
+                rows = self._encode_rows(collection, key, entities[key]) if key in entities else None
+                operations.append((collection, key, rows))
+        return changes is None, operations
+
+    def write(self, payload: Tuple[bool, List[Tuple]]) -> None:
+        """Применяет изменения одной транзакцией"""
+        replace_all, operations = payload
+        with self._lock, self._connection as connection:
+            if replace_all:
+                for collection in COLLECTIONS:
+                    connection.execute(f'DELETE FROM {collection}')
+            for collection, key, rows in operations:
+                if collection == 'entrepreneurs' or collection == 'clients':
+                    if rows is None:
+                        connection.execute(f'DELETE FROM {collection} WHERE login = ?', (key,))
+                    else:
+                        connection.executemany(
+                            f'INSERT INTO {collection} (login, chat_id, data) VALUES (?, ?, ?) '
+                            f'ON CONFLICT (login) DO UPDATE SET chat_id = excluded.chat_id, data = excluded.data',
+                            rows)
+                elif collection == 'active_chats':
+                    if rows is None:
+                        connection.execute('DELETE FROM active_chats WHERE chat_id = ?', (key,))
+                    else:
+                        connection.executemany(
+                            'INSERT INTO active_chats (chat_id, client_login, client_chat_id, contractor_login, '
+                            'contractor_chat_id, active, data) VALUES (?, ?, ?, ?, ?, ?, ?) '
+                            'ON CONFLICT (chat_id) DO UPDATE SET client_login = excluded.client_login, '
+                            'client_chat_id = excluded.client_chat_id, contractor_login = excluded.contractor_login, '
+                            'contractor_chat_id = excluded.contractor_chat_id, active = excluded.active, '
+                            'data = excluded.data',
+                            rows)
+                elif collection == 'dialogs':
+                    if rows is None:
+                        connection.execute('DELETE FROM dialogs WHERE user_id = ?', (key,))
+                    else:
+                        connection.executemany(
+                            'INSERT INTO dialogs (user_id, touched, data) VALUES (?, ?, ?) '
+                            'ON CONFLICT (user_id) DO UPDATE SET touched = excluded.touched, data = excluded.data',
+                            rows)
+                elif collection == 'orders':
+                    connection.execute('DELETE FROM orders WHERE contractor_login = ?', (key,))
+                    if rows:
+                        connection.executemany(
+                            'INSERT INTO orders (contractor_login, position, client_login, data) VALUES (?, ?, ?, ?)',
+                            rows)
+                else:
+                    connection.execute('DELETE FROM portfolio_items WHERE category = ?', (key,))
+                    if rows:
+                        connection.executemany(
+                            'INSERT INTO portfolio_items (category, position, data) VALUES (?, ?, ?)', rows)
+
+    def is_empty(self) -> bool:
+        """Проверяет, что в базе ещё нет данных"""
+        with self._lock:
+            return all(self._connection.execute(f'SELECT 1 FROM {collection} LIMIT 1').fetchone() is None
+                       for collection in COLLECTIONS)
+
+
+class ShardedStorage:
+    """
+    Хранит каждую коллекцию в отдельном файле-шарде, заказы - по файлу на исполнителя.
+    Запись атомарно переписывает только шарды изменённых коллекций (и исполнителей),
+    затем манифест с номерами поколений шардов.
+    Загрузка переживает отсутствующий или устаревший шард: он пропускается или загружается
+    как есть с предупреждением, а заказы исполнителей, которых уже нет, отбрасываются.
+    """
+
+    MANIFEST = 'manifest.json'
+    ORDERS_DIR = 'orders'
+
+    def __init__(self, dirname: str):
+        self.filename = dirname
+        self._lock = threading.Lock()
+        self._generation = 0
+        # Путь шарда -> поколение, в котором он записан
+        self._shards: Dict[str, int] = {}
+        os.makedirs(os.path.join(dirname, self.ORDERS_DIR), exist_ok=True)
+
+    @classmethod
+    def _shard_path(cls, collection: str, key: Optional[str] = None) -> str:
+        """Путь шарда относительно каталога хранилища"""
+        if collection == 'orders':
+            return f"{cls.ORDERS_DIR}/{quote(key, safe='')}.json"
+        return f"{collection}.json"
+
+    def _read_shard(self, path: str, stats: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Читает шард; повреждённый шард считается отсутствующим"""
+        started = time.perf_counter()
+        try:
+            with open(os.path.join(self.filename, path), 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        read_done = time.perf_counter()
+        stats['file_size'] += len(raw)
+        stats['read_time'] += read_done - started
+        try:
+            return json.loads(raw)
+        except ValueError:
+            logger.warning("Шард %s повреждён и пропущен", path)
+            return None
+        finally:
+            stats['parse_time'] += time.perf_counter() - read_done
+
+    def load(self, stats: Dict[str, Any], decode: Decoder = _as_is) -> Dict[str, Any]:
+        """Загружает все шарды, сверяя их поколения с манифестом"""
+        stats.update(file_size=0, read_time=0.0, parse_time=0.0)
+        data: Dict[str, Any] = {collection: {} for collection in COLLECTIONS}
+
+        with self._lock:
+            manifest = self._read_shard(self.MANIFEST, stats) or {}
+            expected: Dict[str, int] = manifest.get('shards', {})
+            self._generation = manifest.get('generation', 0)
+            self._shards = {}
+
+            order_paths = {f"{self.ORDERS_DIR}/{name}"
+                           for name in os.listdir(os.path.join(self.filename, self.ORDERS_DIR))
+                           if name.endswith('.json')}
+            paths = {self._shard_path(collection) for collection in COLLECTIONS if collection != 'orders'}
+            paths |= order_paths | set(expected)
+
+            missing, stale = [], []
+            for path in sorted(paths):
+                shard = self._read_shard(path, stats)
+                if shard is None:
+                    if path in expected:
+                        missing.append(path)
+                    continue
+                generation = shard.get('generation', 0)
+                if generation < expected.get(path, 0):
+                    stale.append(path)
+                self._shards[path] = generation
+                self._generation = max(self._generation, generation)
+
+                if path.startswith(f"{self.ORDERS_DIR}/"):
+                    login = unquote(path[len(self.ORDERS_DIR) + 1:-len('.json')])
+                    data['orders'][login] = decode('orders', login, shard['data'])
+                else:
+                    collection = path[:-len('.json')]
+                    data[collection] = {key: decode(collection, key, value) for key, value in shard['data'].items()}
+
+            # Заказы исполнителей, которых уже нет (шард исполнителей новее шардов заказов).
+            # Без шарда исполнителей сирот не ищем, чтобы не потерять все заказы
+            orphans = []
+            if self._shard_path('entrepreneurs') in self._shards:
+                orphans = [login for login in data['orders'] if login not in data['entrepreneurs']]
+            for login in orphans:
+                del data['orders'][login]
+                path = self._shard_path('orders', login)
+                self._shards.pop(path, None)
+                try:
+                    os.remove(os.path.join(self.filename, path))
+                except FileNotFoundError:
+                    pass
+            # Шард заказов удалённого исполнителя мог исчезнуть раньше, чем обновился манифест
+            missing = [path for path in missing
+                       if not path.startswith(f"{self.ORDERS_DIR}/")
+                       or unquote(path[len(self.ORDERS_DIR) + 1:-len('.json')]) in data['entrepreneurs']]
+
+        for name, paths in (('отсутствуют', missing), ('устарели', stale)):
+            if paths:
+                logger.warning("Шарды %s: %s", name, ', '.join(paths))
+        if orphans:
+            logger.warning("Отброшены заказы несуществующих исполнителей: %s", ', '.join(orphans))
+        stats['shards'] = {'missing': len(missing), 'stale': len(stale), 'orphans': len(orphans)}
+        return data
+
+    def encode_changes(self, data: Dict[str, Any], changes: Changes) -> Tuple[List[Tuple[str, Optional[bytes]]], bytes]:
+        """Кодирует изменённые шарды (None - шард удаляется) и новый манифест"""
+        self._generation += 1
+        generation = self._generation
+        writes: List[Tuple[str, Optional[bytes]]] = []
+
+        def put(path: str, value: Any) -> None:
+            writes.append((path, encode_json({'generation': generation, 'data': value}).encode('utf-8')))
+            self._shards[path] = generation
+
+        for collection in COLLECTIONS:
+            entities = data[collection]
+            if collection == 'orders':
+                if changes is None:
+                    keys = set(entities)
+                    keys.update(unquote(path[len(self.ORDERS_DIR) + 1:-len('.json')]) for path in self._shards
+                                if path.startswith(f"{self.ORDERS_DIR}/"))
+                else:
+                    keys = changes.get('orders', ())
+                for key in keys:
+                    path = self._shard_path('orders', key)
+                    if entities.get(key):
+                        put(path, entities[key])
+                    else:
+                        writes.append((path, None))
+                        self._shards.pop(path, None)
+            elif changes is None or changes.get(collection):
+                put(self._shard_path(collection), entities)
+
+        manifest = encode_json({'generation': generation, 'shards': self._shards}).encode('utf-8')
+        return writes, manifest
+
+    def write(self, payload: Tuple[List[Tuple[str, Optional[bytes]]], bytes]) -> None:
+        """Записывает изменённые шарды, затем манифест"""
+        writes, manifest = payload
+        with self._lock:
+            for path, body in writes:
+                filename = os.path.join(self.filename, path)
+                if body is None:
+                    try:
+                        os.remove(filename)
+                    except FileNotFoundError:
+                        pass
+                else:
+                    write_file_atomic(filename, body)
+            write_file_atomic(os.path.join(self.filename, self.MANIFEST), manifest)
+
+
+def shards_dirname(filename: str) -> str:
+    """Каталог шардов рядом с файлом данных (data.json -> data.shards)"""
+    return f"{os.path.splitext(filename)[0]}.shards"
+
+
+def sqlite_filename(filename: str) -> str:
+    """Имя файла базы SQLite рядом с файлом данных (data.json -> data.db)"""
+    return f"{os.path.splitext(filename)[0]}.db"
+
+
+def create_storage(backend: str, filename: str):
+    """Создаёт хранилище по названию из настроек"""
+    if backend == 'json':
+        return JsonFileStorage(filename)
+    if backend == 'journal':
+        return JournalStorage(filename)
+    if backend == 'sqlite':
+        return SqliteStorage(sqlite_filename(filename))
+    if backend == 'sharded':
+        return ShardedStorage(shards_dirname(filename))
+    raise ValueError(f"Неизвестный тип хранилища: {backend}")
+
+
+def migrate_json_to_sqlite(json_filename: str, db_filename: str) -> Dict[str, int]:
+    """Однократно переносит данные из JSON-файла в базу SQLite, возвращает количество сущностей"""
+    # Читаем через UserState, чтобы перенести записи уже декодированными и приведёнными к текущему формату
+    from state_manager import UserState
+    data = UserState(json_filename, backend='json').collections()
+
+    storage = SqliteStorage(db_filename)
+    if not storage.is_empty():
+        raise RuntimeError(f"База {db_filename} уже содержит данные, миграция отменена")
+    storage.write(storage.encode_changes(data, None))
+    return {collection: len(data[collection]) for collection in COLLECTIONS}
+
+
+if __name__ == '__main__':
+    # python storage.py migrate [data.json] [data.db]
+    if len(sys.argv) < 2 or sys.argv[1] != 'migrate':
+        print("Использование: python storage.py migrate [data.json] [data.db]")
+        sys.exit(1)
+    source = sys.argv[2] if len(sys.argv) > 2 else DATA_FILE
+    target = sys.argv[3] if len(sys.argv) > 3 else sqlite_filename(source)
+    try:
+        counts = migrate_json_to_sqlite(source, target)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"Данные перенесены из {source} в {target}: "
+          + ', '.join(f"{name}={count}" for name, count in counts.items()))
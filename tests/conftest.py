@@ -0,0 +1,20 @@
+# conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Модули бота создают глобальные объекты при импорте (user_state читает DATA_FILE из текущего каталога),
+# поэтому тесты работают во временном каталоге и не трогают данные бота
+os.chdir(tempfile.mkdtemp(prefix='bot-tests-'))
+os.environ.setdefault('CHECK_STATE_INVARIANTS', '1')
+
+
+@pytest.fixture
+def state(tmp_path):
+    """Пустое состояние бота с данными во временном каталоге (каждое изменение пишется сразу)"""
+    from state_manager import UserState
+    return UserState(str(tmp_path / 'data.json'), persistence_mode='durable', backend='json')
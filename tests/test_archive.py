@@ -0,0 +1,94 @@
+# test_archive.py
+import asyncio
+from datetime import datetime, timedelta
+
+from archive import ArchiveScheduler, OrderArchive
+from models import Chat, Order
+
+
+def order(number, client_login='anna'):
+    return Order(description=f'Заказ {number}', client_login=client_login, created_at=datetime(2024, 1, 1),
+                 expired=True)
+
+
+def test_pages_newest_first(tmp_path):
+    archive = OrderArchive(str(tmp_path / 'data.archive'))
+    asyncio.run(archive.append([('orders', 'ivan', order(number)) for number in range(5)]))
+    assert archive.count('orders', 'contractor', 'ivan') == 5
+    assert archive.count('orders', 'client', 'anna') == 5
+    assert archive.count('orders', 'client', 'ivan') == 0
+
+    first = archive.read_page('orders', 'contractor', 'ivan', page=0, page_size=2)
+    assert [record[2].description for record in first] == ['Заказ 4', 'Заказ 3']
+    last = archive.read_page('orders', 'contractor', 'ivan', page=2, page_size=2)
+    assert [record[2].description for record in last] == ['Заказ 0']
+    assert archive.read_page('orders', 'contractor', 'ivan', page=3, page_size=2) == []
+
+
+def test_index_is_rebuilt_from_file(tmp_path):
+    filename = str(tmp_path / 'data.archive')
+    chat = Chat(client_login='anna', contractor_login='ivan', active=False)
+    asyncio.run(OrderArchive(filename).append([('orders', 'ivan', order(1)), ('active_chats', 'c1', chat)]))
+
+    archive = OrderArchive(filename)
+    assert archive.load_stats['records'] == 2
+    assert archive.count('active_chats', 'client', 'anna') == 1
+    assert archive.count('active_chats', 'contractor', 'ivan') == 1
+    assert archive.read_page('active_chats', 'client', 'anna')[0][2] == chat
+
+
+def test_torn_tail_is_truncated_on_start(tmp_path):
+    filename = tmp_path / 'data.archive'
+    asyncio.run(OrderArchive(str(filename)).append([('orders', 'ivan', order(1))]))
+    whole = filename.read_bytes()
+    filename.write_bytes(whole + b'["orders:contractor:ivan"]\t{"c":"orders","k":"iv')
+
+    archive = OrderArchive(str(filename))
+    assert filename.read_bytes() == whole
+    assert archive.count('orders', 'contractor', 'ivan') == 1
+
+    asyncio.run(archive.append([('orders', 'ivan', order(2))]))
+    reloaded = OrderArchive(str(filename))
+    assert [record[2].description for record in reloaded.read_page('orders', 'contractor', 'ivan')] == \
+           ['Заказ 2', 'Заказ 1']
+
+
+def test_torn_tail_is_truncated_before_append(tmp_path):
+    filename = tmp_path / 'data.archive'
+    archive = OrderArchive(str(filename))
+    asyncio.run(archive.append([('orders', 'ivan', order(1))]))
+    # Другой процесс упал посреди записи после того, как архив был открыт
+    with open(filename, 'ab') as f:
+        f.write(b'["orders:contractor:ivan"]\t{"c":')
+
+    asyncio.run(archive.append([('orders', 'ivan', order(2))]))
+    assert archive.count('orders', 'contractor', 'ivan') == 2
+    assert OrderArchive(str(filename)).count('orders', 'contractor', 'ivan') == 2
+
+
+def test_lines_appended_by_other_process_are_indexed(tmp_path):
+    filename = str(tmp_path / 'data.archive')
+    reader = OrderArchive(filename)
+    asyncio.run(OrderArchive(filename).append([('orders', 'ivan', order(1))]))
+    assert reader.count('orders', 'contractor', 'ivan') == 1
+
+
+def test_scheduler_moves_finished_orders(state, tmp_path):
+    state.add_order('ivan', order(1))
+    state.add_order('ivan', Order(description='Новый', client_login='anna', created_at=datetime.now()))
+    archive = OrderArchive(str(tmp_path / 'data.archive'))
+    scheduler = ArchiveScheduler(state, archive, order_age_days=30)
+
+    assert asyncio.run(scheduler.run_once()) == 1
+    assert [item.description for item in state.get_orders('ivan')] == ['Новый']
+    assert [item.description for item in state.get_client_orders('anna')] == ['Новый']
+    assert archive.count('orders', 'contractor', 'ivan') == 1
+    assert asyncio.run(scheduler.run_once()) == 0
+
+
+def test_scheduler_keeps_active_timer(state, tmp_path):
+    state.add_order('ivan', order(1))
+    state.update_order_timer('ivan', 0, datetime.now() + timedelta(hours=1))
+    scheduler = ArchiveScheduler(state, OrderArchive(str(tmp_path / 'data.archive')))
+    assert asyncio.run(scheduler.run_once()) == 0
+    assert len(state.get_orders('ivan')) == 1
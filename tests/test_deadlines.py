@@ -0,0 +1,91 @@
+# test_deadlines.py
+import asyncio
+from datetime import datetime, timedelta
+
+from deadlines import DeadlineScheduler
+from models import Order
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+def add_order(state, contractor_login, hours_left, client_chat_id=None):
+    state.add_order(contractor_login, Order(description='Заказ', client_login='anna', client_chat_id=client_chat_id,
+                                            created_at=datetime.now()))
+    index = len(state.orders[contractor_login]) - 1
+    state.update_order_timer(contractor_login, index, datetime.now() + timedelta(hours=hours_left))
+    return state.orders[contractor_login][index]
+
+
+def test_entries_fire_in_time_order(state):
+    scheduler = DeadlineScheduler(state, reminder_hours=(24, 1))
+    late = add_order(state, 'ivan', 48)
+    soon = add_order(state, 'ivan', 2)
+    # soon: напоминание за 1 час и окончание; late: за 24 и за 1 час и окончание
+    assert len(scheduler) == 5
+
+    due = scheduler.pop_due(datetime.now() + timedelta(hours=3))
+    assert [(entry[2], entry[5]) for entry in due] == [('remind', soon), ('expire', soon)]
+    assert len(scheduler) == 3
+    assert [entry[5] for entry in scheduler.pop_due(datetime.now() + timedelta(days=3))] == [late] * 3
+    assert len(scheduler) == 0
+
+
+def test_past_reminders_are_skipped(state):
+    scheduler = DeadlineScheduler(state, reminder_hours=(24, 1))
+    add_order(state, 'ivan', 5)
+    assert [entry[2] for entry in scheduler.pop_due(datetime.now() + timedelta(days=1))] == ['remind', 'expire']
+
+
+def test_reschedule_cancels_lazily(state):
+    scheduler = DeadlineScheduler(state, reminder_hours=())
+    orders = [add_order(state, 'ivan', hours) for hours in (1, 2, 3, 4)]
+    state.update_order_timer('ivan', 0, datetime.now() + timedelta(hours=10))
+    # Старая запись первого заказа осталась в куче, но отменена
+    assert len(scheduler._heap) == 5
+    assert len(scheduler) == 4
+
+    due = scheduler.pop_due(datetime.now() + timedelta(hours=5))
+    assert [entry[5] for entry in due] == orders[1:]
+    assert len(scheduler) == 1
+    assert [entry[5] for entry in scheduler.pop_due(datetime.now() + timedelta(hours=11))] == [orders[0]]
+
+
+def test_heap_is_rebuilt_when_mostly_cancelled(state):
+    scheduler = DeadlineScheduler(state, reminder_hours=())
+    orders = [add_order(state, 'ivan', hours) for hours in range(1, 9)]
+    for order in orders[:5]:
+        state.deactivate_order_timer('ivan', order)
+    # Отменено больше половины: куча пересобрана без отменённых записей
+    assert len(scheduler._heap) == 3
+    assert scheduler._cancelled == 0
+    assert len(scheduler) == 3
+    assert [entry[5] for entry in scheduler.pop_due(datetime.now() + timedelta(days=1))] == orders[5:]
+
+
+def test_existing_timers_are_scheduled_on_start(state):
+    order = add_order(state, 'ivan', 1)
+    scheduler = DeadlineScheduler(state, reminder_hours=())
+    assert [entry[5] for entry in scheduler.pop_due(datetime.now() + timedelta(hours=2))] == [order]
+
+
+def test_expiry_deactivates_timer_and_notifies(state):
+    state.register_entrepreneur('ivan', 'p', chat_id=10)
+    scheduler = DeadlineScheduler(state, reminder_hours=())
+    order = add_order(state, 'ivan', 1, client_chat_id=20)
+    bot = FakeBot()
+
+    async def fire_due():
+        for entry in scheduler.pop_due(datetime.now() + timedelta(hours=2)):
+            await scheduler._fire(bot, entry)
+
+    asyncio.run(fire_due())
+    assert not state.is_timer_active(order)
+    assert order.expired
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [10, 20]
+    assert all('истёк' in text for _, text in bot.sent)
@@ -0,0 +1,60 @@
+# test_durable.py
+import asyncio
+import threading
+
+
+def record_writes(state):
+    """Подменяет запись хранилища: запоминает потоки, в которых она выполнялась"""
+    threads = []
+    write = state.storage.write
+
+    def recording_write(payload):
+        threads.append(threading.current_thread())
+        write(payload)
+
+    state.storage.write = recording_write
+    return threads
+
+
+def test_mutation_does_not_write_in_event_loop(state):
+    threads = record_writes(state)
+
+    async def main():
+        state.register_client('anna', 'p', chat_id=20)
+        assert threads == []
+        await state.commit()
+        assert len(threads) == 1 and threads[0] is not threading.main_thread()
+        await state.close()
+
+    asyncio.run(main())
+
+
+def test_hold_commits_before_release(state):
+    state.register_entrepreneur('ivan', 'p')
+    threads = record_writes(state)
+
+    async def main():
+        async with state.locks.hold(('contractor', 'ivan')):
+            state.set_entrepreneur_balance('ivan', 500)
+        # Ответ пользователю отправляется после hold - изменение к этому моменту уже на диске
+        assert len(threads) == 1
+        await state.close()
+
+    asyncio.run(main())
+    reloaded = type(state)(state.filename, persistence_mode='durable', backend='json')
+    assert reloaded.get_entrepreneur_balance('ivan') == 500
+
+
+def test_write_behind_commit_does_not_wait(tmp_path):
+    from state_manager import UserState
+    state = UserState(str(tmp_path / 'data.json'), persistence_mode='write_behind', backend='json')
+    threads = record_writes(state)
+
+    async def main():
+        state.register_client('anna', 'p', chat_id=20)
+        await state.commit()
+        assert threads == []
+        await state.close()
+        assert len(threads) == 1
+
+    asyncio.run(main())
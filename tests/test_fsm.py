@@ -0,0 +1,106 @@
+# test_fsm.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from fsm import STAY, StateMachine
+from state_manager import user_state
+
+USER_ID = 424242
+
+
+def make_update(text):
+    return SimpleNamespace(message=SimpleNamespace(text=text, from_user=SimpleNamespace(id=USER_ID)))
+
+
+def make_machine():
+    machine = StateMachine()
+    calls = []
+
+    @machine.state('order_description', transitions=('order_budget',))
+    async def description(update, context, text):
+        calls.append(('description', text))
+        return 'order_budget' if text else STAY
+
+    @machine.state('order_budget', transitions=('new_rating_{login}',))
+    async def budget(update, context, text):
+        calls.append(('budget', text))
+        return None
+
+    @machine.state('new_rating_{login}', mode='rating')
+    @machine.state('new_balance_{login}', mode='balance')
+    async def admin_value(update, context, text, login, mode):
+        calls.append((mode, login, text))
+        return 'order_budget'
+
+    @machine.state('portfolio_photos_{category:category}', event='photo', transitions=('order_budget',))
+    async def photos(update, context, text, category):
+        calls.append(('photo', category))
+        return 'order_budget'
+
+    return machine, calls
+
+
+def dispatch(machine, current, text, event='text'):
+    return asyncio.run(machine.dispatch(make_update(text), None, current, event))
+
+
+def test_resolve_returns_table_entry_and_arguments():
+    machine, _ = make_machine()
+    state, args = machine.resolve('new_rating_ivan_1')
+    assert state.pattern == 'new_rating_{login}'
+    assert state.kwargs == {'mode': 'rating'}
+    assert args == {'login': 'ivan_1'}
+    assert machine.resolve('order_budget', event='photo') is None
+    assert machine.resolve('unknown') is None
+
+
+def test_transition_is_stored():
+    machine, calls = make_machine()
+    assert dispatch(machine, 'order_description', '  Сделать сайт  ')
+    assert calls == [('description', 'Сделать сайт')]
+    assert user_state.get_state(USER_ID) == 'order_budget'
+
+
+def test_stay_keeps_state_and_none_finishes():
+    machine, calls = make_machine()
+    user_state.set_state(USER_ID, 'order_description')
+    assert dispatch(machine, 'order_description', '')
+    assert user_state.get_state(USER_ID) == 'order_description'
+
+    assert dispatch(machine, 'order_budget', '100')
+    assert user_state.get_state(USER_ID) is None
+    assert calls == [('description', ''), ('budget', '100')]
+
+
+def test_events_are_separate():
+    machine, calls = make_machine()
+    assert not dispatch(machine, 'portfolio_photos_sites', 'текст')
+    assert dispatch(machine, 'portfolio_photos_sites', None, event='photo')
+    assert calls == [('photo', 'sites')]
+
+
+def test_undeclared_transition_is_rejected():
+    machine, calls = make_machine()
+    with pytest.raises(ValueError):
+        dispatch(machine, 'new_balance_ivan', '5')
+    assert calls == [('balance', 'ivan', '5')]
+
+
+def test_validate():
+    machine, _ = make_machine()
+    machine.validate()
+    machine.add('order_deadline', make_machine, transitions=('order_unknown',))
+    with pytest.raises(ValueError):
+        machine.validate()
+    with pytest.raises(ValueError):
+        machine.add('order_video', make_machine, event='video')
+
+
+def test_bot_states_are_consistent():
+    import text_handler  # noqa: F401 - регистрирует состояния бота
+    from fsm import state_machine
+
+    assert state_machine.states
+    state_machine.validate()
@@ -0,0 +1,80 @@
+# test_handlers_stress.py
+import asyncio
+import random
+from datetime import datetime
+from types import SimpleNamespace
+
+import handlers_client
+import handlers_contractor
+from models import Order
+
+CONTRACTORS = 5
+CLIENTS = 10
+BUDGET = 100.0
+
+
+async def pause():
+    """Случайная точка переключения задач, как при настоящем ожидании сети"""
+    for _ in range(random.randint(0, 3)):
+        await asyncio.sleep(0)
+
+
+def callback(user_id):
+    async def edit_message_text(*args, **kwargs):
+        await pause()
+    return SimpleNamespace(callback_query=SimpleNamespace(from_user=SimpleNamespace(id=user_id),
+                                                          edit_message_text=edit_message_text))
+
+
+def message(user_id):
+    async def reply_text(*args, **kwargs):
+        await pause()
+    return SimpleNamespace(message=SimpleNamespace(from_user=SimpleNamespace(id=user_id), reply_text=reply_text))
+
+
+def test_accepts_and_logins_keep_state_consistent(state, monkeypatch):
+    async def send_to_user(*args, **kwargs):
+        await pause()
+
+    monkeypatch.setattr(handlers_client, 'user_state', state)
+    monkeypatch.setattr(handlers_contractor, 'user_state', state)
+    monkeypatch.setattr(handlers_client, 'send_to_user', send_to_user)
+    random.seed(15)
+
+    for number in range(CONTRACTORS):
+        state.register_entrepreneur(f'ivan{number}', 'secret', chat_id=100 + number)
+        for client in range(CLIENTS):
+            state.add_order(f'ivan{number}', Order(description=f'Заказ {client}', client_login=f'anna{client}',
+                                                   client_chat_id=1000 + client, budget=BUDGET,
+                                                   deadline_text='2 дня', created_at=datetime.now()))
+
+    async def accept(contractor, client):
+        await pause()
+        await handlers_client.handle_order_response(callback(100 + contractor), None, 'accept', 1000 + client)
+
+    async def login(contractor, chat):
+        await pause()
+        context = SimpleNamespace(user_data={'login': f'ivan{contractor}'})
+        await handlers_contractor.login_password(message(100 + chat), context, 'secret')
+
+    async def main():
+        tasks = [accept(contractor, client) for contractor in range(CONTRACTORS) for client in range(CLIENTS)] * 2
+        # Исполнители входят и из своих, и из чужих чатов - chat_id переходит между логинами
+        tasks += [login(random.randrange(CONTRACTORS), random.randrange(CONTRACTORS)) for _ in range(50)]
+        random.shuffle(tasks)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+
+    state.check_invariants()
+    total = 0
+    for number in range(CONTRACTORS):
+        login = f'ivan{number}'
+        accepted = [order for order in state.get_orders(login) if order.accepted]
+        # Повторное нажатие не начисляет сумму второй раз
+        assert state.get_entrepreneur_balance(login) == BUDGET * len(accepted)
+        assert all(order.timer_active for order in accepted)
+        total += len(accepted)
+    assert total > 0
+    owners = [state.get_entrepreneur_by_chat_id(100 + number) for number in range(CONTRACTORS)]
+    assert len({owner for owner in owners if owner}) == len([owner for owner in owners if owner])
@@ -0,0 +1,37 @@
+# test_keyboards.py
+import pytest
+from telegram import InlineKeyboardMarkup
+
+import keyboards
+
+
+def static_menus():
+    return {name: value for name, value in vars(keyboards).items() if isinstance(value, InlineKeyboardMarkup)}
+
+
+def test_every_button_has_a_route():
+    import button_handler  # noqa: F401 - регистрирует маршруты бота
+    from router import callback_router
+
+    menus = static_menus()
+    menus['entrepreneur_actions'] = keyboards.entrepreneur_actions_keyboard('ivan_1')
+    menus['open_chat'] = keyboards.open_chat_keyboard('anna_ivan_1700000000', 'client')
+    for name, menu in menus.items():
+        for row in menu.inline_keyboard:
+            for button in row:
+                assert callback_router.resolve(button.callback_data) is not None, (name, button.callback_data)
+
+
+def test_parametrized_keyboards_are_cached():
+    assert keyboards.entrepreneur_actions_keyboard('ivan') is keyboards.entrepreneur_actions_keyboard('ivan')
+    assert keyboards.open_chat_keyboard('1', 'client') is not keyboards.open_chat_keyboard('1', 'contractor')
+    assert [button.text for row in keyboards.open_chat_keyboard('1', 'contractor').inline_keyboard
+            for button in row] == ["💬 Чат с исполнителем"]
+
+
+def test_shared_menus_are_frozen():
+    # Одна клавиатура отправляется из всех обработчиков: изменить её нельзя
+    with pytest.raises(AttributeError):
+        keyboards.START_MENU.inline_keyboard = ()
+    with pytest.raises(AttributeError):
+        keyboards.START_MENU.inline_keyboard[0][0].callback_data = 'admin_back'
@@ -0,0 +1,176 @@
+# test_locks.py
+import asyncio
+import random
+
+from locks import EntityLocks, WriteBarrier
+
+
+def test_same_key_is_serialized():
+    async def main():
+        locks = EntityLocks()
+        balance = {'ivan': 0}
+
+        async def deposit():
+            async with locks.hold(('contractor', 'ivan')):
+                value = balance['ivan']
+                await asyncio.sleep(0)
+                balance['ivan'] = value + 1
+
+        await asyncio.gather(*(deposit() for _ in range(100)))
+        assert balance['ivan'] == 100
+        assert len(locks) == 0
+
+    asyncio.run(main())
+
+
+def test_different_keys_run_in_parallel():
+    async def main():
+        locks = EntityLocks()
+        inside = asyncio.Event()
+
+        async def first():
+            async with locks.hold(('client', 'anna')):
+                await inside.wait()
+
+        async def second():
+            async with locks.hold(('client', 'vera')):
+                inside.set()
+
+        await asyncio.wait_for(asyncio.gather(first(), second()), 1)
+
+    asyncio.run(main())
+
+
+def test_key_order_prevents_deadlock():
+    async def main():
+        locks = EntityLocks()
+
+        async def transfer(*keys):
+            async with locks.hold(*keys):
+                await asyncio.sleep(0)
+
+        a, b = ('contractor', 'ivan'), ('client', 'anna')
+        await asyncio.wait_for(asyncio.gather(*(transfer(a, b) if n % 2 else transfer(b, a) for n in range(50))), 1)
+        assert len(locks) == 0
+
+    asyncio.run(main())
+
+
+def test_none_keys_are_skipped():
+    async def main():
+        locks = EntityLocks()
+        async with locks.hold(None, ('chat', '1'), None):
+            assert locks.locked(('chat', '1'))
+            assert len(locks) == 1
+        assert not locks.locked(('chat', '1'))
+
+    asyncio.run(main())
+
+
+def test_snapshot_waits_for_sections_and_blocks_new_ones():
+    async def main():
+        barrier = WriteBarrier()
+        locks = EntityLocks(barrier)
+        events = []
+        release = asyncio.Event()
+
+        async def long_change():
+            async with locks.hold(('client', 'anna')):
+                events.append('change started')
+                await release.wait()
+                events.append('change finished')
+
+        async def snapshot():
+            async with barrier.snapshot():
+                events.append('snapshot')
+
+        async def late_change():
+            async with locks.hold(('client', 'vera')):
+                events.append('late change')
+
+        change = asyncio.create_task(long_change())
+        await asyncio.sleep(0)
+        snap = asyncio.create_task(snapshot())
+        await asyncio.sleep(0)
+        late = asyncio.create_task(late_change())
+        await asyncio.sleep(0)
+        assert events == ['change started']
+        release.set()
+        await asyncio.gather(change, snap, late)
+        assert events == ['change started', 'change finished', 'snapshot', 'late change']
+
+    asyncio.run(main())
+
+
+def test_lock_waiter_is_not_a_section():
+    async def main():
+        barrier = WriteBarrier()
+        locks = EntityLocks(barrier)
+        release = asyncio.Event()
+
+        async def holder():
+            async with locks.hold(('client', 'anna')):
+                await release.wait()
+
+        async def waiter():
+            async with locks.hold(('client', 'anna')):
+                pass
+
+        tasks = [asyncio.create_task(holder()), asyncio.create_task(waiter())]
+        await asyncio.sleep(0)
+        assert barrier.sections == 1
+        release.set()
+        await asyncio.gather(*tasks)
+        assert barrier.sections == 0
+
+    asyncio.run(main())
+
+
+def test_serial_keeps_order_and_skips_barrier():
+    async def main():
+        barrier = WriteBarrier()
+        locks = EntityLocks(barrier)
+        order = []
+
+        async def update(number):
+            async with locks.serial(('user', 1)):
+                assert barrier.sections == 0
+                await asyncio.sleep(random.random() / 1000)
+                order.append(number)
+
+        await asyncio.gather(*(update(number) for number in range(20)))
+        assert order == list(range(20))
+
+    asyncio.run(main())
+
+
+def test_stress_no_lost_updates():
+    async def main():
+        barrier = WriteBarrier()
+        locks = EntityLocks(barrier)
+        balances = {login: 0 for login in ('a', 'b', 'c', 'd')}
+        snapshots = []
+        random.seed(1)
+
+        async def transfer():
+            source, target = random.sample(sorted(balances), 2)
+            async with locks.hold(('contractor', source), ('contractor', target)):
+                amount = balances[source]
+                await asyncio.sleep(0)
+                balances[source] = amount - 1
+                await asyncio.sleep(0)
+                balances[target] += 1
+
+        async def snapshot():
+            for _ in range(50):
+                async with barrier.snapshot():
+                    snapshots.append(sum(balances.values()))
+                await asyncio.sleep(0)
+
+        await asyncio.gather(snapshot(), *(transfer() for _ in range(2000)))
+        # Перевод не теряется, и снимок никогда не видит его наполовину выполненным
+        assert sum(balances.values()) == 0
+        assert set(snapshots) == {0}
+        assert len(locks) == 0 and barrier.sections == 0
+
+    asyncio.run(main())
@@ -0,0 +1,185 @@
+# test_media.py
+import asyncio
+import itertools
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from telegram import Bot
+
+import media
+from state_manager import UserState
+
+BAD_URL = 'https://example.com/broken.jpg'
+
+
+class FakeBotApi(ThreadingHTTPServer):
+    """
+    Bot API на localhost: отправленное по ссылке фото получает file_id 'FID-<имя файла>',
+    фото по file_id возвращается с тем же file_id. Запросы записываются в calls.
+    """
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _FakeBotApiHandler)
+        self.calls = []
+        self.message_ids = itertools.count(1)
+
+    def photo_message(self, chat_id, photo):
+        if photo == BAD_URL:
+            return None
+        file_id = f"FID-{photo.rsplit('/', 1)[-1]}" if media.is_url(photo) else photo
+        return {'message_id': next(self.message_ids), 'date': int(time.time()),
+                'chat': {'id': int(chat_id), 'type': 'private'},
+                'photo': [{'file_id': f'{file_id}-small', 'file_unique_id': f'U{file_id}-small', 'width': 90,
+                           'height': 90},
+                          {'file_id': file_id, 'file_unique_id': f'U{file_id}', 'width': 800, 'height': 600}]}
+
+    def sent_photos(self):
+        photos = []
+        for method, params in self.calls:
+            if method == 'sendPhoto':
+                photos.append(params['photo'])
+            elif method == 'sendMediaGroup':
+                photos.extend(item['media'] for item in params['media'])
+        return photos
+
+
+class _FakeBotApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if 'json' in self.headers.get('Content-Type', ''):
+            params = json.loads(body or b'{}')
+        else:
+            params = {key: value[0] for key, value in urllib.parse.parse_qs(body.decode()).items()}
+        if isinstance(params.get('media'), str):
+            params['media'] = json.loads(params['media'])
+        method = self.path.rsplit('/', 1)[-1]
+        self.server.calls.append((method, params))
+
+        result = True
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'bot', 'username': 'bot'}
+        elif method == 'sendPhoto':
+            result = self.server.photo_message(params['chat_id'], params['photo'])
+        elif method == 'sendMediaGroup':
+            result = [self.server.photo_message(params['chat_id'], item['media']) for item in params['media']]
+            result = None if None in result else result
+        if result is None:
+            self._reply(400, {'ok': False, 'error_code': 400,
+                              'description': 'Bad Request: failed to get HTTP URL content'})
+        else:
+            self._reply(200, {'ok': True, 'result': result})
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def api():
+    server = FakeBotApi()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def portfolio(state, monkeypatch):
+    monkeypatch.setattr(media, 'user_state', state)
+    item = state.add_portfolio_item('sites', 'Сайт', 'Описание', ['https://example.com/a.jpg',
+                                                                    'https://example.com/b.jpg', 'AgACfile'])
+    return state, item
+
+
+def run_with_bot(api, scenario):
+    async def main():
+        async with Bot('123:TEST', base_url=f'http://127.0.0.1:{api.server_port}/bot') as bot:
+            return await scenario(bot)
+
+    return asyncio.run(main())
+
+
+def test_url_is_sent_once_then_file_id(api, portfolio):
+    state, item = portfolio
+    source = item.images[0]
+    assert media.pending_upload(item, source) == source
+
+    async def scenario(bot):
+        await media.upload(bot, 7, 'sites', item, source)
+        await bot.send_photo(chat_id=7, photo=media.photo_for(item, source))
+
+    run_with_bot(api, scenario)
+    assert api.sent_photos() == [source, 'FID-a.jpg']
+    assert media.pending_upload(item, source) is None
+    # Запоминается самый большой размер фото
+    assert item.media[source] == {'file_id': 'FID-a.jpg', 'file_unique_id': 'UFID-a.jpg'}
+    assert UserState(state.filename, backend='json').portfolio_items['sites'][0].media == item.media
+
+
+def test_album_promotes_every_url(api, portfolio):
+    state, item = portfolio
+    photos = [media.photo_for(item, image) for image in item.images]
+    uploads = [media.pending_upload(item, image) for image in item.images]
+    assert uploads == [item.images[0], item.images[1], None]
+
+    messages = run_with_bot(api, lambda bot: media.send_album(bot, 7, 'sites', item, photos, uploads, caption='Сайт'))
+    assert len(messages) == 3
+    assert api.calls[-1][1]['media'][0]['caption'] == 'Сайт'
+    assert [media.photo_for(item, image) for image in item.images] == ['FID-a.jpg', 'FID-b.jpg', 'AgACfile']
+    assert media.find_pending() == []
+
+
+def test_backfill_uploads_pending_and_reports_failures(api, portfolio):
+    state, item = portfolio
+    item.images.append(BAD_URL)
+
+    stats = run_with_bot(api, lambda bot: media.backfill(bot, 7, interval=0))
+    assert stats == {'uploaded': 2, 'failed': 1, 'skipped': 0}
+    assert [method for method, _ in api.calls].count('deleteMessage') == 2
+    assert media.find_pending() == [('sites', item, BAD_URL)]
+
+
+def test_deleted_item_is_not_updated(api, portfolio):
+    state, item = portfolio
+    state.delete_portfolio_item('sites', 0)
+    run_with_bot(api, lambda bot: media.upload(bot, 7, 'sites', item, item.images[0]))
+    assert item.media is None
+
+
+def test_short_caption_is_kept():
+    assert media.split_caption('Сайт\nОписание', limit=100) == ('Сайт\nОписание', '')
+    assert media.split_caption('x' * 100, limit=100) == ('x' * 100, '')
+
+
+def test_caption_is_split_at_line_break():
+    text = 'Заголовок\nпервая строка\nhttps://example.com/very/long/link'
+    caption, rest = media.split_caption(text, limit=30)
+    assert caption == 'Заголовок\nпервая строка'
+    assert rest == 'https://example.com/very/long/link'
+
+
+def test_caption_falls_back_to_space_then_hard_cut():
+    assert media.split_caption('один два три четыре', limit=10) == ('один два', 'три четыре')
+    assert media.split_caption('x' * 25, limit=10) == ('x' * 10, 'x' * 15)
+    # Перенос в самом начале не даёт пустой подписи
+    assert media.split_caption('\n' + 'x' * 25, limit=10)[0] == '\n' + 'x' * 9
+
+
+def test_caption_fits_telegram_limit():
+    text = ('Строка описания работы\n' * 100).strip()
+    caption, rest = media.split_caption(text)
+    assert len(caption) <= 1024
+    assert caption + '\n' + rest == text
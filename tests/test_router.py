@@ -0,0 +1,117 @@
+# test_router.py
+import asyncio
+
+import pytest
+
+from router import CallbackRouter
+
+
+async def handler(update, context, **kwargs):
+    return None
+
+
+def make_router():
+    router = CallbackRouter(cache_size=16)
+    router.add('admin_back', handler)
+    router.add('entrepreneur', handler)
+    router.add('entrepreneur_{login}', handler)
+    router.add('portfolio_item_{category:category}_{index:int}', handler)
+    router.add('portfolio_photo_{category:category}_{index:int}_{photo:int}', handler)
+    router.add('portfolio_{section}', handler)
+    router.add('accept_order_{customer_id:int}', handler, action='accept')
+    return router
+
+
+def resolved(router, data):
+    result = router.resolve(data)
+    return None if result is None else (result[0].pattern, result[1])
+
+
+def test_exact_routes():
+    router = make_router()
+    assert resolved(router, 'admin_back') == ('admin_back', {})
+    assert resolved(router, 'entrepreneur') == ('entrepreneur', {})
+    assert resolved(router, 'admin') is None
+    assert resolved(router, 'admin_back_') is None
+
+
+def test_typed_arguments():
+    router = make_router()
+    assert resolved(router, 'portfolio_item_sites_3') == \
+           ('portfolio_item_{category:category}_{index:int}', {'category': 'sites', 'index': 3})
+    assert resolved(router, 'portfolio_photo_video_0_-1') == \
+           ('portfolio_photo_{category:category}_{index:int}_{photo:int}',
+            {'category': 'video', 'index': 0, 'photo': -1})
+    assert resolved(router, 'accept_order_12345') == ('accept_order_{customer_id:int}', {'customer_id': 12345})
+
+
+def test_invalid_arguments_are_rejected():
+    router = make_router()
+    assert resolved(router, 'accept_order_12a') is None
+    assert resolved(router, 'accept_order_١٢') is None
+    assert resolved(router, 'accept_order_') is None
+    assert resolved(router, 'accept_order_1 ') is None
+
+
+def test_last_string_argument_takes_the_rest():
+    router = make_router()
+    assert resolved(router, 'entrepreneur_ivan_petrov') == ('entrepreneur_{login}', {'login': 'ivan_petrov'})
+    assert resolved(router, 'entrepreneur_') is None
+
+
+def test_falls_back_to_shorter_prefix():
+    router = make_router()
+    # 'portfolio_item_' не разобрался (нет такой категории) - подходит 'portfolio_{section}'
+    assert resolved(router, 'portfolio_item_music_1') == ('portfolio_{section}', {'section': 'item_music_1'})
+    assert resolved(router, 'portfolio_menu') == ('portfolio_{section}', {'section': 'menu'})
+
+
+def test_cached_arguments_are_not_shared():
+    router = make_router()
+    first = router.resolve('portfolio_item_sites_1')[1]
+    first['index'] = 99
+    assert router.resolve('portfolio_item_sites_1')[1] == {'category': 'sites', 'index': 1}
+
+
+def test_invalid_registrations():
+    router = make_router()
+    with pytest.raises(ValueError):
+        router.add('admin_back', handler)
+    with pytest.raises(ValueError):
+        router.add('entrepreneur_{name}', handler)
+    with pytest.raises(ValueError):
+        router.add('item{index:int}', handler)
+    with pytest.raises(ValueError):
+        router.add('item_{index:float}', handler)
+    with pytest.raises(ValueError):
+        router.add('order_{action}', handler, action='accept')
+
+
+def test_dispatch_passes_kwargs_and_arguments():
+    router = CallbackRouter()
+    calls = []
+
+    @router.route('accept_order_{customer_id:int}', action='accept')
+    @router.route('decline_order_{customer_id:int}', action='decline')
+    async def respond(update, context, customer_id, action):
+        calls.append((update, context, customer_id, action))
+
+    assert asyncio.run(router.dispatch('decline_order_7', 'update', 'context'))
+    assert asyncio.run(router.dispatch('accept_order_8', 'update', 'context'))
+    assert not asyncio.run(router.dispatch('cancel_order_9', 'update', 'context'))
+    assert calls == [('update', 'context', 7, 'decline'), ('update', 'context', 8, 'accept')]
+
+
+def test_bot_routes():
+    import button_handler
+    from router import callback_router
+
+    def handler_name(data):
+        return callback_router.resolve(data)[0].handler.__name__
+
+    assert len(callback_router.routes) > 40
+    assert handler_name('delete_entrepreneur_ivan_1') != handler_name('delete_item_sites_1')
+    assert callback_router.resolve('delete_entrepreneur_ivan_1')[1] == {'login': 'ivan_1'}
+    assert callback_router.resolve('portfolio_photo_sites_2_1')[1] == {'category': 'sites', 'index': 2, 'photo': 1}
+    assert callback_router.resolve('client_order_history_x') is None
+    assert button_handler.callback_router is callback_router
@@ -0,0 +1,105 @@
+# test_state_indexes.py
+import json
+
+import pytest
+
+from models import Order
+from state_manager import UserState
+
+
+def test_chat_id_lookup(state):
+    state.register_entrepreneur('ivan', 'p', chat_id=10)
+    state.register_client('anna', 'p', chat_id=20)
+    assert state.get_entrepreneur_by_chat_id(10) == 'ivan'
+    assert state.get_client_by_chat_id(20) == 'anna'
+    assert state.get_entrepreneur_by_chat_id(20) is None
+    assert state.get_client_by_chat_id(10) is None
+
+    state.remove_entrepreneur_chat_id('ivan')
+    state.remove_client_chat_id('anna')
+    assert state.get_entrepreneur_by_chat_id(10) is None
+    assert state.get_client_by_chat_id(20) is None
+    state.check_invariants()
+
+
+def test_login_takes_chat_id_from_previous_owner(state):
+    state.register_entrepreneur('ivan', 'p', chat_id=10)
+    state.register_entrepreneur('petr', 'p')
+    assert state.set_entrepreneur_chat_id('petr', 10)
+    assert state.get_entrepreneur_by_chat_id(10) == 'petr'
+    assert state.entrepreneurs['ivan'].chat_id is None
+    assert state.get_available_entrepreneurs(10) == ['petr']
+
+    state.register_client('anna', 'p', chat_id=20)
+    state.register_client('vera', 'p', chat_id=20)
+    assert state.get_client_by_chat_id(20) == 'vera'
+    assert state.clients['anna'].chat_id is None
+    assert state.set_client_chat_id('anna', 20)
+    assert state.get_client_by_chat_id(20) == 'anna'
+    assert state.clients['vera'].chat_id is None
+    state.check_invariants()
+
+
+def test_takeover_is_persisted(state):
+    state.register_client('anna', 'p', chat_id=20)
+    state.register_client('vera', 'p')
+    state.set_client_chat_id('vera', 20)
+
+    reloaded = UserState(state.filename, persistence_mode='durable', backend='json')
+    assert reloaded.get_client_by_chat_id(20) == 'vera'
+    assert reloaded.clients['anna'].chat_id is None
+
+
+def test_legacy_duplicates_resolve_in_storage_order(tmp_path):
+    filename = str(tmp_path / 'data.json')
+    clients = {login: {'password': 'p', 'status': 'active', 'created_at': '2024-01-01T00:00:00', 'chat_id': 20}
+               for login in ('vera', 'anna')}
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump({'clients': clients}, f)
+
+    state = UserState(filename, persistence_mode='durable', backend='json')
+    # Как при прежнем переборе словаря: первый в порядке хранения
+    assert state.get_client_by_chat_id(20) == 'vera'
+    state.check_invariants()
+
+
+def test_order_id_survives_archiving(state):
+    state.register_entrepreneur('ivan', 'p', chat_id=10)
+    first, second = (Order(description=f'Заказ {number}', client_login='anna', client_chat_id=20, accepted=True)
+                     for number in range(2))
+    state.add_order('ivan', first)
+    state.add_order('ivan', second)
+    chat = state.create_chat('anna', 20, 'ivan', 10, second.order_id)
+
+    # После архивации первого заказа второй сдвигается на его место, а идентификатор остаётся прежним
+    state.drop_archived([('orders', 'ivan', first)])
+    third = Order(description='Заказ 3', client_login='anna', client_chat_id=20)
+    state.add_order('ivan', third)
+    assert state.get_orders('ivan') == [second, third]
+    assert state.create_chat('anna', 20, 'ivan', 10, third.order_id) != chat
+    assert state.active_chats[chat].order_id == second.order_id
+    state.check_invariants()
+
+
+def test_legacy_orders_get_persisted_ids(tmp_path):
+    filename = str(tmp_path / 'data.json')
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump({'orders': {'ivan': [{'description': 'Заказ 1'}, 'Заказ 2']}}, f)
+
+    state = UserState(filename, persistence_mode='durable', backend='json')
+    assert [order.order_id for order in state.get_orders('ivan')] == ['0', '1']
+    state.flush_sync()
+    with open(filename, encoding='utf-8') as f:
+        assert [order['order_id'] for order in json.load(f)['orders']['ivan']] == ['0', '1']
+
+
+def test_client_orders_are_snapshots(state):
+    state.add_order('ivan', Order(description='Заказ', client_login='anna', client_chat_id=20))
+    [snapshot] = state.get_client_orders('anna')
+    with pytest.raises(AttributeError):
+        snapshot.accepted = True
+
+    state.accept_order('ivan', 0)
+    assert not snapshot.accepted
+    [current] = state.get_client_orders('anna')
+    assert current.accepted and current.contractor_login == 'ivan' and current.timer_end is None
@@ -0,0 +1,101 @@
+# test_storage_journal.py
+import json
+
+from storage import JournalStorage, encode_json
+
+
+def make_storage(tmp_path, compact_bytes=1024 * 1024, snapshot_format='json'):
+    return JournalStorage(str(tmp_path / 'data.json'), compact_bytes=compact_bytes,
+                          snapshot_format=snapshot_format)
+
+
+def write_changes(storage, data, changes):
+    storage.write(storage.encode_changes(data, changes))
+
+
+def test_replay_applies_journal_to_snapshot(tmp_path):
+    storage = make_storage(tmp_path)
+    data = {'clients': {'anna': {'password': '1'}, 'boris': {'password': '2'}}}
+    write_changes(storage, data, None)
+
+    data['clients']['anna'] = {'password': 'new'}
+    del data['clients']['boris']
+    data['clients']['vera'] = {'password': '3'}
+    write_changes(storage, data, {'clients': {'anna', 'boris', 'vera'}})
+
+    stats = {}
+    loaded = make_storage(tmp_path).load(stats)
+    assert loaded == data
+    assert stats['replayed'] == 3
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    storage = make_storage(tmp_path)
+    data = {'clients': {'anna': {'password': '1'}}}
+    write_changes(storage, data, None)
+    data['clients']['boris'] = {'password': '2'}
+    write_changes(storage, data, {'clients': {'boris'}})
+
+    journal = tmp_path / 'data.json.journal'
+    whole = journal.read_bytes()
+    # Сбой посреди записи: вторая запись оборвана без перевода строки
+    torn = encode_json({'c': 'clients', 'k': 'vera', 'v': {'password': '3'}}).encode('utf-8')[:-5]
+    journal.write_bytes(whole + torn)
+
+    reloaded = make_storage(tmp_path)
+    stats = {}
+    assert reloaded.load(stats) == data
+    assert stats['replayed'] == 1
+    assert journal.read_bytes() == whole
+
+    # Следующая запись дописывается после целой части журнала
+    data['clients']['gleb'] = {'password': '4'}
+    write_changes(reloaded, data, {'clients': {'gleb'}})
+    assert make_storage(tmp_path).load({}) == data
+
+
+def test_corrupt_record_stops_replay(tmp_path):
+    storage = make_storage(tmp_path)
+    data = {'clients': {'anna': {'password': '1'}}}
+    write_changes(storage, data, None)
+
+    journal = tmp_path / 'data.json.journal'
+    journal.write_bytes(b'{"c":"clients","k":"boris","v":{}}\nnot json\n{"c":"clients","k":"vera","v":{}}\n')
+
+    stats = {}
+    loaded = make_storage(tmp_path).load(stats)
+    assert set(loaded['clients']) == {'anna', 'boris'}
+    assert stats['replayed'] == 1
+    assert journal.read_bytes() == b'{"c":"clients","k":"boris","v":{}}\n'
+
+
+def test_compaction_folds_journal_into_snapshot(tmp_path):
+    for snapshot_format in ('json', 'binary'):
+        directory = tmp_path / snapshot_format
+        directory.mkdir()
+        storage = make_storage(directory, compact_bytes=200, snapshot_format=snapshot_format)
+        data = {'clients': {}}
+        write_changes(storage, data, None)
+
+        kinds = []
+        for number in range(20):
+            data['clients'][f'client{number}'] = {'password': str(number)}
+            kind, body = storage.encode_changes(data, {'clients': {f'client{number}'}})
+            kinds.append(kind)
+            storage.write((kind, body))
+
+        assert 'compact' in kinds
+        journal = directory / 'data.json.journal'
+        assert journal.stat().st_size < 200
+        assert storage._journal_size == journal.stat().st_size
+        loaded = make_storage(directory, snapshot_format=snapshot_format).load({})
+        assert loaded['clients'] == data['clients']
+
+
+def test_journal_records_are_json_lines(tmp_path):
+    storage = make_storage(tmp_path)
+    data = {'clients': {'anna': {'password': '1'}}}
+    kind, body = storage.encode_changes(data, {'clients': {'anna', 'gone'}})
+    assert kind == 'journal'
+    records = sorted((json.loads(line) for line in body.decode('utf-8').splitlines()), key=lambda r: r['k'])
+    assert records == [{'c': 'clients', 'k': 'anna', 'v': {'password': '1'}}, {'c': 'clients', 'k': 'gone'}]
@@ -0,0 +1,113 @@
+# test_updates.py
+import asyncio
+import random
+from datetime import datetime
+
+import pytest
+from telegram import Chat, Message, Update, User
+
+from updates import OrderedUpdateProcessor, UpdateQueue
+
+
+def make_update(update_id, user_id, text):
+    message = Message(update_id, datetime.now(), Chat(user_id, Chat.PRIVATE), from_user=User(user_id, 'user', False),
+                      text=text)
+    return Update(update_id, message=message)
+
+
+def test_updates_of_one_user_keep_order():
+    async def main():
+        processor = OrderedUpdateProcessor(concurrency=8, max_pending=100)
+        handled = {}
+        running = [0, 0]
+
+        async def handle(update):
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+            await asyncio.sleep(random.random() / 1000)
+            handled.setdefault(update.effective_user.id, []).append(int(update.message.text))
+            running[0] -= 1
+
+        updates = [make_update(number, number % 5, str(number // 5)) for number in range(100)]
+        await asyncio.gather(*(processor.process_update(update, handle(update)) for update in updates))
+        assert handled == {user_id: list(range(20)) for user_id in range(5)}
+        # Одновременно обрабатывается не больше одного обновления на пользователя
+        assert running[1] <= 5
+        assert processor.pending == 0 and processor.queued == 0
+
+    asyncio.run(main())
+
+
+def test_concurrency_limit():
+    async def main():
+        processor = OrderedUpdateProcessor(concurrency=3, max_pending=100)
+        running = [0, 0]
+
+        async def handle():
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+            await asyncio.sleep(0.001)
+            running[0] -= 1
+
+        await asyncio.gather(*(processor.process_update(make_update(number, number, 'x'), handle())
+                               for number in range(20)))
+        assert running[1] == 3
+
+    asyncio.run(main())
+
+
+def test_queue_limits_updates_taken_into_processing():
+    async def main():
+        processor = OrderedUpdateProcessor(concurrency=2, max_pending=4)
+        queue = UpdateQueue(processor)
+        release = asyncio.Event()
+        tasks = []
+
+        async def handle():
+            await release.wait()
+
+        async def fetch():
+            # Как Application._update_fetcher: задача на каждое выбранное обновление
+            while True:
+                update = await queue.get()
+                tasks.append(asyncio.create_task(processor.process_update(update, handle())))
+
+        for number in range(20):
+            queue.put_nowait(make_update(number, number, 'x'))
+        fetcher = asyncio.create_task(fetch())
+        await asyncio.sleep(0.01)
+        # В обработке 4 обновления, пятое ждёт места: остальные остаются в очереди, а не копятся задачами
+        assert len(tasks) == 4
+        assert processor.pending == 4
+        assert queue.qsize() == 15
+
+        release.set()
+        while len(tasks) < 20 or not all(task.done() for task in tasks):
+            await asyncio.sleep(0.001)
+        fetcher.cancel()
+        assert processor.pending == 0
+
+    asyncio.run(main())
+
+
+def test_bounded_queue_blocks_producer():
+    async def main():
+        processor = OrderedUpdateProcessor(concurrency=2, max_pending=2)
+        queue = UpdateQueue(processor, maxsize=processor.max_pending)
+        queue.put_nowait(make_update(1, 1, 'x'))
+        queue.put_nowait(make_update(2, 2, 'x'))
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(queue.put(make_update(3, 3, 'x')), 0.01)
+
+    asyncio.run(main())
+
+
+def test_updates_without_user_are_not_ordered():
+    processor = OrderedUpdateProcessor(concurrency=2, max_pending=10, ordering='chat')
+    assert processor.ordering_key(object()) is None
+    assert processor.ordering_key(make_update(1, 42, 'x')) == 42
+
+
+def test_unknown_ordering_is_rejected():
+    with pytest.raises(ValueError):
+        OrderedUpdateProcessor(ordering='order')
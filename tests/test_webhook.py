@@ -0,0 +1,83 @@
+# test_webhook.py
+import asyncio
+import json
+
+from webhook import SECRET_HEADER, WebhookServer
+
+UPDATE = json.dumps({'update_id': 1, 'message': {'message_id': 1, 'date': 0, 'text': 'hi',
+                                                 'chat': {'id': 5, 'type': 'private'}}}).encode('utf-8')
+
+
+async def request(port, body=UPDATE, method='POST', path='/telegram', secret='secret'):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bot\r\n{SECRET_HEADER}: {secret}\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    writer.close()
+    return status
+
+
+def serve(scenario, max_pending=10, max_body=1024):
+    async def main():
+        queue = asyncio.Queue()
+        server = WebhookServer(None, queue.put, queue.qsize, 'secret', listen='127.0.0.1', port=0,
+                               max_pending=max_pending, max_body=max_body)
+        await server.start()
+        try:
+            return await scenario(server._server.sockets[0].getsockname()[1], queue, server)
+        finally:
+            await server.stop()
+
+    return asyncio.run(main())
+
+
+def test_update_is_enqueued():
+    async def scenario(port, queue, server):
+        assert await request(port) == 200
+        update = queue.get_nowait()
+        assert update.update_id == 1 and update.effective_chat.id == 5
+        assert server.stats['accepted'] == 1
+
+    serve(scenario)
+
+
+def test_rejected_requests():
+    async def scenario(port, queue, server):
+        assert await request(port, secret='wrong') == 403
+        assert await request(port, path='/other') == 404
+        assert await request(port, method='GET', body=b'') == 405
+        assert await request(port, body=b'not json') == 400
+        assert await request(port, body=b'x' * 2048) == 413
+        assert queue.empty()
+        assert server.stats['forbidden'] == 1 and server.stats['invalid'] == 1
+
+    serve(scenario)
+
+
+def test_full_backlog_answers_503():
+    async def scenario(port, queue, server):
+        assert await request(port) == 200
+        assert await request(port) == 200
+        assert await request(port) == 503
+        queue.get_nowait()
+        assert await request(port) == 200
+        assert server.stats['rejected'] == 1
+
+    serve(scenario, max_pending=2)
+
+
+def test_keep_alive_connection_serves_several_requests():
+    async def scenario(port, queue, server):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        for _ in range(3):
+            writer.write(f"POST /telegram HTTP/1.1\r\nHost: bot\r\n{SECRET_HEADER}: secret\r\n"
+                         f"Content-Length: {len(UPDATE)}\r\n\r\n".encode('latin-1') + UPDATE)
+            await writer.drain()
+            assert (await reader.readline()).startswith(b'HTTP/1.1 200')
+            while (await reader.readline()) != b'\r\n':
+                pass
+        writer.close()
+        assert queue.qsize() == 3
+
+    serve(scenario)
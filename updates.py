@@ -0,0 +1,124 @@
+# updates.py
+import asyncio
+import logging
+from typing import Any, Awaitable, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from config import CONCURRENT_UPDATES, MAX_PENDING_UPDATES, UPDATE_ORDERING
+from locks import EntityLocks
+
+logger = logging.getLogger(__name__)
+
+
+class OrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений с очередью на пользователя (или чат).
+    Обновления разных пользователей обрабатываются одновременно, не больше concurrency за раз;
+    обновления одного пользователя - по одному в порядке поступления, чтобы шаги диалога не перемешивались.
+    Обновление, ждущее своей очереди, не занимает место обрабатываемого: общее число принятых обновлений
+    (обрабатываемые + ждущие) ограничивает max_pending. Application создаёт задачу на каждое выбранное
+    из очереди обновление, поэтому ограничение действует на стороне выборки: UpdateQueue не отдаёт
+    следующее обновление, пока принятых max_pending (см. reserve).
+    """
+
+    def __init__(self, concurrency: int = CONCURRENT_UPDATES, max_pending: int = MAX_PENDING_UPDATES,
+                 ordering: str = UPDATE_ORDERING):
+        if ordering not in ('user', 'chat'):
+            raise ValueError(f"Неизвестный порядок обработки обновлений: {ordering}")
+        super().__init__(max(max_pending, concurrency))
+        self.concurrency = concurrency
+        self.max_pending = max(max_pending, concurrency)
+        self.ordering = ordering
+        self._running = asyncio.BoundedSemaphore(concurrency)
+        self._queues = EntityLocks()
+        self._pending = 0
+        # Места, занятые reserve() под выбранные из очереди обновления, которые ещё не переданы в process_update
+        self._reserved = 0
+        self._capacity = asyncio.Event()
+
+    def ordering_key(self, update: Any) -> Optional[Hashable]:
+        """Ключ очереди обновления; None - обновление ни с кем не упорядочивается"""
+        if not isinstance(update, Update):
+            return None
+        if self.ordering == 'user' and update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    @property
+    def queued(self) -> int:
+        """Количество пользователей (чатов), у которых обновление обрабатывается или ждёт очереди"""
+        return len(self._queues)
+
+    @property
+    def pending(self) -> int:
+        """Количество обновлений, переданных в обработку и ещё не обработанных (включая ждущие)"""
+        return self._pending
+
+    async def reserve(self) -> None:
+        """Ждёт, пока принятых обновлений станет меньше max_pending, и занимает место под следующее"""
+        while self._pending >= self.max_pending:
+            self._capacity.clear()
+            await self._capacity.wait()
+        self._pending += 1
+        self._reserved += 1
+
+    async def process_update(self, update: Any, coroutine: Awaitable[Any]) -> None:
+        if self._reserved:
+            self._reserved -= 1
+        else:
+            # Обновление передано в обработку напрямую, минуя UpdateQueue
+            self._pending += 1
+        try:
+            await super().process_update(update, coroutine)
+        finally:
+            self._pending -= 1
+            self._capacity.set()
+
+    async def do_process_update(self, update: Any, coroutine: Awaitable[Any]) -> None:
+        async with self._queues.serial(self.ordering_key(update)):
+            async with self._running:
+                await coroutine
+
+    async def initialize(self) -> None:
+        logger.info("Параллельная обработка обновлений: до %d одновременно, очередь по '%s', принимается до %d",
+                    self.concurrency, self.ordering, self.max_concurrent_updates)
+
+    async def shutdown(self) -> None:
+        pass
+
+
+class UpdateQueue(asyncio.Queue):
+    """
+    Очередь обновлений приложения: следующее обновление выбирается, только когда у обработчика есть место
+    (OrderedUpdateProcessor.reserve), - при всплеске обновления ждут в очереди, а не копятся задачами.
+    С maxsize очередь ограничена и со стороны поступления: long polling не запрашивает новые обновления,
+    пока очередь заполнена, и они остаются на стороне Telegram.
+    Сигнал остановки приложения тоже занимает место: после него обновления уже не выбираются.
+    """
+
+    def __init__(self, processor: OrderedUpdateProcessor, maxsize: int = 0):
+        super().__init__(maxsize)
+        self.processor = processor
+
+    async def get(self) -> Any:
+        update = await super().get()
+        await self.processor.reserve()
+        return update
+
+
+def update_backlog(application) -> int:
+    """Количество принятых приложением и ещё не обработанных обновлений"""
+    processor = application.update_processor
+    pending = processor.pending if isinstance(processor, OrderedUpdateProcessor) else 0
+    return application.update_queue.qsize() + pending
+
+
+def create_update_processor() -> Optional[OrderedUpdateProcessor]:
+    """Создаёт обработчик обновлений по настройкам; None - обновления обрабатываются по одному"""
+    if CONCURRENT_UPDATES <= 1:
+        return None
+    return OrderedUpdateProcessor()
@@ -104,16 +104,35 @@ def format_time_remaining(end_time: datetime) -> str:
         return f"⏱ Осталось: {minutes} мин."
 
 
+def parse_datetime(value) -> datetime:
+    """Приводит дату из данных (datetime или строка ISO после загрузки из файла) к datetime"""
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
 def is_order_expired(end_time: datetime) -> bool:
     """Проверяет, истек ли срок заказа"""
     return datetime.now() >= end_time
 
 
-def get_user_role_in_chat(user_chat_id: int, chat_data: dict) -> str:
+def format_archived_order(number: int, order, partner_title: str, partner: str, archived_at: datetime) -> str:
+    """Форматирует заказ из архива для истории заказов"""
+    if order.expired:
+        status = "⏰ Срок истёк"
+    elif order.accepted:
+        status = "✅ Завершён"
+    else:
+        status = "❌ Не принят"
+    created = order.created_at.strftime('%d.%m.%Y') if order.created_at else '—'
+    return (f"{number}. {order.description or 'Описание отсутствует'}\n"
+            f"   {partner_title}: {partner or 'Не указан'}, {status}\n"
+            f"   Создан {created}, в архиве с {archived_at.strftime('%d.%m.%Y')}")
+
+
+def get_user_role_in_chat(user_chat_id: int, chat) -> str:
     """Определяет роль пользователя в чате (client/contractor)"""
-    if chat_data.get('client_chat_id') == user_chat_id:
+    if chat.client_chat_id == user_chat_id:
         return 'client'
-    elif chat_data.get('contractor_chat_id') == user_chat_id:
+    elif chat.contractor_chat_id == user_chat_id:
         return 'contractor'
     return 'unknown'
 
@@ -0,0 +1,159 @@
+# webhook.py
+import asyncio
+import hmac
+import json
+import logging
+import secrets
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from telegram import Update
+
+from config import (WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN,
+                    WEBHOOK_MAX_CONNECTIONS, WEBHOOK_MAX_BODY, MAX_PENDING_UPDATES)
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+
+# Сколько держать простаивающее keep-alive соединение, секунды
+_IDLE_TIMEOUT = 75
+
+# Через сколько секунд Telegram стоит повторить запрос, отклонённый из-за переполнения очереди
+_RETRY_AFTER = 1
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found', 405: 'Method Not Allowed',
+            411: 'Length Required', 413: 'Payload Too Large', 503: 'Service Unavailable'}
+
+
+class WebhookServer:
+    """
+    Встроенный HTTP-сервер вебхука (HTTP/1.1 с keep-alive, без TLS - его завершает обратный прокси).
+    Принимает POST на path с секретом в заголовке X-Telegram-Bot-Api-Secret-Token и передаёт обновление
+    в enqueue. Если необработанных обновлений (backlog) уже max_pending, отвечает 503: Telegram повторит
+    запрос позже, а обновление не теряется и не копится в памяти бота.
+    """
+
+    def __init__(self, bot, enqueue: Callable[[Update], Awaitable[None]], backlog: Callable[[], int],
+                 secret_token: str, listen: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT,
+                 path: str = WEBHOOK_PATH, max_pending: int = MAX_PENDING_UPDATES,
+                 max_body: int = WEBHOOK_MAX_BODY):
+        self.bot = bot
+        self.enqueue = enqueue
+        self.backlog = backlog
+        self.secret_token = secret_token.encode('utf-8')
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.max_pending = max_pending
+        self.max_body = max_body
+        self.stats = {'accepted': 0, 'rejected': 0, 'forbidden': 0, 'invalid': 0}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        """Начинает принимать соединения"""
+        self._server = await asyncio.start_server(self._serve_connection, self.listen, self.port)
+        logger.info("Вебхук принимает обновления на %s:%d%s", self.listen, self.port, self.path)
+
+    async def stop(self) -> None:
+        """Перестаёт принимать соединения"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            logger.info("Вебхук остановлен: принято %d, отклонено (очередь) %d, неверный секрет %d, "
+                        "некорректных %d", self.stats['accepted'], self.stats['rejected'],
+                        self.stats['forbidden'], self.stats['invalid'])
+
+    async def _read_request(self, reader: asyncio.StreamReader
+                            ) -> Optional[Tuple[str, str, str, Dict[str, str]]]:
+        """Читает строку запроса и заголовки; None - соединение закрыто клиентом"""
+        line = await reader.readline()
+        if not line:
+            return None
+        method, target, version = line.decode('latin-1').split()
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return method, target, version, headers
+
+    def _respond(self, writer: asyncio.StreamWriter, status: int, keep_alive: bool,
+                 extra_headers: str = '') -> None:
+        connection = 'keep-alive' if keep_alive else 'close'
+        writer.write(f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Length: 0\r\n"
+                     f"Connection: {connection}\r\n{extra_headers}\r\n".encode('latin-1'))
+
+    async def _handle(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Tuple[int, str]:
+        """Обрабатывает запрос, возвращает код ответа и дополнительные заголовки"""
+        if target.split('?', 1)[0] != self.path:
+            return 404, ''
+        if method != 'POST':
+            return 405, 'Allow: POST\r\n'
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, '').encode('utf-8'), self.secret_token):
+            self.stats['forbidden'] += 1
+            return 403, ''
+        if self.backlog() >= self.max_pending:
+            self.stats['rejected'] += 1
+            return 503, f'Retry-After: {_RETRY_AFTER}\r\n'
+        try:
+            update = Update.de_json(json.loads(body), self.bot)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            self.stats['invalid'] += 1
+            return 400, ''
+        await self.enqueue(update)
+        self.stats['accepted'] += 1
+        return 200, ''
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await asyncio.wait_for(self._read_request(reader), _IDLE_TIMEOUT)
+                if request is None:
+                    break
+                method, target, version, headers = request
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+                if method == 'POST' and 'content-length' not in headers:
+                    # Тело без длины (chunked) не поддерживается: Telegram всегда передаёт Content-Length
+                    self._respond(writer, 411, keep_alive=False)
+                    await writer.drain()
+                    break
+                length = int(headers.get('content-length', '0'))
+                if length > self.max_body:
+                    # Тело не читаем: соединение закрывается
+                    self._respond(writer, 413, keep_alive=False)
+                    await writer.drain()
+                    break
+                body = await reader.readexactly(length)
+                status, extra_headers = await self._handle(method, target, headers, body)
+
+                self._respond(writer, status, keep_alive, extra_headers)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError:
+            # Некорректная строка запроса или заголовок
+            self.stats['invalid'] += 1
+            self._respond(writer, 400, keep_alive=False)
+        finally:
+            writer.close()
+
+
+def webhook_secret_token() -> str:
+    """Секрет вебхука из настроек или случайный (допустимые символы: A-Z, a-z, 0-9, _ и -)"""
+    return WEBHOOK_SECRET_TOKEN or secrets.token_urlsafe(32)
+
+
+async def set_webhook(bot, secret_token: str) -> None:
+    """Регистрирует вебхук в Telegram"""
+    if not WEBHOOK_URL:
+        raise ValueError("Для режима 'webhook' нужно указать WEBHOOK_URL")
+    await bot.set_webhook(url=WEBHOOK_URL, secret_token=secret_token, max_connections=WEBHOOK_MAX_CONNECTIONS,
+                          allowed_updates=Update.ALL_TYPES)
+    logger.info("Вебхук зарегистрирован: %s", WEBHOOK_URL)